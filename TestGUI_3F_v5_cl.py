@@ -5,21 +5,34 @@ Panel de control para 3 fermentadores (Raspberry / Simulador) con interfaz
 tipo panel industrial para control de temperatura y nutricion.
 """
 
+import time
+
+_STARTUP_T0 = time.perf_counter()  # referencia para el reporte de arranque
+
 import os
+import re
 import glob
 import csv
+import json
+import queue
 import random
 import math
-import time
+import threading
+import multiprocessing
 import datetime as dt
+import bisect
+import collections
+import heapq
+import itertools
+import struct
+import zlib
 import calendar as pycal
 from importlib import util as importlib_util
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
-import customtkinter as ctk
-from PIL import Image  # <<<<<< IMPORT PARA EL LOGO
+import customtkinter as ctk  # base de los widgets: no se puede diferir
 
 _ADS_I2C = None
 
@@ -47,24 +60,193 @@ FLOW_MIN_SCCM = float(os.environ.get("FLOW_MIN_SCCM", os.environ.get("FLOW_MIN_M
 FLOW_MAX_SCCM = float(os.environ.get("FLOW_MAX_SCCM", os.environ.get("FLOW_MAX_M3H", "50.0")))
 CO2_DENSITY_G_M3 = float(os.environ.get("CO2_DENSITY_G_M3", "1964.0"))
 BROTH_VOLUME_L = float(os.environ.get("BROTH_VOLUME_L", "5.0"))
+# C6H12O6 -> 2 C2H5OH + 2 CO2: gramos de azucar consumidos por gramo de CO2.
+SUGAR_PER_CO2 = 180.16 / (2 * 44.01)
+# Checkpoints del CO2 acumulado (sobreviven reinicios del programa).
+STATE_DIR = os.path.abspath(os.environ.get("STATE_DIR", "./Estado"))
+CO2_CHECKPOINT_SEC = parse_int(os.environ.get("CO2_CHECKPOINT_SEC", "60"), 60)
+# Ventanas (s) de las estadisticas moviles y constante de tiempo de la EWMA.
+ROLLING_WINDOWS_SEC = tuple(
+    parse_int(x, 0) for x in os.environ.get("ROLLING_WINDOWS_SEC", "60,600,3600,86400").split(",") if x.strip()
+)
+EWMA_TAU_SEC = float(os.environ.get("EWMA_TAU_SEC", "300"))
+TREND_WINDOW_SEC = parse_int(os.environ.get("TREND_WINDOW_SEC", "600"), 600)
+# Detector de fase (sobre la tasa suavizada en g/L·h). Las fracciones son
+# relativas al pico observado, salvo DETECT_STALL_SLOPE (caida por hora
+# relativa a la tasa actual: por debajo, la curva se considera plana).
+# DETECT_EXPECTED_CO2_G_L=0 desactiva el control de CO2 total al declarar el fin.
+DETECT_SMOOTH_SEC = float(os.environ.get("DETECT_SMOOTH_SEC", "900"))
+DETECT_SLOPE_WINDOW_SEC = parse_int(os.environ.get("DETECT_SLOPE_WINDOW_SEC", "1800"), 1800)
+DETECT_START_G_L_H = float(os.environ.get("DETECT_START_G_L_H", "0.05"))
+DETECT_PEAK_DROP = float(os.environ.get("DETECT_PEAK_DROP", "0.15"))
+DETECT_STALL_FRAC = float(os.environ.get("DETECT_STALL_FRAC", "0.30"))
+DETECT_STALL_SLOPE = float(os.environ.get("DETECT_STALL_SLOPE", "0.02"))
+DETECT_FINISH_FRAC = float(os.environ.get("DETECT_FINISH_FRAC", "0.05"))
+DETECT_HOLD_SEC = parse_int(os.environ.get("DETECT_HOLD_SEC", "3600"), 3600)
+DETECT_EXPECTED_CO2_G_L = float(os.environ.get("DETECT_EXPECTED_CO2_G_L", "0"))
 
 SAMPLE_PERIOD_SEC_ENV = os.environ.get("SAMPLE_PERIOD_SEC", "").strip()
 SAMPLE_PERIOD_SEC = parse_int(SAMPLE_PERIOD_SEC_ENV, 0) if SAMPLE_PERIOD_SEC_ENV else None
+# Muestreo adaptivo del caudal (no aplica en replay): el periodo baja hasta
+# SAMPLE_PERIOD_MIN_SEC cuando el caudal cambia rapido y sube hasta
+# SAMPLE_PERIOD_MAX_SEC cuando esta estable, buscando que entre muestras el
+# caudal cambie a lo sumo ADAPTIVE_TOLERANCE_SCCM.
+ADAPTIVE_SAMPLING = os.environ.get("ADAPTIVE_SAMPLING", "").strip().lower() in {"1", "true", "yes"}
+SAMPLE_PERIOD_MIN_SEC = max(1, parse_int(os.environ.get("SAMPLE_PERIOD_MIN_SEC", "1"), 1))
+SAMPLE_PERIOD_MAX_SEC = max(SAMPLE_PERIOD_MIN_SEC, parse_int(os.environ.get("SAMPLE_PERIOD_MAX_SEC", "60"), 60))
+ADAPTIVE_TOLERANCE_SCCM = float(
+    os.environ.get("ADAPTIVE_TOLERANCE_SCCM", "") or 0.01 * (FLOW_MAX_SCCM - FLOW_MIN_SCCM)
+)
 PLOT_WINDOW_ENV = os.environ.get("PLOT_WINDOW_HOURS", "").strip()
 PLOT_WINDOW_HOURS = float(PLOT_WINDOW_ENV) if PLOT_WINDOW_ENV else 0.0
 MAX_FLOW_HISTORY_HOURS = 24 * 21
+# Historiales mas grandes que esto se leen en paralelo (pool de procesos).
+PARALLEL_READ_MIN_MB = float(os.environ.get("PARALLEL_READ_MIN_MB", "") or 64)
+# Ventanas mas largas que esto dibujan lo antiguo desde los rollups.
+PLOT_RAW_HOURS = max(1, parse_int(os.environ.get("PLOT_RAW_HOURS", "12"), 12))
+
+# ===== Registro por banda muerta =====
+# Con LOG_DEADBAND=1 una fila de proceso (CSV y backup) se escribe solo si
+# algun valor se movio mas que su banda o pasaron LOG_HEARTBEAT_SEC desde la
+# ultima. Los lectores rehacen la serie en escalones.
+LOG_DEADBAND = os.environ.get("LOG_DEADBAND", "").strip().lower() in {"1", "true", "yes"}
+LOG_DEADBAND_T = float(os.environ.get("LOG_DEADBAND_T", "0.1") or 0.1)
+LOG_HEARTBEAT_SEC = max(1, parse_int(os.environ.get("LOG_HEARTBEAT_SEC", "300"), 300))
+
+# ===== Registro en RAM con diario =====
+# LOG_FLUSH_SEC>0 junta en RAM las filas de los CSV de proceso, CO2 y backup
+# y las escribe cada LOG_FLUSH_SEC (una escritura por archivo). Cada
+# LOG_JOURNAL_SEC lo nuevo se agrega a un diario con bloques verificados
+# (CRC32) en LOG_JOURNAL_DIR: un corte de luz pierde a lo sumo ese intervalo
+# (con el diario en tmpfs solo protege ante caidas del programa). Al
+# arrancar, lo que quedo en el diario se vuelca a los archivos.
+LOG_FLUSH_SEC = parse_int(os.environ.get("LOG_FLUSH_SEC", "0"), 0)
+LOG_JOURNAL_SEC = max(1, parse_int(os.environ.get("LOG_JOURNAL_SEC", "5"), 5))
+LOG_SYNC_TIMEOUT_SEC = 3.0  # espera de las descargas pedidas antes de exportar
+LOG_JOURNAL_DIR = os.path.abspath(os.environ.get("LOG_JOURNAL_DIR", "") or os.path.join(STATE_DIR, "diario"))
+
+# ===== Replay de registros (CSV grabados) =====
+# REPLAY_DIR apunta a una carpeta con F1.csv, F1_co2.csv, ... grabados en
+# corridas reales; REPLAY_SPEED acelera la reproduccion (60 = 1 h por minuto).
+REPLAY_DIR = os.environ.get("REPLAY_DIR", "").strip()
+REPLAY_SPEED = float(os.environ.get("REPLAY_SPEED", "1.0").strip() or 1.0)
+REPLAY_LOOP = os.environ.get("REPLAY_LOOP", "").strip().lower() in {"1", "true", "yes"}
+
+# ===== Procesos por fermentador =====
+# Con WORKER_PROCESSES=1 cada fermentador (control, sensores y registro) corre
+# en su propio proceso y la GUI solo refleja su estado.
+WORKER_PROCESSES = os.environ.get("WORKER_PROCESSES", "").strip().lower() in {"1", "true", "yes"}
+
+# ===== Dashboard web =====
+# DASHBOARD_PORT habilita un servidor HTTP liviano: la pagina dibuja los
+# graficos en el navegador y recibe el estado en vivo por Server-Sent Events,
+# asi el costo de graficar no queda en la Raspberry. La pagina no pide
+# clave: por defecto solo escucha en el propio equipo; DASHBOARD_HOST=0.0.0.0
+# la abre a la red.
+DASHBOARD_PORT = parse_int(os.environ.get("DASHBOARD_PORT", "0"), 0)
+DASHBOARD_HOST = os.environ.get("DASHBOARD_HOST", "127.0.0.1").strip() or "127.0.0.1"
+DASHBOARD_HISTORY_POINTS = parse_int(os.environ.get("DASHBOARD_HISTORY_POINTS", "7200"), 7200)
+# API REST de control en el mismo puerto; sin API_TOKEN queda deshabilitada.
+API_TOKEN = os.environ.get("API_TOKEN", "").strip()
+
+# ===== Telemetria hacia historiador central =====
+# TELEMETRY_URL=tcp://host:puerto (lineas sueltas) o http://host:puerto/ruta
+# (un POST por lote); vacio la deshabilita. Si el receptor no responde los
+# lotes quedan en TELEMETRY_SPOOL_DIR (acotado a TELEMETRY_SPOOL_MAX_MB, se
+# descarta lo mas viejo) y se reenvian a TELEMETRY_DRAIN_LINES_SEC lineas/s.
+TELEMETRY_URL = os.environ.get("TELEMETRY_URL", "").strip()
+TELEMETRY_BATCH = max(1, parse_int(os.environ.get("TELEMETRY_BATCH", "500"), 500))
+TELEMETRY_PERIOD_SEC = float(os.environ.get("TELEMETRY_PERIOD_SEC", "5") or 5)
+TELEMETRY_SPOOL_DIR = os.path.abspath(os.environ.get("TELEMETRY_SPOOL_DIR", os.path.join(STATE_DIR, "telemetria")))
+TELEMETRY_SPOOL_MAX_MB = float(os.environ.get("TELEMETRY_SPOOL_MAX_MB", "50") or 50)
+TELEMETRY_DRAIN_LINES_SEC = max(1, parse_int(os.environ.get("TELEMETRY_DRAIN_LINES_SEC", "200"), 200))
+TELEMETRY_TIMEOUT_SEC = float(os.environ.get("TELEMETRY_TIMEOUT_SEC", "5") or 5)
+
+# ===== FERMENTADORES / PINES HARDWARE =====
+# Por defecto los 3 fermentadores del tablero original. FERMENTERS_FILE puede
+# apuntar a un JSON con la lista completa, por ejemplo:
+#   [{"name": "F4", "cold": 5, "hot": 6, "pul": 19, "dir": 25,
+#     "ads_addr": "0x49", "ads_ch": 0, "ds_index": 3}, ...]
+# Los pines omitidos quedan sin GPIO. FERMENTERS_N crea F1..FN (util en
+# simulador o replay para probar la escala sin armar el JSON).
+DEFAULT_FERMENTERS = [
+    {"name": "F1", "cold": 7, "hot": 8, "pul": 13, "dir": 26, "ads_ch": 1},
+    {"name": "F2", "cold": 24, "hot": 23, "pul": 21, "dir": 20, "ads_ch": 2},
+    {"name": "F3", "cold": 18, "hot": 15, "pul": 12, "dir": 16, "ads_ch": 3},
+]
+FERMENTERS_PER_PAGE = max(1, parse_int(os.environ.get("FERMENTERS_PER_PAGE", ""), 3))
+
+
+def _pin_or_none(value):
+    if value is None or value == "":
+        return None
+    return parse_int(str(value), 0)
+
+
+def load_fermenters_config():
+    path = os.environ.get("FERMENTERS_FILE", "").strip()
+    n_env = os.environ.get("FERMENTERS_N", "").strip()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    elif n_env:
+        n = max(1, parse_int(n_env, len(DEFAULT_FERMENTERS)))
+        raw = [dict(DEFAULT_FERMENTERS[i]) if i < len(DEFAULT_FERMENTERS) else {"name": f"F{i+1}"}
+               for i in range(n)]
+    else:
+        raw = [dict(cfg) for cfg in DEFAULT_FERMENTERS]
+
+    fermenters = []
+    seen = set()
+    for idx, item in enumerate(raw):
+        name = str(item.get("name") or f"F{idx+1}").strip()
+        if name in seen:
+            raise ValueError(f"Fermentador duplicado en la configuracion: {name}")
+        seen.add(name)
+        fermenters.append({
+            "name": name,
+            "cold": _pin_or_none(item.get("cold")),
+            "hot": _pin_or_none(item.get("hot")),
+            "pul": _pin_or_none(item.get("pul")),
+            "dir": _pin_or_none(item.get("dir")),
+            "ads_addr": parse_int(str(item.get("ads_addr", "")), ADS1115_ADDR),
+            "ads_ch": parse_int(str(item.get("ads_ch", "")), min(idx, 3)),
+            "ads_gain": parse_int(str(item.get("ads_gain", "")), ADS1115_GAIN),
+            "ds_index": parse_int(str(item.get("ds_index", "")), idx),
+        })
+    return fermenters
+
+
+FERMENTERS = load_fermenters_config()
+RELAY_PINS = {f["name"]: {"cold": f["cold"], "hot": f["hot"]} for f in FERMENTERS}
+STEPPER_PINS = {f["name"]: {"pul": f["pul"], "dir": f["dir"]} for f in FERMENTERS}
+
+# ===== Reporte de arranque =====
+_startup_marks = []
+
+
+def startup_mark(label: str):
+    _startup_marks.append((label, time.perf_counter() - _STARTUP_T0))
+
+
+def startup_report() -> str:
+    parts = [f"{label} {secs:.2f} s" for label, secs in sorted(_startup_marks, key=lambda m: m[1])]
+    return "[ARRANQUE] " + " | ".join(parts)
+
+
+def _prewarm_matplotlib():
+    # Importa matplotlib en segundo plano para que el primer grafico abra al tiro.
+    if not importlib_util.find_spec("matplotlib"):
+        return
+    try:
+        import matplotlib.pyplot  # type: ignore  # noqa: F401
+        from matplotlib import dates  # type: ignore  # noqa: F401
+        from matplotlib.backends import backend_tkagg  # type: ignore  # noqa: F401
+        startup_mark("matplotlib precargado")
+        print(f"[ARRANQUE] matplotlib precargado en {_startup_marks[-1][1]:.2f} s")
+    except Exception as e:
+        print(f"[ARRANQUE] No se pudo precargar matplotlib: {e}")
 
-# ===== PINES HARDWARE =====
-RELAY_PINS = {
-    "F1": {"cold": 7, "hot": 8},
-    "F2": {"cold": 24, "hot": 23},
-    "F3": {"cold": 18, "hot": 15},
-}
-STEPPER_PINS = {
-    "F1": {"pul": 13, "dir": 26},
-    "F2": {"pul": 21, "dir": 20},
-    "F3": {"pul": 12, "dir": 16},
-}
 
 # ===== Utilidades de tiempo =====
 MESES_ES = [
@@ -95,6 +277,66 @@ def hhmm_ok(s: str) -> bool:
         return False
 
 
+# Marcas de tiempo de los registros: formato fijo "AAAA-MM-DD hh:mm:ss"
+# (o con "/" en archivos viejos). fromisoformat lo lee ~25 veces mas rapido
+# que strptime, que queda solo para lo que no calza.
+def _ts_strptime(raw: str):
+    raw = (raw or "").strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
+        try:
+            return dt.datetime.strptime(raw, fmt)
+        except Exception:
+            continue
+    return None
+
+
+def _ts_iso(raw: str):
+    try:
+        return dt.datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        return _ts_strptime(raw)
+
+
+def _ts_iso_slash(raw: str):
+    try:
+        return dt.datetime.fromisoformat(raw.replace("/", "-"))
+    except (AttributeError, ValueError):
+        return _ts_strptime(raw)
+
+
+def _is_iso_ts(raw) -> bool:
+    return isinstance(raw, str) and len(raw) == 19 and raw[4] == "-" and raw[10] == " "
+
+
+def log_ts_parser(sample):
+    # Elige el lector segun una muestra (la primera fila de un archivo); las
+    # filas que no calcen con el formato elegido caen a strptime.
+    sample = (sample or "").strip()
+    if len(sample) == 19 and sample[10] == " ":
+        if sample[4] == "-":
+            return _ts_iso
+        if sample[4] == "/":
+            return _ts_iso_slash
+    return _ts_strptime
+
+
+def _parse_log_ts(raw: str):
+    return _ts_iso(raw) if _is_iso_ts(raw) else _ts_strptime(raw)
+
+
+def _timed_rows(rows):
+    # (ts, fila) con el formato detectado en la primera fila; omite las
+    # filas sin marca de tiempo valida.
+    parse = None
+    for row in rows:
+        raw = row.get("timestamp")
+        if parse is None:
+            parse = log_ts_parser(raw)
+        ts = parse(raw)
+        if ts is not None:
+            yield ts, row
+
+
 def _normalize_date(date_str: str):
     date_str = (date_str or "").strip()
     for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
@@ -115,6 +357,18 @@ def _restore_focus(widget):
         pass
 
 
+def safe_file_name(name: str) -> str:
+    # Nombres de fermentador (vienen de la configuracion) usados en rutas.
+    return re.sub(r"[^\w.-]", "_", str(name)).strip(".") or "_"
+
+
+def _csv_file_path(directory: str, name: str, default_name: str) -> str:
+    name = (name or "").strip() or default_name
+    if not name.lower().endswith(".csv"):
+        name += ".csv"
+    return os.path.join(directory, name)
+
+
 def voltage_to_current_ma(voltage: float, shunt_ohms: float) -> float:
     return (voltage / shunt_ohms) * 1000.0
 
@@ -127,6 +381,12 @@ def current_to_flow_sccm(current_ma: float) -> float:
     return FLOW_MIN_SCCM + (current_ma - 4.0) * (FLOW_MAX_SCCM - FLOW_MIN_SCCM) / span
 
 
+def flow_to_current_ma(flow_sccm: float) -> float:
+    if FLOW_MAX_SCCM <= FLOW_MIN_SCCM:
+        return 4.0
+    return 4.0 + (flow_sccm - FLOW_MIN_SCCM) * 16.0 / (FLOW_MAX_SCCM - FLOW_MIN_SCCM)
+
+
 def flow_to_rate_g_l_h(flow_sccm: float) -> float:
     if CO2_DENSITY_G_M3 <= 0 or BROTH_VOLUME_L <= 0:
         return 0.0
@@ -134,6 +394,413 @@ def flow_to_rate_g_l_h(flow_sccm: float) -> float:
     return (flow_m3h * CO2_DENSITY_G_M3) / BROTH_VOLUME_L
 
 
+def flow_to_mass_g_h(flow_sccm: float) -> float:
+    return flow_sccm * 6e-5 * CO2_DENSITY_G_M3
+
+
+# ===== Planificador de trabajos periodicos =====
+PRIO_CONTROL = 0  # control de temperatura y muestreo: nunca se posterga
+PRIO_IO = 1       # registro y estado hacia la GUI
+PRIO_UI = 2       # reloj, graficos y resumenes: lo primero que se descarta
+
+
+class ScheduledJob:
+    __slots__ = ("name", "period", "fn", "priority", "due", "runs", "shed", "cancelled")
+
+    def __init__(self, name, period, fn, priority, due):
+        self.name = name
+        self.period = period
+        self.fn = fn
+        self.priority = priority
+        self.due = due
+        self.runs = 0
+        self.shed = 0
+        self.cancelled = False
+
+
+class Scheduler:
+    # Cada trabajo registra su periodo y prioridad. run_pending() corre los
+    # vencidos de menor a mayor prioridad; si el paso ya gasto `budget`
+    # segundos o un trabajo viene atrasado mas de un periodo, los de
+    # prioridad >= shed_priority se saltan hasta su proxima vuelta. Si fn
+    # devuelve un numero, ese es el nuevo periodo del trabajo.
+    def __init__(self, budget: float = 0.5, shed_priority: int = PRIO_UI, clock=time.monotonic):
+        self.budget = budget
+        self.shed_priority = shed_priority
+        self.clock = clock
+        self.jobs = {}
+        self._heap = []
+        self._order = itertools.count()
+
+    def add(self, name, period, fn, priority=PRIO_UI, delay=None):
+        self.remove(name)
+        due = self.clock() + (period if delay is None else delay)
+        job = ScheduledJob(name, period, fn, priority, due)
+        self.jobs[name] = job
+        self._push(job)
+        return job
+
+    def remove(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            job.cancelled = True
+
+    def clear(self):
+        for name in list(self.jobs):
+            self.remove(name)
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.due, job.priority, next(self._order), job))
+
+    def next_delay(self):
+        heap = self._heap
+        while heap and heap[0][3].cancelled:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0.0, heap[0][0] - self.clock())
+
+    def run_pending(self) -> int:
+        t0 = self.clock()
+        due = []
+        while self._heap and self._heap[0][0] <= t0:
+            job = heapq.heappop(self._heap)[3]
+            if not job.cancelled:
+                due.append(job)
+        due.sort(key=lambda j: (j.priority, j.due))
+        ran = 0
+        for job in due:
+            if job.cancelled:
+                continue
+            start = self.clock()
+            overloaded = start - t0 > self.budget or start - job.due > job.period
+            if job.priority >= self.shed_priority and overloaded:
+                job.shed += 1
+                self._reschedule(job, None, start)
+                continue
+            try:
+                period = job.fn()
+            except Exception as e:
+                print(f"[SCHED] {job.name}: {e}")
+                period = None
+            job.runs += 1
+            ran += 1
+            self._reschedule(job, period, self.clock())
+        return ran
+
+    def _reschedule(self, job, period, t):
+        if job.cancelled:
+            return
+        if isinstance(period, (int, float)) and period > 0:
+            job.period = period
+        job.due += job.period
+        if job.due < t:
+            # Sin rafagas para recuperar vueltas perdidas.
+            job.due = t + job.period
+        self._push(job)
+
+
+# ===== Estadisticas en linea =====
+class RollingWindow:
+    # Media, min, max y pendiente (minimos cuadrados) de los ultimos
+    # `seconds`, en O(1) amortizado por muestra: sumas corridas y deques
+    # monotonicas para min/max. Las sumas se recalculan desde cero cada
+    # vez que se renueva la ventana completa para no acumular error.
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._items = collections.deque()
+        self._min = collections.deque()
+        self._max = collections.deque()
+        self._t0 = None
+        self._evicted = 0
+        self._s_x = self._s_xx = self._s_y = self._s_xy = 0.0
+
+    def add(self, t: float, v: float):
+        if self._t0 is None:
+            self._t0 = t
+        self._items.append((t, v))
+        self._accumulate(t - self._t0, v, 1.0)
+        while self._min and self._min[-1][1] >= v:
+            self._min.pop()
+        self._min.append((t, v))
+        while self._max and self._max[-1][1] <= v:
+            self._max.pop()
+        self._max.append((t, v))
+
+        cutoff = t - self.seconds
+        items = self._items
+        while items[0][0] < cutoff:
+            ot, ov = items.popleft()
+            self._accumulate(ot - self._t0, ov, -1.0)
+            self._evicted += 1
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+        if self._evicted >= len(items):
+            self._rebase()
+
+    def _accumulate(self, x, y, sign):
+        self._s_x += sign * x
+        self._s_xx += sign * x * x
+        self._s_y += sign * y
+        self._s_xy += sign * x * y
+
+    def _rebase(self):
+        self._t0 = self._items[0][0]
+        self._evicted = 0
+        self._s_x = self._s_xx = self._s_y = self._s_xy = 0.0
+        for t, v in self._items:
+            self._accumulate(t - self._t0, v, 1.0)
+
+    def __len__(self):
+        return len(self._items)
+
+    def mean(self):
+        n = len(self._items)
+        return self._s_y / n if n else None
+
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    def slope(self):
+        # Unidades por segundo.
+        n = len(self._items)
+        if n < 2:
+            return None
+        den = n * self._s_xx - self._s_x * self._s_x
+        if den <= 0:
+            return None
+        return (n * self._s_xy - self._s_x * self._s_y) / den
+
+
+class Ewma:
+    # EWMA con constante de tiempo en segundos: tolera periodos irregulares.
+    def __init__(self, tau_sec: float):
+        self.tau_sec = tau_sec
+        self.value = None
+        self._last_t = None
+
+    def add(self, t: float, v: float):
+        if self.value is None or self.tau_sec <= 0:
+            self.value = v
+        elif self._last_t is not None:
+            alpha = 1.0 - math.exp(-max(0.0, t - self._last_t) / self.tau_sec)
+            self.value += alpha * (v - self.value)
+        self._last_t = t
+        return self.value
+
+
+def stats_window(summary, seconds):
+    if not summary:
+        return None
+    for w in summary["windows"]:
+        if w["seconds"] == seconds:
+            return w
+    return None
+
+
+def window_label(seconds: float) -> str:
+    if seconds >= 3600 and seconds % 3600 == 0:
+        return f"{int(seconds // 3600)} h"
+    if seconds >= 60 and seconds % 60 == 0:
+        return f"{int(seconds // 60)} min"
+    return f"{int(seconds)} s"
+
+
+class RollingStats:
+    # Estadisticas de una serie (caudal o temperatura) en varias ventanas.
+    def __init__(self, windows=ROLLING_WINDOWS_SEC, ewma_tau_sec=EWMA_TAU_SEC):
+        self.windows = [RollingWindow(w) for w in windows if w > 0]
+        self.ewma = Ewma(ewma_tau_sec)
+        self.last = None
+
+    def add(self, ts, value: float):
+        t = ts.timestamp()
+        self.last = value
+        self.ewma.add(t, value)
+        for w in self.windows:
+            w.add(t, value)
+
+    def window(self, seconds):
+        for w in self.windows:
+            if w.seconds == seconds:
+                return w
+        return None
+
+    def summary(self):
+        # Resumen compacto (serializable) para los snapshots hacia la GUI.
+        out = {"last": self.last, "ewma": self.ewma.value, "windows": []}
+        for w in self.windows:
+            slope = w.slope()
+            out["windows"].append({
+                "seconds": w.seconds,
+                "n": len(w),
+                "mean": w.mean(),
+                "min": w.min(),
+                "max": w.max(),
+                "slope_h": slope * 3600.0 if slope is not None else None,
+            })
+        return out
+
+
+# ===== CO2 acumulado =====
+CO2_CSV_FIELDS = (
+    "timestamp", "fermentador", "flow_sccm", "status", "co2_acum_g", "co2_acum_g_l", "evento", "periodo_s",
+)
+
+
+class Co2Integrator:
+    # Total de CO2 por regla del trapecio, actualizado en O(1) con cada
+    # muestra. Un hueco mayor que max_gap (programa cerrado, sensor caido)
+    # no se integra: se retoma desde la siguiente muestra.
+    def __init__(self, max_gap_sec: float):
+        self.max_gap_sec = max_gap_sec
+        self.total_g = 0.0
+        self.last_ts = None
+        self.last_mass_g_h = None
+
+    def add(self, ts, flow_sccm: float) -> float:
+        mass_g_h = flow_to_mass_g_h(flow_sccm)
+        if self.last_ts is not None:
+            gap = (ts - self.last_ts).total_seconds()
+            if 0 < gap <= self.max_gap_sec:
+                self.total_g += 0.5 * (self.last_mass_g_h + mass_g_h) * gap / 3600.0
+        self.last_ts = ts
+        self.last_mass_g_h = mass_g_h
+        return self.total_g
+
+    def total_g_l(self) -> float:
+        if BROTH_VOLUME_L <= 0:
+            return 0.0
+        return self.total_g / BROTH_VOLUME_L
+
+    def reset(self):
+        self.total_g = 0.0
+        self.last_ts = None
+        self.last_mass_g_h = None
+
+    def to_dict(self):
+        return {
+            "total_g": self.total_g,
+            "last_ts": self.last_ts.strftime("%Y-%m-%d %H:%M:%S") if self.last_ts else None,
+            "last_mass_g_h": self.last_mass_g_h,
+        }
+
+    def restore(self, data):
+        self.total_g = float(data.get("total_g", 0.0))
+        self.last_ts = _parse_log_ts(data.get("last_ts") or "")
+        last = data.get("last_mass_g_h")
+        self.last_mass_g_h = float(last) if last is not None and self.last_ts else None
+
+
+def load_co2_checkpoint(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        print(f"[CO2] Checkpoint ilegible {path}: {exc}")
+        return None
+
+
+def save_co2_checkpoint(path: str, data) -> None:
+    # Escritura atomica: un corte de luz deja el checkpoint anterior intacto.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ===== Detector de fase de fermentacion =====
+FERM_IDLE = "sin actividad"
+FERM_ACTIVE = "activa"
+FERM_PEAK = "pico superado"
+FERM_STALLED = "estancada"
+FERM_DONE = "finalizada"
+
+
+class FermentationDetector:
+    # Maquina de estados evaluada en O(1) por muestra: EWMA de la tasa y
+    # pendiente por minimos cuadrados de esa tasa suavizada. Las condiciones
+    # de estancada/finalizada deben sostenerse DETECT_HOLD_SEC.
+    def __init__(self):
+        self.state = FERM_IDLE
+        self.peak = 0.0
+        self.peak_ts = None
+        self.smooth = Ewma(DETECT_SMOOTH_SEC)
+        self.trend = RollingWindow(DETECT_SLOPE_WINDOW_SEC)
+        self._since = {}
+
+    def update(self, ts, rate_g_l_h: float, total_g_l: float):
+        # Devuelve el nuevo estado si hubo transicion, si no None.
+        t = ts.timestamp()
+        r = self.smooth.add(t, rate_g_l_h)
+        self.trend.add(t, r)
+        slope = self.trend.slope()
+        slope_h = slope * 3600.0 if slope is not None else 0.0
+        if r > self.peak:
+            self.peak = r
+            self.peak_ts = ts
+
+        state = self.state
+        new = state
+        peak = self.peak
+        if state == FERM_IDLE:
+            if r >= DETECT_START_G_L_H:
+                new = FERM_ACTIVE
+        elif state == FERM_ACTIVE:
+            if r <= peak * (1.0 - DETECT_PEAK_DROP) and slope_h < 0:
+                new = FERM_PEAK
+        elif state in (FERM_PEAK, FERM_STALLED):
+            finishing = r <= peak * DETECT_FINISH_FRAC
+            flat = abs(slope_h) <= DETECT_STALL_SLOPE * r
+            if self._held("fin", finishing, t):
+                if DETECT_EXPECTED_CO2_G_L <= 0 or total_g_l >= 0.9 * DETECT_EXPECTED_CO2_G_L:
+                    new = FERM_DONE
+                else:
+                    new = FERM_STALLED
+            elif self._held("stall", r <= peak * DETECT_STALL_FRAC and flat and not finishing, t):
+                new = FERM_STALLED
+            elif state == FERM_STALLED and r > peak * DETECT_STALL_FRAC:
+                new = FERM_PEAK
+
+        if new == state:
+            return None
+        self.state = new
+        self._since.clear()
+        return new
+
+    def _held(self, key, cond, t):
+        if not cond:
+            self._since.pop(key, None)
+            return False
+        start = self._since.setdefault(key, t)
+        return t - start >= DETECT_HOLD_SEC
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "peak": self.peak,
+            "peak_ts": self.peak_ts.strftime("%Y-%m-%d %H:%M:%S") if self.peak_ts else None,
+            "smooth": self.smooth.value,
+        }
+
+    def restore(self, data):
+        self.state = data.get("state", FERM_IDLE)
+        self.peak = float(data.get("peak", 0.0))
+        self.peak_ts = _parse_log_ts(data.get("peak_ts") or "")
+        # La EWMA retoma desde el valor guardado con la primera muestra nueva.
+        self.smooth.value = data.get("smooth")
+
+
 # ===== Hardware layer (con fallback simulador) =====
 class Hardware:
     def __init__(self):
@@ -143,11 +810,22 @@ class Hardware:
         self.sim_gpio_reason = "Forzado por variable de entorno" if self.sim else ""
         self.gpio = None
         self.pwms = {}
+        # Estado comandado por pin (True = rele activado) y conmutaciones
+        # por pin para seguir el desgaste de los reles.
+        self._relay_state = {}
+        self.relay_switches = collections.Counter()
         self._last_temp_error = False
-        self._sim_bias = [random.uniform(-1, 1) for _ in range(3)]
+        self._sim_bias = [random.uniform(-1, 1) for _ in range(max(3, len(FERMENTERS)))]
         self.ds_devices = []  # <- aseguramos que exista siempre
-
-        if not self.sim:
+        self.replay = None
+        self._replay_temps = {}
+
+        if not self.sim and REPLAY_DIR:
+            # En replay nunca tocamos GPIO: los reles quedan simulados.
+            self.replay = get_replay_session()
+            self.sim_gpio = True
+            self.sim_gpio_reason = f"Replay de {REPLAY_DIR}"
+        elif not self.sim:
             try:
                 import RPi.GPIO as GPIO  # type: ignore
                 self.gpio = GPIO
@@ -167,6 +845,8 @@ class Hardware:
 
         if self.sim:
             print(f"[HW] Modo simulador activo. {self.sim_reason}")
+        elif self.replay is not None:
+            print(f"[HW] Modo replay activo ({REPLAY_DIR}, x{REPLAY_SPEED:g}).")
         else:
             if self.sim_gpio:
                 print(f"[HW] GPIO en simulador. {self.sim_gpio_reason}")
@@ -185,6 +865,8 @@ class Hardware:
 
     # --- DS18B20 ---
     def read_temp_ds18b20(self, index: int) -> float:
+        if self.replay is not None:
+            return self._read_temp_replay(index)
         if self.sim or not self.ds_devices:
             base = 20.0 + self._sim_bias[min(index, len(self._sim_bias) - 1)]
             return base + random.uniform(-0.5, 0.5)
@@ -206,8 +888,25 @@ class Hardware:
         finally:
             self._last_temp_error = False
 
+    def _read_temp_replay(self, index: int) -> float:
+        if index not in self._replay_temps:
+            name = next((f["name"] for f in FERMENTERS if f["ds_index"] == index), f"F{index + 1}")
+            path = os.path.join(REPLAY_DIR, f"{safe_file_name(name)}.csv")
+            try:
+                self._replay_temps[index] = self.replay.stream(path, _replay_row_temp)
+            except Exception as e:
+                print(f"[HW] Replay sin temperatura para {name}: {e}. Usando 20°C de respaldo.")
+                self._replay_temps[index] = None
+        stream = self._replay_temps[index]
+        if stream is None:
+            return 20.0
+        return stream.value()
+
     # --- Relés ---
     def setup_relay(self, pin: int):
+        if pin is None:
+            return
+        self._relay_state[pin] = False
         if self.sim or self.sim_gpio or not self.gpio:
             return
         try:
@@ -216,25 +915,33 @@ class Hardware:
         except Exception as e:
             self._gpio_fallback(e)
 
-    def relay_on(self, pin: int):
+    def set_relays(self, states: dict):
+        # Solo escribe los pines que cambian, todos en una llamada.
+        changed = [(pin, on) for pin, on in states.items()
+                   if pin is not None and self._relay_state.get(pin) != bool(on)]
+        if not changed:
+            return
+        for pin, on in changed:
+            if pin in self._relay_state:
+                self.relay_switches[pin] += 1
+            self._relay_state[pin] = bool(on)
         if self.sim or self.sim_gpio or not self.gpio:
             return
+        GPIO = self.gpio
         try:
-            self.gpio.output(pin, self.gpio.LOW)
+            GPIO.output([pin for pin, _ in changed], [GPIO.LOW if on else GPIO.HIGH for _, on in changed])
         except Exception as e:
             self._gpio_fallback(e)
 
+    def relay_on(self, pin: int):
+        self.set_relays({pin: True})
+
     def relay_off(self, pin: int):
-        if self.sim or self.sim_gpio or not self.gpio:
-            return
-        try:
-            self.gpio.output(pin, self.gpio.HIGH)
-        except Exception as e:
-            self._gpio_fallback(e)
+        self.set_relays({pin: False})
 
     # --- Stepper ---
     def setup_stepper(self, name: str, pul: int, direction: int, freq: float):
-        if self.sim or self.sim_gpio or not self.gpio:
+        if self.sim or self.sim_gpio or not self.gpio or pul is None or direction is None:
             return
         try:
             GPIO = self.gpio
@@ -363,442 +1070,3944 @@ class ADS1115Reader:
             _ADS_I2C = None
 
 
-# ===== LED widget =====
-class Led:
-    def __init__(self, parent, size=20):
-        bg = None
-        for key in ("fg_color", "background", "bg"):
-            try:
-                bg = parent.cget(key)
-                break
-            except Exception:
-                continue
-        if bg is None:
-            bg = "#111827"
-        self.canvas = tk.Canvas(
-            parent,
-            width=size,
-            height=size,
-            highlightthickness=0,
-            bd=0,
-            bg=bg,
-        )
-        r = 2
-        self.oval = self.canvas.create_oval(r, r, size - r, size - r, fill="red", outline="#111")
+# ===== Replay desde CSV grabados =====
+def _replay_row_temp(row):
+    return float(row["T"])
 
-    def widget(self):
-        return self.canvas
 
-    def set_color(self, color: str):
-        self.canvas.itemconfig(self.oval, fill=color)
+def _replay_row_voltage(row):
+    raw = (row.get("voltage_v") or "").strip()
+    if raw:
+        return float(raw)
+    # Registros antiguos solo guardaban el caudal: reconstruimos el 4-20 mA.
+    return (flow_to_current_ma(float(row["flow_sccm"])) / 1000.0) * SHUNT_OHMS
 
-    def set_on(self, on: bool):
-        self.set_color("#22c55e" if on else "#ef4444")
 
+def _first_log_ts(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            f.readline()
+            first = f.readline()
+    except Exception:
+        return None
+    return _parse_log_ts(first.split(",", 1)[0])
 
-# ===== Calendario por FECHAS =====
-DAYS_SHORT = ["L", "Ma", "Mi", "J", "V", "S", "D"]
 
+class ReplayStream:
+    def __init__(self, session, path: str, row_value):
+        self.session = session
+        self.path = path
+        self._offsets = []
+        self._values = []
+        with open(path, "r", encoding="utf-8") as f:
+            for ts, row in _timed_rows(csv.DictReader(f)):
+                try:
+                    value = row_value(row)
+                except Exception:
+                    continue
+                offset = (ts - session.anchor).total_seconds()
+                if self._offsets and offset < self._offsets[-1]:
+                    continue
+                self._offsets.append(offset)
+                self._values.append(value)
+        if not self._values:
+            raise RuntimeError(f"sin filas validas en {path}")
+        session._register(self._offsets[-1])
+
+    def period(self) -> float:
+        if len(self._offsets) < 2:
+            return 1.0
+        diffs = sorted(b - a for a, b in zip(self._offsets, self._offsets[1:]))
+        return max(1.0, diffs[len(diffs) // 2])
+
+    def value(self) -> float:
+        idx = bisect.bisect_right(self._offsets, self.session.offset()) - 1
+        return self._values[max(0, idx)]
+
+
+class ReplaySession:
+    # Un solo reloj para todos los archivos: se reproducen alineados en el
+    # tiempo real en que fueron grabados, partiendo por el mas antiguo.
+    def __init__(self, directory: str, speed: float, loop: bool):
+        self.directory = directory
+        self.speed = speed if speed > 0 else 1.0
+        self.loop = loop
+        firsts = [_first_log_ts(p) for p in glob.glob(os.path.join(directory, "*.csv"))]
+        firsts = [ts for ts in firsts if ts is not None]
+        self.anchor = min(firsts) if firsts else now()
+        self._span = 0.0
+        self._start = time.monotonic()
+        if os.path.abspath(directory) == os.path.abspath("./Proceso"):
+            print("[REPLAY] Advertencia: REPLAY_DIR es la carpeta de trabajo CSV; "
+                  "no inicies el registro o se agregaran filas a la grabacion.")
+
+    def _register(self, last_offset: float):
+        self._span = max(self._span, last_offset)
+
+    def offset(self) -> float:
+        elapsed = (time.monotonic() - self._start) * self.speed
+        if self.loop and self._span > 0:
+            return elapsed % self._span
+        return elapsed
+
+    def stream(self, path: str, row_value) -> ReplayStream:
+        return ReplayStream(self, path, row_value)
+
+
+_REPLAY_SESSION = None
+
+
+def get_replay_session() -> ReplaySession:
+    global _REPLAY_SESSION
+    if _REPLAY_SESSION is None:
+        _REPLAY_SESSION = ReplaySession(REPLAY_DIR, REPLAY_SPEED, REPLAY_LOOP)
+    return _REPLAY_SESSION
+
+
+class ReplayADS1115Reader:
+    # Misma interfaz que ADS1115Reader, pero entrega el voltaje grabado.
+    def __init__(self, path: str):
+        self.address = None
+        self.channel = None
+        self.gain = None
+        self.sim = False
+        self.sim_reason = f"Replay de {path}"
+        self._stream = get_replay_session().stream(path, _replay_row_voltage)
+
+    def sample_period(self) -> int:
+        return max(1, int(round(self._stream.period() / REPLAY_SPEED)))
 
-class DateCalendarDialog(tk.Toplevel):
-    def __init__(self, master, title_label, value_label, value_type=float, initial=None, import_callback=None):
-        super().__init__(master)
-        self.title(title_label)
-        self.geometry("840x540")
-        self.resizable(False, False)
-        self.transient(master)
-        self.grab_set()
+    def read_voltage(self) -> float:
+        return self._stream.value()
 
-        self.value_type = value_type
-        self.data = {}
-        self.import_callback = import_callback
-        if isinstance(initial, dict):
-            for k, v in initial.items():
-                self.data[k] = [dict(ev) for ev in v]
+    def close(self):
+        pass
 
-        self.today = dt.date.today()
-        self.selected_date = self.today
-        self.view_year = self.today.year
-        self.view_month = self.today.month
 
-        container = ttk.Frame(self, padding=10)
-        container.grid(row=0, column=0, sticky="nsew")
-        self.columnconfigure(0, weight=1)
-        self.rowconfigure(0, weight=1)
+# ===== Lectura de historial desde el final de los CSV =====
+def read_csv_reverse(path: str, block_size: int = 64 * 1024):
+    # Entrega las filas (dict) de la mas nueva a la mas antigua leyendo
+    # bloques desde el final: quien solo necesita la cola corta temprano.
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").strip()
+        if not header:
+            return
+        fields = next(csv.reader([header]))
+        data_start = f.tell()
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > data_start:
+            size = min(block_size, pos - data_start)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b"\n")
+            rest = lines[0]
+            for line in reversed(lines[1:]):
+                line = line.strip()
+                if line:
+                    yield dict(zip(fields, next(csv.reader([line.decode("utf-8", "replace")]))))
+        rest = rest.strip()
+        if rest:
+            yield dict(zip(fields, next(csv.reader([rest.decode("utf-8", "replace")]))))
+
+
+def _co2_row_sample(row, ts):
+    flow = float(row["flow_sccm"])
+    current_raw = (row.get("current_ma") or "").strip()
+    voltage_raw = (row.get("voltage_v") or "").strip()
+    current_ma = float(current_raw) if current_raw else flow_to_current_ma(flow)
+    voltage = float(voltage_raw) if voltage_raw else (current_ma / 1000.0) * SHUNT_OHMS
+    return (ts, flow, current_ma, voltage, (row.get("status") or "OK").strip())
+
+
+def _rehydrate_parallel(name, path, boundary, cutoff, out, chunk_rows):
+    times, cols = read_csv_parallel(path, ["flow_sccm", "current_ma", "voltage_v"], None, cutoff, boundary,
+                                    text_fields=["status"])
+    chunk = []
+    rows = zip(times.astype(object).tolist(), cols["flow_sccm"].tolist(), cols["current_ma"].tolist(),
+               cols["voltage_v"].tolist(), cols["status"])
+    for ts, flow, current_ma, voltage, status in reversed(list(rows)):
+        if flow != flow or ts >= boundary:
+            continue
+        if current_ma != current_ma:
+            current_ma = flow_to_current_ma(flow)
+        if voltage != voltage:
+            voltage = (current_ma / 1000.0) * SHUNT_OHMS
+        chunk.append((ts, flow, current_ma, voltage, (status or "OK").strip()))
+        if len(chunk) >= chunk_rows:
+            out.put((name, chunk))
+            chunk = []
+    if chunk:
+        out.put((name, chunk))
+
+
+def rehydrate_flow_history(jobs, boundary, cutoff, out, chunk_rows: int = 2000):
+    # jobs: [(fermentador, ruta_csv_co2)]. Publica en `out` trozos de muestras
+    # (mas nueva primero) anteriores a `boundary`; None al terminar.
+    for name, path in jobs:
+        if not os.path.exists(path):
+            continue
+        if _parallel_worthwhile(path, cutoff):
+            try:
+                _rehydrate_parallel(name, path, boundary, cutoff, out, chunk_rows)
+                continue
+            except Exception as e:
+                print(f"[HISTORIAL] Lectura paralela de {path} fallo, se lee en serie: {e}")
+        chunk = []
+        try:
+            for ts, row in _timed_rows(read_csv_reverse(path)):
+                if ts >= boundary:
+                    continue
+                if ts < cutoff:
+                    break
+                try:
+                    chunk.append(_co2_row_sample(row, ts))
+                except (KeyError, ValueError):
+                    continue
+                if len(chunk) >= chunk_rows:
+                    out.put((name, chunk))
+                    chunk = []
+        except Exception as e:
+            print(f"[HISTORIAL] No se pudo leer {path}: {e}")
+        if chunk:
+            out.put((name, chunk))
+    out.put(None)
+
+
+# ===== Lectura paralela de CSV grandes =====
+# Un backup de temporada pesa cientos de MB: el archivo se corta en rangos de
+# bytes alineados a fin de linea, cada proceso del pool parsea los suyos
+# (columnas ya convertidas a NumPy) y los trozos se unen en orden de tiempo.
+# Sirve para backup_global.csv y *_co2.csv (cualquier CSV con "timestamp").
+def _csv_chunk_ranges(path: str, parts: int):
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        bounds = [start]
+        for i in range(1, parts):
+            f.seek(start + (size - start) * i // parts)
+            f.readline()
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _parse_csv_chunk(path: str, start: int, end: int, fields, text_fields, fermenter, lo, hi):
+    # Corre en el pool. lo/hi: limites como texto "AAAA-MM-DD hh:mm:ss".
+    np = _numpy()
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8", "replace")]))
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", "replace")
+    index = {name: i for i, name in enumerate(header)}
+    i_ts = index.get("timestamp")
+    i_ferm = index.get("fermentador")
+    wanted = [(f, index.get(f)) for f in fields]
+    wanted_text = [(f, index.get(f)) for f in text_fields]
+    times = []
+    cols = {f: [] for f in fields}
+    texts = {f: [] for f in text_fields}
+    if i_ts is None:
+        text = ""
+    for parts in csv.reader(text.splitlines()):
+        if len(parts) <= i_ts:
+            continue
+        raw = parts[i_ts]
+        if not _is_iso_ts(raw):
+            ts = _ts_strptime(raw)
+            if ts is None:
+                continue
+            raw = ts.strftime("%Y-%m-%d %H:%M:%S")
+        if (lo is not None and raw < lo) or (hi is not None and raw > hi):
+            continue
+        if fermenter and (i_ferm is None or len(parts) <= i_ferm or parts[i_ferm].strip() != fermenter):
+            continue
+        times.append(raw)
+        for f, i in wanted:
+            cols[f].append(_float_or_nan(parts[i]) if i is not None and i < len(parts) else math.nan)
+        for f, i in wanted_text:
+            texts[f].append(parts[i] if i is not None and i < len(parts) else "")
+    try:
+        ts_array = np.array(times, dtype="datetime64[s]")
+    except ValueError:
+        keep = [k for k, raw in enumerate(times) if _ts_iso(raw) is not None]
+        ts_array = np.array([times[k] for k in keep], dtype="datetime64[s]")
+        cols = {f: [v[k] for k in keep] for f, v in cols.items()}
+        texts = {f: [v[k] for k in keep] for f, v in texts.items()}
+    out = {f: np.asarray(v, dtype=float) for f, v in cols.items()}
+    out.update(texts)
+    return ts_array, out
+
+
+def read_csv_parallel(path: str, fields, fermenter=None, t0=None, t1=None, text_fields=(), processes=None):
+    # Tiempos (datetime64[s], orden cronologico) y columnas: numeros como
+    # arreglos float (NaN si falta) y text_fields como listas de texto.
+    np = _numpy()
+    fields, text_fields = list(fields), list(text_fields)
+    lo = t0.strftime("%Y-%m-%d %H:%M:%S") if t0 is not None else None
+    hi = t1.strftime("%Y-%m-%d %H:%M:%S") if t1 is not None else None
+    processes = max(1, processes or os.cpu_count() or 1)
+    # Varios trozos por proceso: si uno tarda mas, los demas siguen.
+    ranges = _csv_chunk_ranges(path, processes * 4 if processes > 1 else 1)
+    args = [(path, a, b, fields, text_fields, fermenter, lo, hi) for a, b in ranges]
+    if processes > 1 and len(ranges) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes, mp_context=_bundle_pool_context()) as pool:
+            chunks = list(pool.map(_parse_csv_chunk, *zip(*args)))
+    else:
+        chunks = [_parse_csv_chunk(*a) for a in args]
+    times = np.concatenate([c[0] for c in chunks]) if chunks else np.array([], dtype="datetime64[s]")
+    cols = {f: np.concatenate([c[1][f] for c in chunks]) if chunks else np.array([]) for f in fields}
+    for f in text_fields:
+        cols[f] = [v for c in chunks for v in c[1][f]]
+    # Filas de distintos fermentadores pueden llegar algo desordenadas.
+    if len(times) > 1 and not bool(np.all(times[1:] >= times[:-1])):
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        for f in fields:
+            cols[f] = cols[f][order]
+        for f in text_fields:
+            cols[f] = [cols[f][i] for i in order]
+    return times, cols
+
+
+def _parallel_worthwhile(path: str, t0=None) -> bool:
+    # Grande y pidiendo mas de un cuarto de lo que abarca (si no, leer la
+    # cola desde el final es mas barato).
+    try:
+        if PARALLEL_READ_MIN_MB <= 0 or os.path.getsize(path) < PARALLEL_READ_MIN_MB * 1024 * 1024:
+            return False
+    except OSError:
+        return False
+    if (os.cpu_count() or 1) < 2:
+        return False
+    if t0 is None:
+        return True
+    first = _first_log_ts(path)
+    if first is None:
+        return False
+    span = (now() - first).total_seconds()
+    return span > 0 and (now() - t0).total_seconds() > span / 4
 
-        left = ttk.Frame(container)
-        left.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
-        right = ttk.Frame(container)
-        right.grid(row=0, column=1, sticky="nsew")
 
-        container.columnconfigure(0, weight=0)
-        container.columnconfigure(1, weight=1)
-        container.rowconfigure(0, weight=1)
+# ===== Series del backup compartidas por los graficos =====
+# Filas separadas por mas de un periodo (y a lo sumo un heartbeat) vienen del
+# registro por banda muerta: el valor anterior siguio vigente hasta 1 s antes.
+_STEP_MIN_GAP_SEC = 1.5
+_STEP_MAX_GAP_SEC = 1.5 * LOG_HEARTBEAT_SEC
 
-        nav = ttk.Frame(left)
-        nav.grid(row=0, column=0, sticky="ew")
-        ttk.Button(nav, text="◀", width=3, command=self.prev_month).grid(row=0, column=0, padx=2)
-        self.lbl_month = ttk.Label(nav, text="", font=("Segoe UI", 12, "bold"))
-        self.lbl_month.grid(row=0, column=1, padx=4)
-        ttk.Button(nav, text="▶", width=3, command=self.next_month).grid(row=0, column=2, padx=2)
-        nav.columnconfigure(1, weight=1)
 
-        self.cal_grid = ttk.Frame(left)
-        self.cal_grid.grid(row=1, column=0, sticky="nsew", pady=(8, 0))
-        for c in range(7):
-            self.cal_grid.columnconfigure(c, weight=1, uniform="days")
-        for col, d in enumerate(DAYS_SHORT):
-            ttk.Label(self.cal_grid, text=d, width=4, anchor="center").grid(
-                row=0, column=col, padx=2, pady=2, sticky="nsew"
-            )
+def _step_hold(older, newer):
+    # older/newer: (ts, T, SP, nut). Devuelve el punto que cierra el escalon.
+    gap = (newer[0] - older[0]).total_seconds()
+    if not _STEP_MIN_GAP_SEC < gap <= _STEP_MAX_GAP_SEC or older[1:] == newer[1:]:
+        return None
+    return (newer[0] - dt.timedelta(seconds=1),) + tuple(older[1:])
 
-        ttk.Label(right, text="Fecha seleccionada:", font=("Segoe UI", 10, "bold")).grid(row=0, column=0, sticky="w")
-        self.lbl_sel = ttk.Label(right, text="")
-        self.lbl_sel.grid(row=1, column=0, sticky="w", pady=(0, 6))
 
-        self.listbox = tk.Listbox(right, height=16)
-        self.listbox.grid(row=2, column=0, sticky="nsew")
-        sb = ttk.Scrollbar(right, orient="vertical", command=self.listbox.yview)
-        sb.grid(row=2, column=1, sticky="ns")
-        self.listbox.config(yscrollcommand=sb.set)
+def _backup_row_values(row, ts=None):
+    ts = ts or _parse_log_ts(row.get("timestamp"))
+    if not ts:
+        return None
+    try:
+        temp = float(row.get("T", "nan"))
+        sp = float(row.get("SP", "nan"))
+        nut = int(row.get("nutricion_activa", "0") or 0)
+    except (TypeError, ValueError):
+        return None
+    ferm = (row.get("fermentador") or "?").strip() or "?"
+    return ts, ferm, temp, sp, nut
+
+
+def _empty_series():
+    return {"ts": [], "t": [], "sp": [], "nut": []}
+
+
+def _load_backup_series_parallel(path: str, cutoff):
+    times, cols = read_csv_parallel(path, ["T", "SP", "nutricion_activa"], None, cutoff,
+                                    text_fields=["fermentador"])
+    data = {}
+    last = {}
+    rows = zip(times.astype(object).tolist(), cols["fermentador"], cols["T"].tolist(), cols["SP"].tolist(),
+               cols["nutricion_activa"].tolist())
+    for ts, ferm, temp, sp, nut in rows:
+        ferm = ferm.strip() or "?"
+        point = (ts, temp, sp, int(nut) if nut == nut else 0)
+        hold = _step_hold(last[ferm], point) if ferm in last else None
+        last[ferm] = point
+        series = data.setdefault(ferm, _empty_series())
+        for p in (point,) if hold is None else (hold, point):
+            series["ts"].append(p[0])
+            series["t"].append(p[1])
+            series["sp"].append(p[2])
+            series["nut"].append(p[3])
+    return data
+
+
+def load_backup_series(path: str, cutoff):
+    # Series por fermentador (orden cronologico) desde `cutoff`; el backup
+    # solo crece al final, asi que se lee desde atras y se corta ahi.
+    data = {}
+    newer = {}
+    if not os.path.exists(path):
+        return data
+    if _parallel_worthwhile(path, cutoff):
+        try:
+            return _load_backup_series_parallel(path, cutoff)
+        except Exception as e:
+            print(f"[GRAFICO] Lectura paralela de {path} fallo, se lee en serie: {e}")
+    for ts, row in _timed_rows(read_csv_reverse(path)):
+        values = _backup_row_values(row, ts)
+        if values is None:
+            continue
+        ts, ferm, temp, sp, nut = values
+        if ts < cutoff:
+            break
+        series = data.setdefault(ferm, _empty_series())
+        point = (ts, temp, sp, nut)
+        hold = _step_hold(point, newer[ferm]) if ferm in newer else None
+        newer[ferm] = point
+        for p in (point,) if hold is None else (hold, point):
+            series["ts"].append(p[0])
+            series["t"].append(p[1])
+            series["sp"].append(p[2])
+            series["nut"].append(p[3])
+    for series in data.values():
+        for values in series.values():
+            values.reverse()
+    return data
+
+
+class BackupSeriesCache:
+    # Una sola copia en memoria de las series T/SP/nutricion para todas las
+    # ventanas de grafico. El disco se lee una vez (en un hilo) al abrir el
+    # primer grafico o al pedir una ventana mas larga; despues las filas
+    # nuevas llegan en vivo desde los fermentadores y cada `interval` s se
+    # publica a los suscriptores el recorte (fermentador, horas) que piden.
+    def __init__(self, root, path_getter, scheduler: Scheduler, interval: float = 5.0):
+        self.root = root
+        self.path_getter = path_getter
+        self.scheduler = scheduler
+        self.interval = interval
+        self.data = {}
+        self._subs = {}
+        self._next_token = 0
+        self._span_hours = 0.0
+        self._path = None
+        self._loading = False
+        self._loaded = queue.Queue()
+        self._live = []
+        self._job = None
+
+    # ---- suscripciones ----
+    def subscribe(self, fermenter, hours, callback):
+        self._next_token += 1
+        token = self._next_token
+        self._subs[token] = [fermenter, hours, callback]
+        self._ensure_span()
+        self._publish_one(token)
+        if self._job is None:
+            self._job = self.scheduler.add("series_cache", self.interval, self._tick, PRIO_UI)
+        return token
+
+    def set_hours(self, token, hours):
+        sub = self._subs.get(token)
+        if sub is None:
+            return
+        sub[1] = hours
+        self._ensure_span()
+        self._publish_one(token)
+
+    def unsubscribe(self, token):
+        self._subs.pop(token, None)
+        if not self._subs:
+            # Sin graficos abiertos no se guarda nada en memoria.
+            self.close()
+            self.data = {}
+            self._span_hours = 0.0
+            self._path = None
+            self._live = []
 
-        form = ttk.Frame(right)
-        form.grid(row=3, column=0, sticky="ew", pady=8)
-        ttk.Label(form, text="Hora (HH:MM):").grid(row=0, column=0, padx=4, pady=2, sticky="e")
-        self.time_var = tk.StringVar(value="08:00")
-        ttk.Entry(form, textvariable=self.time_var, width=8, justify="center").grid(row=0, column=1, padx=4, pady=2)
+    def close(self):
+        if self._job is not None:
+            self.scheduler.remove(self._job.name)
+            self._job = None
 
-        ttk.Label(form, text=value_label).grid(row=1, column=0, padx=4, pady=2, sticky="e")
-        self.val_var = tk.StringVar(value="20.0")
-        ttk.Entry(form, textvariable=self.val_var, width=10, justify="center").grid(row=1, column=1, padx=4, pady=2)
+    # ---- datos ----
+    def ingest_rows(self, rows):
+        if not self._subs:
+            return
+        for row in rows:
+            values = _backup_row_values(row)
+            if values is None:
+                continue
+            if self._loading:
+                self._live.append(values)
+            else:
+                self._append(values)
+
+    def _append(self, values):
+        ts, ferm, temp, sp, nut = values
+        series = self.data.setdefault(ferm, _empty_series())
+        points = [(ts, temp, sp, nut)]
+        if series["ts"]:
+            if ts <= series["ts"][-1]:
+                return  # ya leida desde el disco
+            last = (series["ts"][-1], series["t"][-1], series["sp"][-1], series["nut"][-1])
+            hold = _step_hold(last, points[0])
+            if hold is not None:
+                points.insert(0, hold)
+        for p in points:
+            series["ts"].append(p[0])
+            series["t"].append(p[1])
+            series["sp"].append(p[2])
+            series["nut"].append(p[3])
+
+    def covers(self, t0) -> bool:
+        # Las series ya estan cargadas desde el disco al menos desde t0.
+        if t0 is None or self._loading or self._path is None:
+            return False
+        return t0 >= now() - dt.timedelta(hours=self._span_hours)
+
+    def _ensure_span(self):
+        path = self.path_getter()
+        hours = max((sub[1] for sub in self._subs.values()), default=0.0)
+        if self._loading or (path == self._path and hours <= self._span_hours):
+            return
+        self._loading = True
+        self._path = path
+        self._span_hours = hours
+        cutoff = now() - dt.timedelta(hours=hours)
 
-        btns = ttk.Frame(right)
-        btns.grid(row=4, column=0, sticky="ew", pady=(0, 4))
-        ttk.Button(btns, text="Agregar", command=self.add_event).grid(row=0, column=0, padx=4)
-        ttk.Button(btns, text="Editar", command=self.edit_event).grid(row=0, column=1, padx=4)
-        ttk.Button(btns, text="Borrar", command=self.del_event).grid(row=0, column=2, padx=4)
-        ttk.Button(btns, text="Borrar todo (día)", command=self.clear_day).grid(row=0, column=3, padx=4)
-        if self.import_callback:
-            ttk.Button(btns, text="Importar CSV/Excel", command=self.import_file).grid(
-                row=1, column=0, columnspan=4, padx=4, pady=(6, 0)
-            )
+        def load():
+            try:
+                self._loaded.put(load_backup_series(path, cutoff))
+            except Exception as e:
+                print(f"[GRAFICO] No se pudo leer {path}: {e}")
+                self._loaded.put({})
 
-        right.rowconfigure(2, weight=1)
+        threading.Thread(target=load, name="series-backup", daemon=True).start()
+        self.root.after(200, self._poll_loaded)
 
-        sep = ttk.Separator(self, orient="horizontal")
-        sep.grid(row=1, column=0, sticky="ew", padx=10, pady=(6, 0))
-        footer = ttk.Frame(self, padding=(10, 6))
-        footer.grid(row=2, column=0, sticky="e")
-        ttk.Button(footer, text="Aceptar", command=self.accept).grid(row=0, column=0, padx=6)
-        ttk.Button(footer, text="Cancelar", command=self.cancel).grid(row=0, column=1, padx=6)
+    def _merge_loaded(self) -> bool:
+        try:
+            data = self._loaded.get_nowait()
+        except queue.Empty:
+            return False
+        self._loading = False
+        live, self._live = self._live, []
+        if not self._subs:
+            return False
+        old, self.data = self.data, data
+        # Lo recibido en vivo puede no estar aun en el disco.
+        for ferm, series in old.items():
+            last = data[ferm]["ts"][-1] if ferm in data and data[ferm]["ts"] else None
+            start = bisect.bisect_right(series["ts"], last) if last else 0
+            for i in range(start, len(series["ts"])):
+                self._append((series["ts"][i], ferm, series["t"][i], series["sp"][i], series["nut"][i]))
+        for values in live:
+            self._append(values)
+        self._ensure_span()
+        return True
+
+    def _poll_loaded(self):
+        if self._merge_loaded():
+            self._publish_all()
+        elif self._loading:
+            self.root.after(200, self._poll_loaded)
+
+    def _trim(self):
+        cutoff = now() - dt.timedelta(hours=self._span_hours)
+        for series in self.data.values():
+            i = bisect.bisect_left(series["ts"], cutoff)
+            # Recortar de a bloques evita mover la lista en cada muestra.
+            if i > 1000:
+                for key in series:
+                    del series[key][:i]
+
+    def view(self, fermenter, hours):
+        cutoff = now() - dt.timedelta(hours=hours)
+        out = {}
+        for ferm, series in self.data.items():
+            if fermenter and ferm != fermenter:
+                continue
+            i = bisect.bisect_left(series["ts"], cutoff)
+            if i < len(series["ts"]):
+                out[ferm] = {key: values[i:] for key, values in series.items()}
+        return out
+
+    # ---- publicacion ----
+    def _publish_one(self, token):
+        fermenter, hours, callback = self._subs[token]
+        callback(self.view(fermenter, hours), self._loading)
+
+    def _publish_all(self):
+        for token in list(self._subs):
+            if token in self._subs:
+                try:
+                    self._publish_one(token)
+                except Exception as e:
+                    print(f"[GRAFICO] Error al actualizar: {e}")
 
-        self.styles = {
-            "normal_bg": self.cget("bg"),
-            "today_bg": "#BEE3F8",
-            "has_bg": "#C6F6D5",
-            "other_bg": "#EDF2F7",
-            "disabled_bg": "#E2E8F0",
-        }
+    def _tick(self):
+        self._ensure_span()
+        self._trim()
+        self._publish_all()
 
-        self.day_buttons = []
-        self.refresh_calendar()
-        self.refresh_day_list()
+
+# ===== Consultas de series de tiempo =====
+# Una sola puerta para pedir series: query(fermentador, campos, t0, t1,
+# resolucion) devuelve arreglos NumPy desde la fuente mas barata que cubra
+# el rango (memoria de la GUI, rollups o archivos). Sirve igual desde scripts.
+PROCESS_QUERY_FIELDS = ("T", "SP", "banda", "cold", "hot", "nutricion_activa", "freq_nut")
+CO2_QUERY_FIELDS = ("flow_sccm", "co2_acum_g", "co2_acum_g_l", "periodo_s")
+
+
+def _numpy():
+    try:
+        import numpy as np  # type: ignore
+    except ImportError:
+        raise RuntimeError("Necesitas instalar numpy para consultar series.")
+    return np
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _read_csv_forward(path: str):
+    with open(path, "r", newline="", encoding="utf-8", errors="replace") as f:
+        yield from csv.DictReader(f)
+
+
+def _scan_csv(path: str, fermenter, fields, t0=None, t1=None):
+    # Filas de `fermenter` entre t0 y t1, en orden cronologico; los tiempos
+    # vuelven como arreglo datetime64[s]. Con t0 se lee desde el final y se
+    # corta al pasarlo (los archivos solo crecen al final). Las marcas en
+    # formato fijo se comparan como texto (mismo orden que las fechas) y se
+    # convierten todas juntas con NumPy al final.
+    np = _numpy()
+    times = []
+    cols = {f: [] for f in fields}
+    if not os.path.exists(path):
+        return np.array(times, dtype="datetime64[s]"), cols
+    lo = t0.strftime("%Y-%m-%d %H:%M:%S") if t0 is not None else None
+    hi = t1.strftime("%Y-%m-%d %H:%M:%S") if t1 is not None else None
+    rows = read_csv_reverse(path) if t0 is not None else _read_csv_forward(path)
+    for row in rows:
+        raw = row.get("timestamp")
+        if not _is_iso_ts(raw):
+            ts = _ts_strptime(raw)
+            if ts is None:
+                continue
+            raw = ts.strftime("%Y-%m-%d %H:%M:%S")
+        if lo is not None and raw < lo:
+            break
+        if (hi is not None and raw > hi) or (fermenter and (row.get("fermentador") or "").strip() != fermenter):
+            continue
+        times.append(raw)
+        for f in fields:
+            cols[f].append(_float_or_nan(row.get(f)))
+    if t0 is not None:
+        times.reverse()
+        for values in cols.values():
+            values.reverse()
+    try:
+        return np.array(times, dtype="datetime64[s]"), cols
+    except ValueError:
+        # Alguna marca con forma correcta pero fecha invalida: fila a fila.
+        keep = [i for i, raw in enumerate(times) if _ts_iso(raw) is not None]
+        cols = {f: [values[i] for i in keep] for f, values in cols.items()}
+        return np.array([times[i] for i in keep], dtype="datetime64[s]"), cols
+
+
+def _series_arrays(times, cols, source: str):
+    np = _numpy()
+    out = {"ts": np.array(times, dtype="datetime64[s]")}
+    for f, values in cols.items():
+        out[f] = np.asarray(values, dtype=float)
+    out["source"] = source
+    return out
+
+
+def _downsample(result, fields, resolution: float):
+    # Promedio por balde de `resolution` segundos (NaN no cuenta).
+    np = _numpy()
+    ts = result["ts"]
+    res = max(1, int(resolution))
+    if len(ts) == 0:
+        return result
+    keys = ts.astype("datetime64[s]").astype(np.int64) // res
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    out = {"ts": (keys[starts] * res).astype("datetime64[s]"), "source": result["source"]}
+    for f in fields:
+        values = result[f]
+        finite = np.isfinite(values)
+        sums = np.add.reduceat(np.where(finite, values, 0.0), starts)
+        counts = np.add.reduceat(finite.astype(np.int64), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    return out
+
+
+class SeriesQuery:
+    # backup_path: callable -> ruta del backup global (campos de proceso).
+    # co2_path: callable(fermentador) -> ruta del CSV de CO2.
+    # rollup_root: callable -> carpeta de rollups (None: no se usan).
+    # Las fuentes en memoria son callables (fermentador, campos, t0, t1) que
+    # devuelven (tiempos, columnas) si cubren el rango, o None.
+    def __init__(self, backup_path, co2_path, rollup_root=None):
+        self.backup_path = backup_path
+        self.co2_path = co2_path
+        self.rollup_root = rollup_root
+        self.memory_sources = []
+
+    def add_memory_source(self, source):
+        self.memory_sources.append(source)
+
+    def query(self, fermenter, fields, t0=None, t1=None, resolution=None, memory=True):
+        # memory=False fuera del hilo de Tk: las fuentes en memoria son suyas.
+        fields = list(fields)
+        unknown = [f for f in fields if f not in PROCESS_QUERY_FIELDS and f not in CO2_QUERY_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+        result = self._from_memory(fermenter, fields, t0, t1) if memory else None
+        if result is None and resolution:
+            result = self.rollups(fermenter, fields, t0, t1, resolution, memory)
+        if result is None:
+            result = self._from_files(fermenter, fields, t0, t1)
+        if resolution:
+            result = _downsample(result, fields, resolution)
+        return result
+
+    def rollups(self, fermenter, fields, t0, t1=None, resolution=60, memory=True):
+        # Promedios (o duty de reles) del rollup mas grueso que no supere
+        # `resolution`; el tramo aun sin cerrar sale de la fuente cruda.
+        # None si no hay rollups que cubran t0.
+        usable = [r for r in ROLLUP_RESOLUTIONS if r <= resolution]
+        columns = [rollup_column(f) for f in fields]
+        if self.rollup_root is None or t0 is None or not usable or None in columns:
+            return None
+        seconds = max(usable)
+        path = rollup_path(self.rollup_root(), seconds)
+        first = _first_log_ts(path)
+        if first is None or first > t0:
+            return None
+        times, cols = _scan_csv(path, fermenter, columns, t0, t1)
+        result = _series_arrays(times, {f: cols[c] for f, c in zip(fields, columns)}, "rollup")
+        tail_from = times[-1].astype(object) + dt.timedelta(seconds=seconds) if len(times) else t0
+        if t1 is not None and tail_from > t1:
+            return result
+        tail = (self._from_memory(fermenter, fields, tail_from, t1) if memory else None) or \
+            self._from_files(fermenter, fields, tail_from, t1)
+        np = _numpy()
+        for key in ["ts"] + fields:
+            result[key] = np.concatenate([result[key], tail[key]])
+        return result
+
+    def _from_memory(self, fermenter, fields, t0, t1):
+        for source in self.memory_sources:
+            found = source(fermenter, fields, t0, t1)
+            if found is not None:
+                return _series_arrays(*found, "memoria")
+        return None
+
+    def _from_files(self, fermenter, fields, t0, t1):
+        # Campos de proceso y de CO2 vienen de archivos con relojes
+        # distintos: no se mezclan en una misma consulta.
+        process = [f for f in fields if f in PROCESS_QUERY_FIELDS]
+        if process and len(process) != len(fields):
+            raise ValueError("No se pueden mezclar campos de proceso y de CO2 en una consulta.")
+        path = self.backup_path() if process else self.co2_path(fermenter)
+        if os.path.exists(path) and _parallel_worthwhile(path, t0):
+            return _series_arrays(*read_csv_parallel(path, fields, fermenter, t0, t1), "archivo")
+        return _series_arrays(*_scan_csv(path, fermenter, fields, t0, t1), "archivo")
+
+
+def query(fermenter, fields, t0=None, t1=None, resolution=None,
+          backup_path="./Backup/backup_global.csv", co2_dir="./Proceso"):
+    # Para scripts: lee directo de los archivos del equipo.
+    q = SeriesQuery(lambda: os.path.abspath(backup_path),
+                    lambda name: os.path.abspath(os.path.join(co2_dir, f"{safe_file_name(name)}_co2.csv")),
+                    lambda: rollup_root_for(os.path.abspath(backup_path)))
+    return q.query(fermenter, fields, t0, t1, resolution)
+
+
+class BackgroundSeries:
+    # Para los graficos: fetch(*key) (disco, rollups) corre en un hilo y el
+    # resultado llega al hilo de Tk por una cola revisada con after(), donde
+    # se llama on_ready(key, resultado). Un pedido a la vez; el mismo key se
+    # reutiliza hasta max_age segundos.
+    def __init__(self, root, fetch, on_ready):
+        self.root = root
+        self.fetch = fetch
+        self.on_ready = on_ready
+        self.key = None
+        self.result = None
+        self._at = 0.0
+        self._busy = False
+        self._done = queue.Queue()
+
+    def request(self, key, max_age: float = 300.0):
+        if self._busy or (key == self.key and time.monotonic() - self._at < max_age):
+            return
+        self._busy = True
+
+        def run():
+            try:
+                result = self.fetch(*key)
+            except Exception as e:
+                print(f"[GRAFICO] Consulta de series fallo: {e}")
+                result = None
+            self._done.put((key, result))
+
+        threading.Thread(target=run, name="consulta-series", daemon=True).start()
+        self.root.after(100, self._poll)
+
+    def _poll(self):
+        try:
+            key, result = self._done.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self._poll)
+            return
+        self._busy = False
+        self.key, self.result, self._at = key, result, time.monotonic()
+        self.on_ready(key, result)
+
+
+# ===== Rollups (1 min, 10 min, 1 h) =====
+# Resumen por balde de cada fermentador, mantenido a medida que llegan filas
+# de proceso y de CO2 y agregado junto al backup (Backup/rollups/). Los
+# graficos de ventanas largas leen de aqui en vez de millones de filas.
+ROLLUP_RESOLUTIONS = (60, 600, 3600)
+ROLLUP_VALUE_FIELDS = ("T", "SP", "flow_sccm", "co2_acum_g_l")
+ROLLUP_DUTY_FIELDS = ("cold", "hot", "nutricion_activa")
+# Un balde se cierra cuando llega una fila posterior a su fin + este margen
+# (las filas de CO2 y de proceso llegan con algo de desfase).
+ROLLUP_GRACE_SEC = 15
+# Un valor sigue vigente hasta la fila siguiente, a lo sumo esto (filas
+# ralas por banda muerta o por muestreo adaptativo; mas es un hueco).
+ROLLUP_MAX_HOLD_SEC = max(LOG_HEARTBEAT_SEC, SAMPLE_PERIOD_MAX_SEC)
+ROLLUP_FIELDS = (
+    ("timestamp", "fermentador", "n")
+    + tuple(f"{f}_{stat}" for f in ROLLUP_VALUE_FIELDS for stat in ("min", "mean", "max", "last"))
+    + tuple(f"{f}_duty" for f in ROLLUP_DUTY_FIELDS)
+)
+
+
+def rollup_root_for(backup_path: str) -> str:
+    return os.path.join(os.path.dirname(backup_path), "rollups")
+
+
+def rollup_path(root: str, seconds: int) -> str:
+    return os.path.join(root, f"rollup_{seconds}s.csv")
+
+
+def rollup_column(field: str):
+    if field in ROLLUP_VALUE_FIELDS:
+        return f"{field}_mean"
+    if field in ROLLUP_DUTY_FIELDS:
+        return f"{field}_duty"
+    return None
+
+
+def _bucket_start(ts, seconds: int):
+    # Baldes alineados a la hora local (60, 600 y 3600 dividen el dia).
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    of_day = ts.hour * 3600 + ts.minute * 60 + ts.second
+    return day + dt.timedelta(seconds=of_day - of_day % seconds)
+
+
+class _RollupBucket:
+    __slots__ = ("start", "n", "stats")
+
+    def __init__(self, start):
+        self.start = start
+        self.n = 0
+        self.stats = {}  # campo -> [min, max, suma ponderada, segundos, ultimo]
+
+    def add(self, field, value, weight):
+        st = self.stats.get(field)
+        if st is None:
+            self.stats[field] = [value, value, value * weight, weight, value]
+            return
+        if value < st[0]:
+            st[0] = value
+        if value > st[1]:
+            st[1] = value
+        st[2] += value * weight
+        st[3] += weight
+        st[4] = value
+
+    def row(self, fermenter):
+        out = {"timestamp": self.start.strftime("%Y-%m-%d %H:%M:%S"), "fermentador": fermenter, "n": self.n}
+        for f in ROLLUP_VALUE_FIELDS:
+            st = self.stats.get(f)
+            if st is not None:
+                out[f"{f}_min"] = f"{st[0]:.4f}"
+                out[f"{f}_mean"] = f"{st[2] / st[3]:.4f}"
+                out[f"{f}_max"] = f"{st[1]:.4f}"
+                out[f"{f}_last"] = f"{st[4]:.4f}"
+        for f in ROLLUP_DUTY_FIELDS:
+            st = self.stats.get(f)
+            if st is not None:
+                out[f"{f}_duty"] = f"{st[2] / st[3]:.4f}"
+        return out
+
+
+def _iso(ts) -> str:
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class RollupStore:
+    # add_rows() acumula en memoria; flush() agrega al disco los baldes ya
+    # cerrados. Lo usa un solo hilo (RollupWriter en la GUI).
+    # Cada valor pesa el tiempo que estuvo vigente (hasta la fila siguiente
+    # con ese campo, a lo sumo ROLLUP_MAX_HOLD_SEC) y se reparte entre los
+    # baldes que cruza, asi las filas ralas del registro por banda muerta
+    # pesan lo mismo que las densas de un transiente.
+    # close() no escribe baldes a medias: los guarda en abiertos.json y el
+    # siguiente arranque los retoma, sin duplicar marcas de tiempo. Lo mismo
+    # al cambiar de carpeta: la anterior guarda su estado y la nueva retoma
+    # el suyo.
+    def __init__(self, root_getter, resolutions=ROLLUP_RESOLUTIONS):
+        self.root_getter = root_getter
+        self.resolutions = tuple(resolutions)
+        self._root = None
+        self._reset()
+        self.late_rows = 0
+
+    def _reset(self):
+        self._open = {}          # (segundos, fermentador) -> {inicio: _RollupBucket}
+        self._closed_until = {}  # (segundos, fermentador) -> fin del ultimo balde cerrado
+        self._held = {}          # (fermentador, campo) -> [ts, valor, acreditado hasta]
+        self._newest = {}        # fermentador -> ultima marca de tiempo vista
+        self._closed = {r: [] for r in self.resolutions}
+
+    # ---- estado entre arranques ----
+    def _state_path(self, root):
+        return os.path.join(root, "abiertos.json")
+
+    def _check_root(self):
+        # Perezoso: la ruta del backup puede no existir al construir la App.
+        root = self.root_getter()
+        if root == self._root:
+            return
+        if self._root is not None:
+            self.close()
+            self._reset()
+        self._root = root
+        self._restore(root)
+
+    def _restore(self, root):
+        for seconds in self.resolutions:
+            path = rollup_path(root, seconds)
+            if not os.path.exists(path):
+                continue
+            try:
+                for i, (ts, row) in enumerate(_timed_rows(read_csv_reverse(path))):
+                    if i >= 200:
+                        break
+                    key = (seconds, (row.get("fermentador") or "").strip())
+                    end = ts + dt.timedelta(seconds=seconds)
+                    if key not in self._closed_until or end > self._closed_until[key]:
+                        self._closed_until[key] = end
+            except Exception as e:
+                print(f"[ROLLUP] No se pudo leer {path}: {e}")
+        state_path = self._state_path(root)
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            os.remove(state_path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[ROLLUP] Estado de baldes abiertos ilegible, se descarta: {e}")
+            return
+        for item in state.get("baldes", []):
+            seconds, fermenter = item["s"], item["f"]
+            start = _parse_log_ts(item["inicio"])
+            guard = self._closed_until.get((seconds, fermenter))
+            if seconds not in self._closed or start is None or (guard is not None and start < guard):
+                continue
+            bucket = _RollupBucket(start)
+            bucket.n = item["n"]
+            bucket.stats = {f: list(st) for f, st in item["stats"].items()}
+            self._open.setdefault((seconds, fermenter), {})[start] = bucket
+        for item in state.get("vigentes", []):
+            ts, credited = _parse_log_ts(item["ts"]), _parse_log_ts(item["hasta"])
+            if ts is not None and credited is not None:
+                self._held[(item["f"], item["campo"])] = [ts, item["v"], credited]
+        for fermenter, raw in state.get("ultimo", {}).items():
+            ts = _parse_log_ts(raw)
+            if ts is not None:
+                self._newest[fermenter] = ts
+
+    def _save_open(self):
+        state = {
+            "baldes": [
+                {"s": seconds, "f": fermenter, "inicio": _iso(start), "n": b.n, "stats": b.stats}
+                for (seconds, fermenter), buckets in self._open.items()
+                for start, b in buckets.items()
+            ],
+            "vigentes": [
+                {"f": fermenter, "campo": field, "ts": _iso(h[0]), "v": h[1], "hasta": _iso(h[2])}
+                for (fermenter, field), h in self._held.items()
+            ],
+            "ultimo": {fermenter: _iso(ts) for fermenter, ts in self._newest.items()},
+        }
+        root = self._root
+        try:
+            os.makedirs(root, exist_ok=True)
+            tmp = self._state_path(root) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self._state_path(root))
+        except OSError as e:
+            print(f"[ROLLUP] No se pudo guardar los baldes abiertos: {e}")
+
+    # ---- datos ----
+    def _credit(self, fermenter, field, value, t, until):
+        # Reparte [t, until) de `value` entre los baldes de cada resolucion.
+        for seconds in self.resolutions:
+            key = (seconds, fermenter)
+            guard = self._closed_until.get(key)
+            buckets = self._open.setdefault(key, {})
+            a = t
+            while a < until:
+                start = _bucket_start(a, seconds)
+                b = min(until, start + dt.timedelta(seconds=seconds))
+                if guard is None or start >= guard:
+                    bucket = buckets.get(start)
+                    if bucket is None:
+                        bucket = buckets[start] = _RollupBucket(start)
+                    bucket.add(field, value, (b - a).total_seconds())
+                a = b
+
+    def _advance(self, fermenter, field, upto):
+        held = self._held.get((fermenter, field))
+        if held is None:
+            return
+        end = min(upto, held[0] + dt.timedelta(seconds=ROLLUP_MAX_HOLD_SEC))
+        if end > held[2]:
+            self._credit(fermenter, field, held[1], held[2], end)
+            held[2] = end
+
+    def add_rows(self, rows):
+        self._check_root()
+        touched = set()
+        for row in rows:
+            ts = _parse_log_ts(row.get("timestamp"))
+            fermenter = (row.get("fermentador") or "").strip()
+            if ts is None or not fermenter:
+                continue
+            late = False
+            for f in ROLLUP_VALUE_FIELDS + ROLLUP_DUTY_FIELDS:
+                if f not in row:
+                    continue
+                value = _float_or_nan(row[f])
+                if value != value:
+                    continue
+                held = self._held.get((fermenter, f))
+                if held is not None and ts < held[2]:
+                    # Llego despues de que su tramo ya se acredito.
+                    late = True
+                    continue
+                self._advance(fermenter, f, ts)
+                self._held[(fermenter, f)] = [ts, value, ts]
+            if late:
+                self.late_rows += 1
+                continue
+            for seconds in self.resolutions:
+                guard = self._closed_until.get((seconds, fermenter))
+                start = _bucket_start(ts, seconds)
+                if guard is None or start >= guard:
+                    buckets = self._open.setdefault((seconds, fermenter), {})
+                    bucket = buckets.get(start)
+                    if bucket is None:
+                        bucket = buckets[start] = _RollupBucket(start)
+                    bucket.n += 1
+            if fermenter not in self._newest or ts > self._newest[fermenter]:
+                self._newest[fermenter] = ts
+            touched.add(fermenter)
+        # Lo vigente se acredita hasta el horizonte (ultima fila - margen):
+        # filas de la otra fuente que lleguen con menos desfase aun caben.
+        grace = dt.timedelta(seconds=ROLLUP_GRACE_SEC)
+        for (fermenter, field) in list(self._held):
+            if fermenter in touched:
+                self._advance(fermenter, field, self._newest[fermenter] - grace)
+        self._close_due()
+
+    def _close_due(self, force=False):
+        grace = dt.timedelta(seconds=ROLLUP_GRACE_SEC)
+        for (seconds, fermenter), buckets in self._open.items():
+            newest = self._newest.get(fermenter)
+            width = dt.timedelta(seconds=seconds)
+            for start in sorted(buckets):
+                if not force and (newest is None or start + width > newest - grace):
+                    break
+                bucket = buckets.pop(start)
+                self._closed_until[(seconds, fermenter)] = start + width
+                if bucket.stats:
+                    self._closed[seconds].append(bucket.row(fermenter))
+
+    def flush(self):
+        if self._root is None:
+            self._check_root()
+        root = self._root
+        for seconds in self.resolutions:
+            rows = self._closed[seconds]
+            if not rows:
+                continue
+            try:
+                _append_csv_rows(rollup_path(root, seconds), ROLLUP_FIELDS, rows)
+                self._closed[seconds] = []
+            except OSError as e:
+                print(f"[ROLLUP] No se pudo escribir {rollup_path(root, seconds)}: {e}")
+
+    def close(self):
+        # Al cerrar el programa: lo cerrado al disco, lo abierto a abiertos.json.
+        if self._root is None:
+            return
+        self.flush()
+        self._save_open()
+
+    def finish(self):
+        # Fin de una reconstruccion offline: no vendran mas filas.
+        self._close_due(force=True)
+        self.flush()
+
+
+class RollupWriter:
+    # Hilo de los rollups en la GUI: recibe filas por una cola y hace ahi la
+    # lectura inicial, la acumulacion y las escrituras periodicas, fuera del
+    # hilo de Tk.
+    def __init__(self, store: RollupStore, period: float = 60.0):
+        self.store = store
+        self.period = period
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="rollups", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        if rows:
+            self._queue.put(rows)
+
+    def _run(self):
+        flush_at = time.monotonic() + self.period
+        while True:
+            try:
+                rows = self._queue.get(timeout=max(0.0, flush_at - time.monotonic()))
+            except queue.Empty:
+                rows = ()
+            if rows is None:
+                break
+            try:
+                if rows:
+                    self.store.add_rows(rows)
+                if time.monotonic() >= flush_at:
+                    flush_at = time.monotonic() + self.period
+                    self.store.flush()
+            except Exception as e:
+                print(f"[ROLLUP] Error procesando filas: {e}")
+        try:
+            self.store.close()
+        except Exception as e:
+            print(f"[ROLLUP] Error al cerrar: {e}")
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def build_rollups(backup_path="./Backup/backup_global.csv", co2_dir="./Proceso", root=None):
+    # Reconstruye los rollups desde los CSV crudos (uso offline: primera
+    # vez o tras borrar la carpeta). Reemplaza los archivos existentes.
+    backup_path = os.path.abspath(backup_path)
+    root = root or rollup_root_for(backup_path)
+    for path in [rollup_path(root, seconds) for seconds in ROLLUP_RESOLUTIONS] + [os.path.join(root, "abiertos.json")]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    sources = [backup_path] + sorted(glob.glob(os.path.join(co2_dir, "*_co2.csv")))
+    streams = [_timed_rows(_read_csv_forward(p)) for p in sources if os.path.exists(p)]
+    store = RollupStore(lambda: root)
+    batch = []
+    for _, row in heapq.merge(*streams, key=lambda item: item[0]):
+        batch.append(row)
+        if len(batch) >= 10000:
+            store.add_rows(batch)
+            store.flush()
+            batch = []
+    store.add_rows(batch)
+    store.finish()
+    return root
+
+
+# ===== Exportacion en segundo plano =====
+EXPORT_CHUNK_BYTES = 1024 * 1024
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _complete_lines_size(f, size: int) -> int:
+    # El archivo puede estar creciendo: se corta en el ultimo salto de linea
+    # para no copiar una fila a medio escribir.
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 4096)
+        f.seek(start)
+        block = f.read(pos - start)
+        idx = block.rfind(b"\n")
+        if idx >= 0:
+            return start + idx + 1
+        pos = start
+    return 0
+
+
+def copy_file_chunked(src: str, dst: str, progress=None, cancel=None, chunk_size: int = EXPORT_CHUNK_BYTES):
+    # Copia una instantanea (hasta la ultima fila completa) de src en dst por
+    # bloques; usa sendfile cuando el sistema lo permite. Escribe en
+    # dst + ".part" y renombra al terminar: un destino a medias nunca queda
+    # con el nombre final.
+    tmp = dst + ".part"
+    with open(src, "rb") as fsrc:
+        in_fd = fsrc.fileno()
+        total = _complete_lines_size(fsrc, os.fstat(in_fd).st_size)
+        try:
+            with open(tmp, "wb") as fdst:
+                out_fd = fdst.fileno()
+                use_sendfile = hasattr(os, "sendfile")
+                done = 0
+                while done < total:
+                    if cancel is not None and cancel.is_set():
+                        raise ExportCancelled()
+                    count = min(chunk_size, total - done)
+                    sent = 0
+                    if use_sendfile:
+                        try:
+                            sent = os.sendfile(out_fd, in_fd, done, count)
+                        except OSError:
+                            use_sendfile = False
+                    if not use_sendfile:
+                        fsrc.seek(done)
+                        sent = fdst.write(fsrc.read(count))
+                    if not sent:
+                        break
+                    done += sent
+                    if progress is not None:
+                        progress(done, total)
+                fdst.flush()
+                os.fsync(out_fd)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+    os.replace(tmp, dst)
+    return total
+
+
+class ExportJob:
+    # Exportacion en un hilo: la GUI consulta progreso/estado sin bloquearse
+    # y el registro de CSV sigue corriendo mientras tanto.
+    def __init__(self, src: str, dst: str):
+        self.src = src
+        self.dst = dst
+        self.done_bytes = 0
+        self.total_bytes = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="exportar", daemon=True)
+        self._thread.start()
+
+    def _progress(self, done, total):
+        self.done_bytes = done
+        self.total_bytes = total
+
+    def _run(self):
+        try:
+            copy_file_chunked(self.src, self.dst, progress=self._progress, cancel=self._cancel)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def fraction(self) -> float:
+        if self.finished and self.error is None and not self.cancelled:
+            return 1.0
+        return self.done_bytes / self.total_bytes if self.total_bytes else 0.0
+
+    def detail(self) -> str:
+        return f"{self.done_bytes / 1e6:0.1f} / {self.total_bytes / 1e6:0.1f} MB"
+
+    def cancel(self):
+        self._cancel.set()
+
+
+# ===== Paquete de exportacion (tar.gz) =====
+# Cada archivo se filtra y comprime como un miembro gzip independiente en un
+# pool de procesos; los miembros concatenados forman un .tar.gz valido (gzip
+# admite varios miembros), asi la compresion escala con los nucleos. Cada
+# proceso lee su archivo fila a fila y escribe el miembro en un temporal:
+# ni el CSV ni el comprimido pasan enteros por la RAM ni por el pickle.
+BUNDLE_CANCEL_CHECK_ROWS = 20000
+
+
+def _calendar_csv_bytes(events) -> bytes:
+    lines = ["fecha,hora,valor"]
+    for day in sorted(events or {}):
+        for ev in sorted(events[day], key=lambda e: e["time"]):
+            lines.append(f"{day},{ev['time']},{ev['value']}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _filter_csv_lines(lines, t0, t1):
+    # Conserva la cabecera y las filas con timestamp dentro de [t0, t1].
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first
+    header = first.decode("utf-8", "replace").strip().split(",")
+    if "timestamp" not in header:
+        yield from lines
+        return
+    col = header.index("timestamp")
+    parse = None
+    for line in lines:
+        parts = line.decode("utf-8", "replace").split(",")
+        if parse is None:
+            parse = log_ts_parser(parts[col] if len(parts) > col else "")
+        ts = parse(parts[col]) if len(parts) > col else None
+        if ts is None:
+            continue
+        if (t0 is None or ts >= t0) and (t1 is None or ts <= t1):
+            yield line
+
+
+def _snapshot_lines(f, size: int):
+    # Filas completas hasta size (la instantanea tomada al empezar).
+    for line in f:
+        if len(line) > size:
+            return
+        size -= len(line)
+        yield line
+
+
+def _tar_header(arcname: str, size: int, mtime: float) -> bytes:
+    import tarfile
+
+    info = tarfile.TarInfo(arcname)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _tar_padding(size: int) -> bytes:
+    import tarfile
+
+    return b"\0" * ((-size) % tarfile.BLOCKSIZE)
+
+
+def _tar_segment(arcname: str, data: bytes, mtime: float) -> bytes:
+    return _tar_header(arcname, len(data), mtime) + data + _tar_padding(len(data))
+
+
+def _bundle_member(arcname, path, data, t0, t1, work_dir):
+    # Corre en un proceso del pool: lee (instantanea hasta la ultima fila
+    # completa), filtra por rango y comprime el contenido y el relleno tar en
+    # un temporal de work_dir. La cabecera tar depende del tamano filtrado:
+    # la escribe el padre como miembro gzip propio delante del temporal.
+    # Aborta si aparece work_dir/cancelado.
+    import gzip
+    import hashlib
+    import io
+    import tempfile
+
+    flag = os.path.join(work_dir, "cancelado")
+    mtime = time.time()
+    digest = hashlib.sha256()
+    size = 0
+    count = 0
+    fd, part = tempfile.mkstemp(suffix=".gz", dir=work_dir)
+    try:
+        if path is not None:
+            src = open(path, "rb")
+            mtime = os.path.getmtime(path)
+            lines = _snapshot_lines(src, _complete_lines_size(src, os.fstat(src.fileno()).st_size))
+            src.seek(0)
+        else:
+            src = None
+            lines = io.BytesIO(data)
+        if arcname.lower().endswith(".csv"):
+            lines = _filter_csv_lines(lines, t0, t1)
+        try:
+            with open(fd, "wb") as out, \
+                    gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=6, mtime=0) as gz:
+                for line in lines:
+                    gz.write(line)
+                    digest.update(line)
+                    size += len(line)
+                    count += 1
+                    if count % BUNDLE_CANCEL_CHECK_ROWS == 0 and os.path.exists(flag):
+                        raise ExportCancelled()
+                gz.write(_tar_padding(size))
+        finally:
+            if src is not None:
+                src.close()
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    meta = {
+        "archivo": arcname,
+        "origen": path,
+        "bytes": size,
+        "filas": max(0, count - 1) if arcname.lower().endswith(".csv") else None,
+        "sha256": digest.hexdigest(),
+    }
+    return meta, mtime, part
+
+
+def _bundle_pool_context():
+    # forkserver/spawn: no se hace fork de un proceso con Tk e hilos vivos.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class BundleJob:
+    # Arma el .tar.gz en un hilo que reparte filtrado y compresion en un pool
+    # de procesos. sources: [(arcname, path o None, bytes o None)].
+    def __init__(self, sources, dst: str, t0=None, t1=None, processes=None):
+        self.sources = list(sources)
+        self.dst = dst
+        self.t0 = t0
+        self.t1 = t1
+        self.processes = processes or max(1, min(len(self.sources), os.cpu_count() or 1))
+        self.done_members = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="paquete", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import gzip
+        import shutil
+        import tarfile
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor, wait
+
+        tmp = self.dst + ".part"
+        work_dir = None
+        try:
+            # Temporales junto al destino: mismo disco, no se llena /tmp.
+            work_dir = tempfile.mkdtemp(prefix=".paquete_", dir=os.path.dirname(os.path.abspath(self.dst)))
+            with ProcessPoolExecutor(max_workers=self.processes, mp_context=_bundle_pool_context()) as pool:
+                futures = [pool.submit(_bundle_member, arc, path, data, self.t0, self.t1, work_dir)
+                           for arc, path, data in self.sources]
+                entries = []
+                with open(tmp, "wb") as out:
+                    # Se escribe en orden a medida que terminan los miembros.
+                    for fut in futures:
+                        while not wait([fut], timeout=0.2).done:
+                            if self._cancel.is_set():
+                                # Los pendientes no arrancan; los que corren
+                                # ven la marca y abortan: la salida del with
+                                # no espera a que terminen de comprimir.
+                                open(os.path.join(work_dir, "cancelado"), "wb").close()
+                                pool.shutdown(wait=False, cancel_futures=True)
+                                raise ExportCancelled()
+                        meta, mtime, part = fut.result()
+                        out.write(gzip.compress(_tar_header(meta["archivo"], meta["bytes"], mtime), mtime=0))
+                        with open(part, "rb") as f:
+                            shutil.copyfileobj(f, out, EXPORT_CHUNK_BYTES)
+                        os.remove(part)
+                        entries.append(meta)
+                        self.done_members += 1
+                    manifest = {
+                        "creado": now_str(),
+                        "desde": self.t0.strftime("%Y-%m-%d %H:%M:%S") if self.t0 else None,
+                        "hasta": self.t1.strftime("%Y-%m-%d %H:%M:%S") if self.t1 else None,
+                        "fermentadores": [cfg["name"] for cfg in FERMENTERS],
+                        "volumen_caldo_l": BROTH_VOLUME_L,
+                        "archivos": entries,
+                    }
+                    data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+                    out.write(gzip.compress(_tar_segment("manifest.json", data, time.time()), mtime=0))
+                    out.write(gzip.compress(b"\0" * (2 * tarfile.BLOCKSIZE), mtime=0))
+                    out.flush()
+                    os.fsync(out.fileno())
+            os.replace(tmp, self.dst)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            if work_dir is not None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            self.finished = True
+
+    def fraction(self) -> float:
+        if self.finished and self.error is None and not self.cancelled:
+            return 1.0
+        total = len(self.sources) + 1
+        return self.done_members / total
+
+    def detail(self) -> str:
+        return f"{self.done_members} / {len(self.sources)} archivos"
+
+    def cancel(self):
+        self._cancel.set()
+
+
+# ===== Dashboard web (solo stdlib) =====
+DASHBOARD_HTML = """<!doctype html>
+<html lang="es"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Fermentadores</title>
+<style>
+body{margin:0;font-family:Segoe UI,Arial,sans-serif;background:#020617;color:#e5e7eb}
+header{display:flex;justify-content:space-between;padding:10px 16px;background:#0f172a}
+main{display:grid;grid-template-columns:repeat(auto-fit,minmax(380px,1fr));gap:12px;padding:12px}
+.card{border:2px solid #111827;border-radius:18px;padding:12px;background:#0b1220}
+.row{display:flex;gap:14px;flex-wrap:wrap;font-size:14px;margin:4px 0}
+.big{font-size:30px;font-weight:bold;color:#f97316}
+.on{color:#22c55e}.off{color:#6b7280}
+canvas{width:100%;height:140px;background:#020617;border-radius:8px;margin-top:6px}
+</style></head><body>
+<header><b>Panel de fermentadores</b><span id="clock">conectando...</span></header>
+<main id="grid"></main>
+<script>
+const hist = {};
+const cards = {};
+function fmt(v, d){ return v === null || v === undefined ? "--" : Number(v).toFixed(d); }
+function card(name){
+  if (cards[name]) return cards[name];
+  const el = document.createElement("div");
+  el.className = "card";
+  el.innerHTML = `<h2>Fermentador ${name}</h2>
+    <div class="row"><span class="big" data-k="t">--</span><span>SP <b data-k="sp">--</b> °C</span>
+    <span>Banda <b data-k="band">--</b></span><span data-k="mode"></span></div>
+    <div class="row"><span data-k="cold">Frío</span><span data-k="hot">Caliente</span>
+    <span data-k="nut">Nutrición</span><span>CSV <b data-k="csv">--</b></span></div>
+    <div class="row"><span>CO2 <b data-k="flow">--</b> SCCM</span><span><b data-k="total">--</b> g/L acum.</span>
+    <span>Fase: <b data-k="phase">--</b></span></div>
+    <canvas data-k="ct"></canvas><canvas data-k="cf"></canvas>`;
+  document.getElementById("grid").appendChild(el);
+  cards[name] = el;
+  return el;
+}
+function set(el, k, text, cls){
+  const n = el.querySelector(`[data-k="${k}"]`);
+  n.textContent = text;
+  if (cls !== undefined) n.className = cls;
+}
+function draw(canvas, pts, series, colors, label){
+  const w = canvas.width = canvas.clientWidth, h = canvas.height = canvas.clientHeight;
+  const g = canvas.getContext("2d");
+  g.clearRect(0, 0, w, h);
+  g.fillStyle = "#9ca3af"; g.font = "11px sans-serif"; g.fillText(label, 6, 12);
+  if (pts.length < 2) return;
+  let lo = Infinity, hi = -Infinity;
+  for (const p of pts) for (const i of series) if (p[i] !== null) { lo = Math.min(lo, p[i]); hi = Math.max(hi, p[i]); }
+  if (!isFinite(lo)) return;
+  if (hi === lo) { hi += 1; lo -= 1; }
+  const t0 = pts[0][0], t1 = pts[pts.length - 1][0] || t0 + 1;
+  series.forEach((i, k) => {
+    g.strokeStyle = colors[k]; g.lineWidth = 1.5; g.beginPath();
+    let started = false;
+    for (const p of pts) {
+      if (p[i] === null) continue;
+      const x = (p[0] - t0) / Math.max(1, t1 - t0) * (w - 8) + 4;
+      const y = h - 4 - (p[i] - lo) / (hi - lo) * (h - 20);
+      if (started) g.lineTo(x, y); else { g.moveTo(x, y); started = true; }
+    }
+    g.stroke();
+  });
+  g.fillText(`${lo.toFixed(1)} – ${hi.toFixed(1)}`, w - 90, 12);
+}
+function render(name){
+  const el = card(name), pts = hist[name] || [];
+  draw(el.querySelector('[data-k="ct"]'), pts, [1, 2], ["#f97316", "#60a5fa"], "T / SP (°C)");
+  draw(el.querySelector('[data-k="cf"]'), pts, [3], ["#2563eb"], "CO2 (SCCM)");
+}
+function apply(s){
+  document.getElementById("clock").textContent = s.ts;
+  for (const [name, f] of Object.entries(s.fermenters)) {
+    const el = card(name);
+    set(el, "t", fmt(f.t, 1) + " °C"); set(el, "sp", fmt(f.sp, 2)); set(el, "band", fmt(f.band, 2));
+    set(el, "mode", f.manual ? "MANUAL" : "AUTO");
+    set(el, "cold", "Frío", f.cold ? "on" : "off"); set(el, "hot", "Caliente", f.hot ? "on" : "off");
+    set(el, "nut", "Nutrición", f.nut ? "on" : "off");
+    set(el, "csv", f.csv_running ? "grabando" : "detenido");
+    set(el, "flow", fmt(f.flow, 2)); set(el, "total", fmt(f.co2_g_l, 2)); set(el, "phase", f.phase || "--");
+    const pts = hist[name] = hist[name] || [];
+    pts.push([s.epoch_ms, f.t, f.sp, f.flow]);
+    if (pts.length > s.history_points) pts.splice(0, pts.length - s.history_points);
+    render(name);
+  }
+}
+fetch("api/history").then(r => r.json()).then(h => {
+  for (const [name, pts] of Object.entries(h)) { hist[name] = pts; render(name); }
+  const es = new EventSource("events");
+  es.onmessage = e => apply(JSON.parse(e.data));
+  es.onerror = () => { document.getElementById("clock").textContent = "reconectando..."; };
+});
+</script></body></html>
+"""
+
+
+def _json_num(value):
+    # NaN/inf no son JSON valido para el navegador.
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class DashboardHub:
+    # Ultimo snapshot (ya serializado) e historial corto por fermentador.
+    # Lo alimenta el hilo de Tk; lo leen los hilos del servidor HTTP.
+    def __init__(self, history_points: int = DASHBOARD_HISTORY_POINTS):
+        self.history_points = history_points
+        self.history = {}
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._payload = None
+
+    def publish(self, snapshot):
+        snapshot["history_points"] = self.history_points
+        payload = json.dumps(snapshot, ensure_ascii=False).encode("utf-8")
+        with self._cond:
+            for name, f in snapshot["fermenters"].items():
+                points = self.history.setdefault(name, collections.deque(maxlen=self.history_points))
+                points.append((snapshot["epoch_ms"], f["t"], f["sp"], f["flow"]))
+            self._payload = payload
+            self._seq += 1
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._seq, self._payload
+
+    def wait(self, seq: int, timeout: float):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq, timeout)
+            return self._seq, self._payload
+
+    def history_json(self) -> bytes:
+        with self._cond:
+            data = {name: list(points) for name, points in self.history.items()}
+        return json.dumps(data).encode("utf-8")
+
+
+def _dashboard_handler_class():
+    from http.server import BaseHTTPRequestHandler
+
+    class DashboardHandler(BaseHTTPRequestHandler):
+        server_version = "Fermentadores/1.0"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code, body: bytes, content_type="application/json; charset=utf-8"):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, code, data):
+            self._send(code, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+        def _api(self, handler):
+            api = self.server.api
+            if api is None:
+                self._send_json(404, {"error": "API deshabilitada (definir API_TOKEN)"})
+                return
+            if not api.authorized(self.headers):
+                self._send_json(401, {"error": "Token inválido"})
+                return
+            try:
+                self._send_json(200, handler(api))
+            except ApiError as e:
+                self._send_json(e.code, {"error": str(e)})
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+
+        def do_POST(self):
+            parts = [p for p in self.path.split("?", 1)[0].split("/") if p]
+            # /api/fermenters/<nombre>/<accion>
+            if len(parts) != 4 or parts[:2] != ["api", "fermenters"]:
+                self._send_json(404, {"error": "no encontrado"})
+                return
+            length = parse_int(self.headers.get("Content-Length", "0"), 0)
+            if length > 64 * 1024:
+                self._send_json(413, {"error": "cuerpo demasiado grande"})
+                return
+            raw = self.rfile.read(length) if length > 0 else b""
+            try:
+                body = json.loads(raw.decode("utf-8")) if raw.strip() else {}
+            except ValueError:
+                self._send_json(400, {"error": "JSON inválido"})
+                return
+            self._api(lambda api: api.execute(parts[2], parts[3], body))
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            hub = self.server.hub
+            parts = [p for p in path.split("/") if p]
+            if parts[:2] == ["api", "fermenters"] and len(parts) <= 3:
+                name = parts[2] if len(parts) == 3 else None
+                self._api(lambda api: api.state(name))
+            elif path in ("/", "/index.html"):
+                self._send(200, DASHBOARD_HTML.encode("utf-8"), "text/html; charset=utf-8")
+            elif path == "/api/state":
+                _, payload = hub.latest()
+                self._send(200, payload or b"{}")
+            elif path == "/api/history":
+                self._send(200, hub.history_json())
+            elif path == "/events":
+                self._stream_events(hub)
+            else:
+                self._send(404, b'{"error": "no encontrado"}')
+
+        def _stream_events(self, hub):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "keep-alive")
+            self.end_headers()
+            seq, _ = hub.latest()
+            try:
+                while not self.server.stopping:
+                    new_seq, payload = hub.wait(seq, timeout=15.0)
+                    if new_seq == seq or payload is None:
+                        self.wfile.write(b": ping\n\n")
+                    else:
+                        self.wfile.write(b"data: " + payload + b"\n\n")
+                    self.wfile.flush()
+                    seq = new_seq
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+
+    return DashboardHandler
+
+
+# ===== API REST de control =====
+def _bool_value(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in {"1", "true", "yes", "on", "si", "sí"}
+    return bool(value)
+
+
+def _finite_float(value) -> float:
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("valor no finito")
+    return value
+
+
+# accion -> (destino, metodo, conversion del valor; None = sin valor).
+# Reiniciar CSV borra archivos: queda solo en la GUI.
+API_ACTIONS = {
+    "sp": ("ctrl", "set_sp", _finite_float),
+    "band": ("ctrl", "set_band", _finite_float),
+    "manual": ("ctrl", "set_manual_mode", _bool_value),
+    "freq_nut": ("ctrl", "set_freq_nut", _finite_float),
+    "forzar_frio": ("ctrl", "forzar_frio", None),
+    "forzar_caliente": ("ctrl", "forzar_caliente", None),
+    "cerrar_todo": ("ctrl", "cerrar_todo", None),
+    "stop_all": ("ctrl", "stop_all", None),
+    "csv_start": ("ctrl", "csv_start", None),
+    "csv_pause": ("ctrl", "csv_pause", None),
+    "co2_csv_start": ("flow", "csv_start", None),
+    "co2_csv_pause": ("flow", "csv_pause", None),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, code: int, msg: str):
+        super().__init__(msg)
+        self.code = code
+
+
+class ControlApi:
+    # Puente entre los hilos HTTP y el hilo de Tk: los pedidos se encolan y
+    # el hilo de Tk los aplica sobre los mismos proxies que usa la GUI, que
+    # los mandan por la cola de comandos del loop de control.
+    def __init__(self, token: str, units, state_getter, timeout: float = 5.0):
+        self.token = token
+        self.units = units
+        self.state_getter = state_getter
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def authorized(self, headers) -> bool:
+        import hmac
+
+        raw = headers.get("Authorization", "")
+        supplied = raw[7:].strip() if raw.lower().startswith("bearer ") else headers.get("X-API-Token", "")
+        return bool(self.token) and hmac.compare_digest(supplied.encode("utf-8"), self.token.encode("utf-8"))
+
+    def _call(self, fn):
+        done = threading.Event()
+        box = {}
+        self._queue.put((fn, done, box))
+        if not done.wait(self.timeout):
+            # Si el hilo de Tk aun no lo toma se anula: un 503 nunca se
+            # aplica despues. Si ya empezo, se espera su resultado.
+            with self._lock:
+                if not box.get("started"):
+                    box["cancelled"] = True
+                    raise ApiError(503, "La interfaz no respondió a tiempo; no se aplicó.")
+            done.wait()
+        if "error" in box:
+            raise box["error"]
+        return box["result"]
+
+    def drain(self):
+        # Hilo de Tk.
+        while True:
+            try:
+                fn, done, box = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                if box.get("cancelled"):
+                    continue
+                box["started"] = True
+            try:
+                box["result"] = fn()
+            except Exception as e:
+                box["error"] = e
+            finally:
+                done.set()
+
+    def state(self, name=None):
+        if name is not None and name not in self.units:
+            raise ApiError(404, f"No existe el fermentador {name}")
+        states = self._call(self.state_getter)
+        return states if name is None else states[name]
+
+    def execute(self, name: str, action: str, body):
+        if name not in self.units:
+            raise ApiError(404, f"No existe el fermentador {name}")
+        if action not in API_ACTIONS:
+            raise ApiError(404, f"Acción desconocida: {action}")
+        target, method, convert = API_ACTIONS[action]
+        args = ()
+        if convert is not None:
+            if not isinstance(body, dict) or "value" not in body:
+                raise ApiError(400, 'Falta "value" en el cuerpo JSON.')
+            try:
+                args = (convert(body["value"]),)
+            except (TypeError, ValueError) as e:
+                raise ApiError(400, f"Valor inválido: {e}")
+
+        def apply():
+            ctrl, flow = self.units[name]
+            getattr(ctrl if target == "ctrl" else flow, method)(*args)
+            return self.state_getter()[name]
+
+        return self._call(apply)
+
+
+class DashboardServer:
+    def __init__(self, host: str, port: int, hub: DashboardHub):
+        from http.server import ThreadingHTTPServer
+
+        self.hub = hub
+        self.httpd = ThreadingHTTPServer((host, port), _dashboard_handler_class())
+        self.httpd.daemon_threads = True
+        self.httpd.hub = hub
+        self.httpd.api = None
+        self.httpd.stopping = False
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="dashboard", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.stopping = True
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ===== LED widget =====
+class Led:
+    def __init__(self, parent, size=20):
+        bg = None
+        for key in ("fg_color", "background", "bg"):
+            try:
+                bg = parent.cget(key)
+                break
+            except Exception:
+                continue
+        if bg is None:
+            bg = "#111827"
+        self.canvas = tk.Canvas(
+            parent,
+            width=size,
+            height=size,
+            highlightthickness=0,
+            bd=0,
+            bg=bg,
+        )
+        r = 2
+        self.oval = self.canvas.create_oval(r, r, size - r, size - r, fill="red", outline="#111")
+        self._color = "red"
+
+    def widget(self):
+        return self.canvas
+
+    def set_color(self, color: str):
+        if color == self._color:
+            return
+        self._color = color
+        self.canvas.itemconfig(self.oval, fill=color)
+
+    def set_on(self, on: bool):
+        self.set_color("#22c55e" if on else "#ef4444")
+
+
+# ===== Calendario por FECHAS =====
+DAYS_SHORT = ["L", "Ma", "Mi", "J", "V", "S", "D"]
+
+
+class DateCalendarDialog(tk.Toplevel):
+    def __init__(self, master, title_label, value_label, value_type=float, initial=None, import_callback=None):
+        super().__init__(master)
+        self.title(title_label)
+        self.geometry("840x540")
+        self.resizable(False, False)
+        self.transient(master)
+        self.grab_set()
+
+        self.value_type = value_type
+        self.data = {}
+        self.import_callback = import_callback
+        if isinstance(initial, dict):
+            for k, v in initial.items():
+                self.data[k] = [dict(ev) for ev in v]
+
+        self.today = dt.date.today()
+        self.selected_date = self.today
+        self.view_year = self.today.year
+        self.view_month = self.today.month
+
+        container = ttk.Frame(self, padding=10)
+        container.grid(row=0, column=0, sticky="nsew")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        left = ttk.Frame(container)
+        left.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
+        right = ttk.Frame(container)
+        right.grid(row=0, column=1, sticky="nsew")
+
+        container.columnconfigure(0, weight=0)
+        container.columnconfigure(1, weight=1)
+        container.rowconfigure(0, weight=1)
+
+        nav = ttk.Frame(left)
+        nav.grid(row=0, column=0, sticky="ew")
+        ttk.Button(nav, text="◀", width=3, command=self.prev_month).grid(row=0, column=0, padx=2)
+        self.lbl_month = ttk.Label(nav, text="", font=("Segoe UI", 12, "bold"))
+        self.lbl_month.grid(row=0, column=1, padx=4)
+        ttk.Button(nav, text="▶", width=3, command=self.next_month).grid(row=0, column=2, padx=2)
+        nav.columnconfigure(1, weight=1)
+
+        self.cal_grid = ttk.Frame(left)
+        self.cal_grid.grid(row=1, column=0, sticky="nsew", pady=(8, 0))
+        for c in range(7):
+            self.cal_grid.columnconfigure(c, weight=1, uniform="days")
+        for col, d in enumerate(DAYS_SHORT):
+            ttk.Label(self.cal_grid, text=d, width=4, anchor="center").grid(
+                row=0, column=col, padx=2, pady=2, sticky="nsew"
+            )
+
+        ttk.Label(right, text="Fecha seleccionada:", font=("Segoe UI", 10, "bold")).grid(row=0, column=0, sticky="w")
+        self.lbl_sel = ttk.Label(right, text="")
+        self.lbl_sel.grid(row=1, column=0, sticky="w", pady=(0, 6))
+
+        self.listbox = tk.Listbox(right, height=16)
+        self.listbox.grid(row=2, column=0, sticky="nsew")
+        sb = ttk.Scrollbar(right, orient="vertical", command=self.listbox.yview)
+        sb.grid(row=2, column=1, sticky="ns")
+        self.listbox.config(yscrollcommand=sb.set)
+
+        form = ttk.Frame(right)
+        form.grid(row=3, column=0, sticky="ew", pady=8)
+        ttk.Label(form, text="Hora (HH:MM):").grid(row=0, column=0, padx=4, pady=2, sticky="e")
+        self.time_var = tk.StringVar(value="08:00")
+        ttk.Entry(form, textvariable=self.time_var, width=8, justify="center").grid(row=0, column=1, padx=4, pady=2)
+
+        ttk.Label(form, text=value_label).grid(row=1, column=0, padx=4, pady=2, sticky="e")
+        self.val_var = tk.StringVar(value="20.0")
+        ttk.Entry(form, textvariable=self.val_var, width=10, justify="center").grid(row=1, column=1, padx=4, pady=2)
+
+        btns = ttk.Frame(right)
+        btns.grid(row=4, column=0, sticky="ew", pady=(0, 4))
+        ttk.Button(btns, text="Agregar", command=self.add_event).grid(row=0, column=0, padx=4)
+        ttk.Button(btns, text="Editar", command=self.edit_event).grid(row=0, column=1, padx=4)
+        ttk.Button(btns, text="Borrar", command=self.del_event).grid(row=0, column=2, padx=4)
+        ttk.Button(btns, text="Borrar todo (día)", command=self.clear_day).grid(row=0, column=3, padx=4)
+        if self.import_callback:
+            ttk.Button(btns, text="Importar CSV/Excel", command=self.import_file).grid(
+                row=1, column=0, columnspan=4, padx=4, pady=(6, 0)
+            )
+
+        right.rowconfigure(2, weight=1)
+
+        sep = ttk.Separator(self, orient="horizontal")
+        sep.grid(row=1, column=0, sticky="ew", padx=10, pady=(6, 0))
+        footer = ttk.Frame(self, padding=(10, 6))
+        footer.grid(row=2, column=0, sticky="e")
+        ttk.Button(footer, text="Aceptar", command=self.accept).grid(row=0, column=0, padx=6)
+        ttk.Button(footer, text="Cancelar", command=self.cancel).grid(row=0, column=1, padx=6)
+
+        self.styles = {
+            "normal_bg": self.cget("bg"),
+            "today_bg": "#BEE3F8",
+            "has_bg": "#C6F6D5",
+            "other_bg": "#EDF2F7",
+            "disabled_bg": "#E2E8F0",
+        }
+
+        self.day_buttons = []
+        self.refresh_calendar()
+        self.refresh_day_list()
 
     def month_title(self):
         return f"{MESES_ES[self.view_month]} {self.view_year}"
 
-    def refresh_calendar(self):
-        for child in list(self.cal_grid.grid_slaves()):
-            info = child.grid_info()
-            if int(info["row"]) > 0:
-                child.destroy()
+    def refresh_calendar(self):
+        for child in list(self.cal_grid.grid_slaves()):
+            info = child.grid_info()
+            if int(info["row"]) > 0:
+                child.destroy()
+
+        self.lbl_month.config(text=self.month_title())
+        self.day_buttons.clear()
+
+        cal = pycal.Calendar(firstweekday=0)
+        weeks = cal.monthdatescalendar(self.view_year, self.view_month)
+
+        for r, week in enumerate(weeks, start=1):
+            for c, d in enumerate(week):
+                btn = tk.Button(
+                    self.cal_grid,
+                    text=str(d.day),
+                    width=4,
+                    relief="raised",
+                    bd=1,
+                    command=lambda dd=d: self.select_date(dd),
+                )
+                btn.grid(row=r, column=c, padx=2, pady=2, sticky="nsew")
+
+                is_other_month = d.month != self.view_month
+                is_past = d < self.today
+                has_ev = ymd(d) in self.data and len(self.data[ymd(d)]) > 0
+                is_today = d == self.today
+
+                if is_past:
+                    btn.config(
+                        state="disabled",
+                        bg=self.styles["disabled_bg"],
+                        activebackground=self.styles["disabled_bg"],
+                    )
+                else:
+                    bg = self.styles["other_bg"] if is_other_month else self.styles["normal_bg"]
+                    if has_ev:
+                        bg = self.styles["has_bg"]
+                    if is_today:
+                        bg = self.styles["today_bg"] if not has_ev else "#9AE6B4"
+                    btn.config(bg=bg, activebackground=bg)
+
+                if d == self.selected_date:
+                    btn.config(relief="sunken")
+
+                self.day_buttons.append((btn, d))
+
+        self.lbl_sel.config(text=ymd(self.selected_date))
+
+    def select_date(self, date_obj: dt.date):
+        if date_obj < self.today:
+            return
+        self.selected_date = date_obj
+        self.refresh_calendar()
+        self.refresh_day_list()
+
+    def prev_month(self):
+        y, m = self.view_year, self.view_month
+        if m == 1:
+            y, m = y - 1, 12
+        else:
+            m -= 1
+        self.view_year, self.view_month = y, m
+        self.refresh_calendar()
+
+    def next_month(self):
+        y, m = self.view_year, self.view_month
+        if m == 12:
+            y, m = y + 1, 1
+        else:
+            m += 1
+        self.view_year, self.view_month = y, m
+        self.refresh_calendar()
+
+    def refresh_day_list(self):
+        self.listbox.delete(0, tk.END)
+        flist = self.data.get(ymd(self.selected_date), [])
+        for it in sorted(flist, key=lambda x: x["time"]):
+            self.listbox.insert(tk.END, f"{it['time']}  •  {it['value']}")
+
+    def _sel_index(self):
+        sel = self.listbox.curselection()
+        return sel[0] if sel else None
+
+    def add_event(self):
+        if self.selected_date < self.today:
+            messagebox.showerror("Calendario", "No se pueden programar días anteriores al actual.")
+            return
+        t = self.time_var.get().strip()
+        if not hhmm_ok(t):
+            messagebox.showerror("Calendario", "Hora inválida (HH:MM).")
+            return
+        try:
+            val = self.value_type(self.val_var.get().strip())
+        except Exception:
+            messagebox.showerror("Calendario", "Valor inválido.")
+            return
+        key = ymd(self.selected_date)
+        self.data.setdefault(key, []).append({"time": t, "value": val})
+        self.refresh_day_list()
+        self.refresh_calendar()
+
+    def edit_event(self):
+        idx = self._sel_index()
+        if idx is None:
+            return
+        key = ymd(self.selected_date)
+        flist = sorted(self.data.get(key, []), key=lambda x: x["time"])
+        if not flist:
+            return
+        t = self.time_var.get().strip()
+        if not hhmm_ok(t):
+            messagebox.showerror("Calendario", "Hora inválida (HH:MM).")
+            return
+        try:
+            val = self.value_type(self.val_var.get().strip())
+        except Exception:
+            messagebox.showerror("Calendario", "Valor inválido.")
+            return
+        old = flist[idx]
+        orig = self.data[key].index(old)
+        self.data[key][orig] = {"time": t, "value": val}
+        self.refresh_day_list()
+        self.refresh_calendar()
+
+    def del_event(self):
+        idx = self._sel_index()
+        if idx is None:
+            return
+        key = ymd(self.selected_date)
+        flist = sorted(self.data.get(key, []), key=lambda x: x["time"])
+        if not flist:
+            return
+        self.data[key].remove(flist[idx])
+        if not self.data[key]:
+            del self.data[key]
+        self.refresh_day_list()
+        self.refresh_calendar()
+
+    def clear_day(self):
+        key = ymd(self.selected_date)
+        if key in self.data and self.data[key]:
+            if messagebox.askyesno("Calendario", f"¿Borrar todos los eventos del {key}?"):
+                del self.data[key]
+                self.refresh_day_list()
+                self.refresh_calendar()
+
+    def import_file(self):
+        if not self.import_callback:
+            return
+        data = self.import_callback()
+        if data:
+            self.data = data
+            self.refresh_day_list()
+            self.refresh_calendar()
 
-        self.lbl_month.config(text=self.month_title())
-        self.day_buttons.clear()
+    def accept(self):
+        self.grab_release()
+        self.destroy()
+
+    def cancel(self):
+        self.data = None
+        self.grab_release()
+        self.destroy()
+
+
+# ===== Funciones calendario =====
+def sp_from_date_calendar(events_dict: dict | None, t: dt.datetime, default=None):
+    if not events_dict:
+        return default
+    key = ymd(t.date())
+    flist = events_dict.get(key, [])
+    if not flist:
+        return default
+    hhmm_now = t.strftime("%H:%M")
+    todays = [e for e in flist if e.get("time") and e["time"] <= hhmm_now]
+    if not todays:
+        return default
+    todays = sorted(todays, key=lambda e: e["time"])
+    return todays[-1].get("value", default)
+
+
+def nut_fire_for_minute(events_dict: dict | None, t: dt.datetime):
+    if not events_dict:
+        return []
+    key = ymd(t.date())
+    flist = events_dict.get(key, [])
+    if not flist:
+        return []
+    hhmm_now = t.strftime("%H:%M")
+    return [e.get("value") for e in flist if e.get("time") == hhmm_now]
+
+
+def _events_from_rows(rows, value_type=float):
+    events = {}
+    for row in rows:
+        date_raw = row.get("date") or row.get("fecha") or row.get("dia") or row.get("d")
+        time_raw = row.get("time") or row.get("hora") or row.get("t")
+        val_raw = row.get("value") or row.get("valor") or row.get("v")
+        if not date_raw or not time_raw or val_raw is None:
+            continue
+        date_obj = _normalize_date(str(date_raw))
+        if not date_obj:
+            continue
+        hhmm = str(time_raw).strip()
+        if not hhmm_ok(hhmm):
+            continue
+        try:
+            val = value_type(val_raw)
+        except Exception:
+            continue
+        key = ymd(date_obj)
+        events.setdefault(key, []).append({"time": hhmm, "value": val})
+    return events
+
+
+def _load_calendar_file(path: str, value_type=float):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in {".csv", ".txt"}:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        return _events_from_rows(rows, value_type=value_type)
+    if ext in {".xlsx", ".xls"}:
+        pd_spec = importlib_util.find_spec("pandas")
+        if not pd_spec:
+            raise RuntimeError("Necesitas instalar pandas para leer archivos de Excel (.xlsx/.xls)")
+        import pandas as pd  # type: ignore
+
+        df = pd.read_excel(path)
+        rows = df.to_dict(orient="records")
+        return _events_from_rows(rows, value_type=value_type)
+    raise RuntimeError("Formato no soportado. Usa CSV o Excel.")
+
+
+# ===== Fermentador (control, sin Tk) =====
+def _print_error(title, msg):
+    print(f"[{title}] {msg}")
+
+
+# Bandas por campo para el registro comprimido; 0 = cualquier cambio. Los
+# campos no listados (reles, nutricion) se comparan exactos.
+LOG_DEADBANDS = {"T": LOG_DEADBAND_T, "SP": 0.0, "banda": 0.0, "freq_nut": 0.0}
+# Los valores ya vienen redondeados (20.3 - 20.2 < 0.1 en flotante): un
+# paso igual a la banda cuenta como movimiento.
+_DEADBAND_EPS = 1e-9
+
+
+class DeadbandFilter:
+    def __init__(self, deadbands: dict, heartbeat_sec: float):
+        self.deadbands = deadbands
+        self.heartbeat_sec = heartbeat_sec
+        self._last = None
+        self._last_ts = None
+
+    def reset(self):
+        self._last = None
+
+    def keep(self, ts, row) -> bool:
+        last = self._last
+        if last is None or (ts - self._last_ts).total_seconds() >= self.heartbeat_sec or self._moved(last, row):
+            self._last = row
+            self._last_ts = ts
+            return True
+        return False
+
+    def _moved(self, last, row) -> bool:
+        for key, value in row.items():
+            if key in ("timestamp", "fermentador"):
+                continue
+            band = self.deadbands.get(key)
+            if band is None:
+                if value != last.get(key):
+                    return True
+                continue
+            try:
+                delta = abs(float(value) - float(last.get(key)))
+            except (TypeError, ValueError):
+                return value != last.get(key)
+            if delta != delta or (delta > 0 and delta >= band - _DEADBAND_EPS):
+                return True
+        return False
+
+
+class FermenterControl:
+    def __init__(self, cfg: dict, hw: Hardware, on_error=None):
+        self.cfg = cfg
+        self.name = cfg["name"]
+        self.hw = hw
+        self.ds_index = cfg["ds_index"]
+        self.on_error = on_error or _print_error
+        # Filas para el backup global; las escribe BackupSink (un solo escritor).
+        self.backup_rows = []
+        self._log_filter = DeadbandFilter(LOG_DEADBANDS, LOG_HEARTBEAT_SEC) if LOG_DEADBAND else None
+        self.journal = None  # CsvJournal del loop, si el registro va por RAM
+
+        if self.hw.sim:
+            self.t = 21.5 + random.uniform(-0.3, 0.3)
+            self._sim_ambient = 21.0 + random.uniform(-0.4, 0.4)
+        else:
+            self.t = self.hw.read_temp_ds18b20(index=self.ds_index)
+            self._sim_ambient = None
+        self._last_update = now()
+        self.stats = RollingStats()
+        self.sp = 20.0
+        self.band = 0.5
+        self.manual_mode = False
+
+        self.cold_in = False
+        self.hot_in = False
+
+        self.cal_sp = {}
+        self.cal_nut = {}
+
+        self.nut_running_until = None
+        self.nut_on = False
+        self._last_min = None
+        self.freq_nut = 8000.0
+        self.manual_nut_on = False
+
+        self.csv_dir = os.path.abspath("./Proceso")
+        self.csv_name = f"{safe_file_name(self.name)}.csv"
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        os.makedirs(self.csv_dir, exist_ok=True)
+
+        self.relay_cold = cfg.get("cold")
+        self.relay_hot = cfg.get("hot")
+        self.stepper_name = self.name
+        hw.setup_relay(self.relay_cold)
+        hw.setup_relay(self.relay_hot)
+        if not hw.sim:
+            hw.setup_stepper(self.stepper_name, cfg.get("pul"), cfg.get("dir"), 50)
+
+    # --------- Parametros ----------
+    def set_sp(self, value):
+        self.sp = float(value)
+
+    def set_band(self, value):
+        self.band = float(value)
+
+    def set_manual_mode(self, value):
+        self.manual_mode = bool(value)
+
+    def set_freq_nut(self, value):
+        self.freq_nut = float(value)
+
+    def set_cal_sp(self, data):
+        self.cal_sp = data or {}
+
+    def set_cal_nut(self, data):
+        self.cal_nut = data or {}
+
+    def set_csv_dir(self, path):
+        self.csv_dir = path
+
+    def set_csv_name(self, name):
+        self.csv_name = name
+
+    # --------- Forzados ----------
+    def forzar_frio(self):
+        if not self.manual_mode:
+            return
+        self.cold_in = True
+        self.hot_in = False
+        self._apply_relays()
+
+    def forzar_caliente(self):
+        if not self.manual_mode:
+            return
+        self.hot_in = True
+        self.cold_in = False
+        self._apply_relays()
+
+    def cerrar_todo(self):
+        self.cold_in = False
+        self.hot_in = False
+        self._apply_relays()
+
+    def stop_all(self):
+        self.manual_mode = True
+        self.cold_in = False
+        self.hot_in = False
+        self.nut_running_until = None
+        self.manual_nut_on = False
+        self._apply_nutricion_state(False)
+        self._apply_relays()
+
+    def _apply_relays(self):
+        self.hw.set_relays({self.relay_cold: self.cold_in, self.relay_hot: self.hot_in})
+
+    @property
+    def relay_switches(self):
+        counts = self.hw.relay_switches
+        return {"cold": counts.get(self.relay_cold, 0), "hot": counts.get(self.relay_hot, 0)}
+
+    def toggle_manual_nut(self):
+        self.manual_nut_on = not self.manual_nut_on
+        tnow = now()
+        schedule_active = bool(self.nut_running_until and tnow < self.nut_running_until)
+        self._apply_nutricion_state(schedule_active or self.manual_nut_on)
+
+    def _apply_nutricion_state(self, should_run: bool):
+        if should_run and not self.nut_on:
+            self.hw.start_stepper(self.stepper_name, self.freq_nut)
+        elif not should_run and self.nut_on:
+            self.hw.stop_stepper(self.stepper_name)
+        self.nut_on = should_run
+
+    # ---------------- CSV --------------------
+    def csv_path(self):
+        return _csv_file_path(self.csv_dir, self.csv_name, f"{safe_file_name(self.name)}.csv")
+
+    def csv_start(self):
+        self.csv_running = True
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        if self._log_filter is not None:
+            self._log_filter.reset()  # el archivo parte con una fila completa
+
+    def csv_pause(self):
+        self.csv_running = False
+        self.csv_paused = True
+
+    def mark_exported(self):
+        self.csv_last_export_ok = True
+
+    def csv_restart(self):
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        path = self.csv_path()
+        if self.journal is not None:
+            self.journal.discard(path)
+        if os.path.exists(path):
+            os.remove(path)
+        return path
+
+    def flush_journal(self):
+        if self.journal is not None:
+            return self.journal.request_flush()
+
+    def _csv_write_row(self):
+        tnow = now()
+        row = {
+            "timestamp": tnow.strftime("%Y-%m-%d %H:%M:%S"),
+            "fermentador": self.name,
+            "T": f"{self.t:.1f}",
+            "SP": f"{self.sp:.2f}",
+            "banda": f"{self.band:.2f}",
+            "cold": int(self.cold_in),
+            "hot": int(self.hot_in),
+            "nutricion_activa": int(self.nut_on),
+            "freq_nut": f"{self.freq_nut:.1f}",
+        }
+        if self._log_filter is not None and not self._log_filter.keep(tnow, row):
+            return
+
+        if self.csv_running and self.journal is not None:
+            self.journal.append(self.csv_path(), list(row.keys()), [row])
+        elif self.csv_running:
+            ipath = self.csv_path()
+            cabe = not os.path.exists(ipath)
+            try:
+                os.makedirs(os.path.dirname(ipath), exist_ok=True)
+                with open(ipath, "a", newline="", encoding="utf-8") as f:
+                    w = csv.DictWriter(f, fieldnames=list(row.keys()))
+                    if cabe:
+                        w.writeheader()
+                    w.writerow(row)
+            except Exception as e:
+                self.on_error("CSV", f"No se pudo escribir en {ipath}\n{e}")
+
+        self.backup_rows.append(row)
+
+    # ----------------- Simulación de temperatura -----------------
+    def _simulate_temp(self, dt_seconds: float):
+        if dt_seconds <= 0:
+            return
+
+        sp_obj = self.sp
+
+        ambient_pull = (self._sim_ambient - self.t) * 0.0008
+        ferment_target = max(sp_obj, self._sim_ambient + 4.0)
+        ferment_heat = (ferment_target - self.t) * 0.018
+
+        heating = 0.22 if self.hot_in else 0.0
+        cooling = -0.28 if self.cold_in else 0.0
+
+        ruido = random.uniform(-0.008, 0.008)
+        delta = (ambient_pull + ferment_heat + heating + cooling + ruido) * dt_seconds
+        self.t = max(-5.0, min(40.0, self.t + delta))
+
+    # ----------------- Loop del proceso -----------------
+    @property
+    def t_stats(self):
+        return self.stats.summary()
+
+    def update_process(self):
+        tnow = now()
+        dt_seconds = max(0.001, (tnow - self._last_update).total_seconds())
+        self._last_update = tnow
+
+        sp_cal = None
+        if not self.manual_mode:
+            sp_cal = sp_from_date_calendar(self.cal_sp, tnow, default=None)
+            if sp_cal is not None:
+                try:
+                    self.sp = float(sp_cal)
+                except Exception:
+                    pass
+
+        current_min = tnow.strftime("%Y-%m-%d %H:%M")
+        if self._last_min != current_min:
+            doses = nut_fire_for_minute(self.cal_nut, tnow)
+            if doses:
+                dur_total = sum(float(d) for d in doses if float(d) > 0)
+                if dur_total > 0:
+                    self.nut_running_until = tnow + dt.timedelta(seconds=dur_total)
+                    self.hw.start_stepper(self.stepper_name, self.freq_nut)
+            self._last_min = current_min
+
+        schedule_active = False
+        if self.nut_running_until and tnow < self.nut_running_until:
+            schedule_active = True
+        else:
+            self.nut_running_until = None
+        self._apply_nutricion_state(schedule_active or self.manual_nut_on)
 
-        cal = pycal.Calendar(firstweekday=0)
-        weeks = cal.monthdatescalendar(self.view_year, self.view_month)
+        if self.hw.sim:
+            self._simulate_temp(dt_seconds)
+        else:
+            self.t = self.hw.read_temp_ds18b20(index=self.ds_index)
+        if math.isfinite(self.t):
+            self.stats.add(tnow, self.t)
 
-        for r, week in enumerate(weeks, start=1):
-            for c, d in enumerate(week):
-                btn = tk.Button(
-                    self.cal_grid,
-                    text=str(d.day),
-                    width=4,
-                    relief="raised",
-                    bd=1,
-                    command=lambda dd=d: self.select_date(dd),
-                )
-                btn.grid(row=r, column=c, padx=2, pady=2, sticky="nsew")
+        if not self.manual_mode:
+            sp = self.sp
+            band = max(0.05, self.band)
+            # control frío
+            if self.cold_in:
+                if self.t <= sp - band:
+                    self.cold_in = False
+            else:
+                if self.t >= sp + band:
+                    self.cold_in = True
+            # control caliente
+            if self.hot_in:
+                if self.t >= sp + band:
+                    self.hot_in = False
+            else:
+                if self.t <= sp - band:
+                    self.hot_in = True
+            if not self.cold_in and not self.hot_in:
+                self.cerrar_todo()
+            self._apply_relays()
 
-                is_other_month = d.month != self.view_month
-                is_past = d < self.today
-                has_ev = ymd(d) in self.data and len(self.data[ymd(d)]) > 0
-                is_today = d == self.today
+        self._csv_write_row()
 
-                if is_past:
-                    btn.config(
-                        state="disabled",
-                        bg=self.styles["disabled_bg"],
-                        activebackground=self.styles["disabled_bg"],
-                    )
-                else:
-                    bg = self.styles["other_bg"] if is_other_month else self.styles["normal_bg"]
-                    if has_ev:
-                        bg = self.styles["has_bg"]
-                    if is_today:
-                        bg = self.styles["today_bg"] if not has_ev else "#9AE6B4"
-                    btn.config(bg=bg, activebackground=bg)
 
-                if d == self.selected_date:
-                    btn.config(relief="sunken")
+# ===== Canal de caudal CO2 (sin Tk) =====
+def make_flow_reader(cfg: dict):
+    name = cfg["name"]
+    addr_env = os.environ.get(f"ADS1115_ADDR_{name}", "").strip()
+    ch_env = os.environ.get(f"ADS1115_CH_{name}", "").strip()
+    gain_env = os.environ.get(f"ADS1115_GAIN_{name}", "").strip()
+    addr = parse_int(addr_env, cfg["ads_addr"]) if addr_env else cfg["ads_addr"]
+    ch = parse_int(ch_env, cfg["ads_ch"]) if ch_env else cfg["ads_ch"]
+    gain = parse_int(gain_env, cfg["ads_gain"]) if gain_env else cfg["ads_gain"]
+    reader = None
+    if REPLAY_DIR and not SIMULADOR:
+        try:
+            reader = ReplayADS1115Reader(os.path.join(REPLAY_DIR, f"{safe_file_name(name)}_co2.csv"))
+        except Exception as e:
+            print(f"[REPLAY] Sin caudal grabado para {name}: {e}. Usando ADS1115.")
+    if reader is None:
+        reader = ADS1115Reader(addr, ch, gain)
+    if SAMPLE_PERIOD_SEC is None and isinstance(reader, ReplayADS1115Reader):
+        period = reader.sample_period()
+    elif SAMPLE_PERIOD_SEC is None:
+        period = 1 if reader.sim else 10
+    else:
+        period = SAMPLE_PERIOD_SEC
+    return reader, period
+
+
+class FlowChannel:
+    def __init__(self, name: str, reader, period: int, io_lock=None, on_error=None):
+        self.name = name
+        self.reader = reader
+        self.period = period
+        self.io_lock = io_lock
+        self.on_error = on_error or _print_error
+        if reader.sim:
+            self.mode = "SIMULADOR"
+        elif isinstance(reader, ReplayADS1115Reader):
+            self.mode = "REPLAY"
+        else:
+            self.mode = "HARDWARE"
+        # En replay el periodo lo fija la grabacion.
+        self.adaptive = ADAPTIVE_SAMPLING and self.mode != "REPLAY"
+        if self.adaptive:
+            self.period = max(SAMPLE_PERIOD_MIN_SEC, min(SAMPLE_PERIOD_MAX_SEC, period))
+        self._last_flow = None
+        self.samples = collections.deque()
+        self.next_sample = None
+
+        self.csv_dir = os.path.abspath("./Proceso")
+        self.csv_name = f"{safe_file_name(name)}_co2.csv"
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        self._csv_headers = {}
+        self.telemetry_rows = []
+        self.journal = None
+        os.makedirs(self.csv_dir, exist_ok=True)
+
+        # Huecos de hasta 10 periodos se integran; mas largos, no.
+        longest = SAMPLE_PERIOD_MAX_SEC if self.adaptive else period
+        self.co2 = Co2Integrator(max_gap_sec=max(60, 10 * longest))
+        self.co2_checkpoint_path = os.path.join(STATE_DIR, f"{safe_file_name(name)}_co2_acum.json")
+        self._co2_saved_at = None
+        self.detector = FermentationDetector()
+        data = load_co2_checkpoint(self.co2_checkpoint_path)
+        if data:
+            self.co2.restore(data)
+            if data.get("detector"):
+                self.detector.restore(data["detector"])
+            print(f"[CO2] {name}: acumulado restaurado {self.co2.total_g:.2f} g, fase {self.detector.state}")
+        self.co2_total_g = self.co2.total_g
+        self.co2_total_g_l = self.co2.total_g_l()
+        self.ferm_state = self.detector.state
+        self.ferm_peak_g_l_h = self.detector.peak
+        self.stats = RollingStats()
+
+    @property
+    def flow_stats(self):
+        return self.stats.summary()
+
+    # ---------------- CO2 acumulado y fase --------------------
+    def _detect(self, ts, flow):
+        event = self.detector.update(ts, flow_to_rate_g_l_h(flow), self.co2_total_g_l)
+        self.ferm_peak_g_l_h = self.detector.peak
+        if event is None:
+            return ""
+        self.ferm_state = event
+        print(f"[FERM] {self.name}: {event} (pico {self.detector.peak:.3f} g/L·h, "
+              f"acumulado {self.co2_total_g_l:.2f} g/L)")
+        return event
+
+    def _co2_update(self, ts, flow):
+        self.co2.add(ts, flow)
+        self.co2_total_g = self.co2.total_g
+        self.co2_total_g_l = self.co2.total_g_l()
+        if self._co2_saved_at is None or (ts - self._co2_saved_at).total_seconds() >= CO2_CHECKPOINT_SEC:
+            self.save_co2_checkpoint()
+
+    def save_co2_checkpoint(self):
+        if self.co2.last_ts is None:
+            return
+        try:
+            data = self.co2.to_dict()
+            data["detector"] = self.detector.to_dict()
+            save_co2_checkpoint(self.co2_checkpoint_path, data)
+            self._co2_saved_at = self.co2.last_ts
+        except Exception as exc:
+            print(f"[CO2] No se pudo guardar checkpoint {self.co2_checkpoint_path}: {exc}")
+
+    def reset_co2_total(self):
+        # Lote nuevo: acumulado y fase arrancan de cero.
+        self.co2.reset()
+        self.co2_total_g = 0.0
+        self.co2_total_g_l = 0.0
+        self.detector = FermentationDetector()
+        self.ferm_state = self.detector.state
+        self.ferm_peak_g_l_h = 0.0
+        try:
+            os.remove(self.co2_checkpoint_path)
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            print(f"[CO2] No se pudo borrar checkpoint {self.co2_checkpoint_path}: {exc}")
 
-                self.day_buttons.append((btn, d))
+    # ---------------- CSV --------------------
+    def set_csv_dir(self, path):
+        self.csv_dir = path
 
-        self.lbl_sel.config(text=ymd(self.selected_date))
+    def set_csv_name(self, name):
+        self.csv_name = name
 
-    def select_date(self, date_obj: dt.date):
-        if date_obj < self.today:
-            return
-        self.selected_date = date_obj
-        self.refresh_calendar()
-        self.refresh_day_list()
+    def csv_path(self):
+        return _csv_file_path(self.csv_dir, self.csv_name, f"{safe_file_name(self.name)}_co2.csv")
 
-    def prev_month(self):
-        y, m = self.view_year, self.view_month
-        if m == 1:
-            y, m = y - 1, 12
-        else:
-            m -= 1
-        self.view_year, self.view_month = y, m
-        self.refresh_calendar()
+    def csv_start(self):
+        self.csv_running = True
+        self.csv_paused = False
+        self.csv_last_export_ok = False
 
-    def next_month(self):
-        y, m = self.view_year, self.view_month
-        if m == 12:
-            y, m = y + 1, 1
-        else:
-            m += 1
-        self.view_year, self.view_month = y, m
-        self.refresh_calendar()
+    def csv_pause(self):
+        self.csv_running = False
+        self.csv_paused = True
 
-    def refresh_day_list(self):
-        self.listbox.delete(0, tk.END)
-        flist = self.data.get(ymd(self.selected_date), [])
-        for it in sorted(flist, key=lambda x: x["time"]):
-            self.listbox.insert(tk.END, f"{it['time']}  •  {it['value']}")
+    def mark_exported(self):
+        self.csv_last_export_ok = True
 
-    def _sel_index(self):
-        sel = self.listbox.curselection()
-        return sel[0] if sel else None
+    def csv_restart(self):
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        path = self.csv_path()
+        if self.journal is not None:
+            self.journal.discard(path)
+        if os.path.exists(path):
+            os.remove(path)
+        self._csv_headers.pop(path, None)
+        # Archivo nuevo = lote nuevo: el acumulado arranca de cero.
+        self.reset_co2_total()
+        return path
 
-    def add_event(self):
-        if self.selected_date < self.today:
-            messagebox.showerror("Calendario", "No se pueden programar días anteriores al actual.")
+    def _csv_fieldnames(self, path):
+        # Un archivo de una version anterior conserva sus columnas.
+        fields = self._csv_headers.get(path)
+        if fields is None:
+            fields = list(CO2_CSV_FIELDS)
+            if os.path.exists(path):
+                with open(path, "r", newline="", encoding="utf-8") as f:
+                    first = next(csv.reader(f), None)
+                if first:
+                    fields = first
+            self._csv_headers[path] = fields
+        return fields
+
+    def _csv_write_row(self, ts, flow, current_ma, voltage, status, event="", period=None):
+        row = {
+            "timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"),
+            "fermentador": self.name,
+            "flow_sccm": f"{flow:.4f}",
+            "status": status,
+            "co2_acum_g": f"{self.co2_total_g:.3f}",
+            "co2_acum_g_l": f"{self.co2_total_g_l:.4f}",
+            "evento": event,
+            "periodo_s": self.period if period is None else period,
+        }
+        self.telemetry_rows.append(row)
+        if not self.csv_running:
             return
-        t = self.time_var.get().strip()
-        if not hhmm_ok(t):
-            messagebox.showerror("Calendario", "Hora inválida (HH:MM).")
+        ipath = self.csv_path()
+        header = not os.path.exists(ipath)
+        if header:
+            self._csv_headers.pop(ipath, None)
+        if self.journal is not None:
+            self.journal.append(ipath, self._csv_fieldnames(ipath), [row])
             return
         try:
-            val = self.value_type(self.val_var.get().strip())
+            os.makedirs(os.path.dirname(ipath), exist_ok=True)
+            fields = self._csv_fieldnames(ipath)
+            with open(ipath, "a", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+                if header:
+                    w.writeheader()
+                w.writerow(row)
+        except Exception as e:
+            self.on_error("CSV CO2", f"No se pudo escribir en {ipath}\n{e}")
+
+    # ---------------- Muestreo --------------------
+    def _adapt_period(self, ts, flow):
+        # Periodo para que el caudal cambie ~ADAPTIVE_TOLERANCE_SCCM entre
+        # muestras: baja de inmediato y sube a lo sumo x1.5 por muestra,
+        # para no saltarse el inicio de una subida.
+        last, self._last_flow = self._last_flow, (ts, flow)
+        if last is None:
+            return
+        elapsed = (ts - last[0]).total_seconds()
+        if elapsed <= 0:
+            return
+        slope = abs(flow - last[1]) / elapsed
+        target = ADAPTIVE_TOLERANCE_SCCM / slope if slope > 0 else SAMPLE_PERIOD_MAX_SEC
+        target = min(target, self.period * 1.5)
+        self.period = int(max(SAMPLE_PERIOD_MIN_SEC, min(SAMPLE_PERIOD_MAX_SEC, round(target))))
+
+    def _read_voltage(self):
+        if self.io_lock is None:
+            return self.reader.read_voltage()
+        # Varios procesos comparten el bus I2C (y a veces el mismo ADS1115).
+        with self.io_lock:
+            return self.reader.read_voltage()
+
+    def take_sample(self, ts=None):
+        if ts is None:
+            ts = now()
+        try:
+            voltage = self._read_voltage()
+        except Exception as exc:
+            print(f"[FLOW] Error leyendo {self.name}: {exc}")
+            self.next_sample = ts + dt.timedelta(seconds=self.period)
+            return None
+
+        current_ma = voltage_to_current_ma(voltage, SHUNT_OHMS)
+        flow = current_to_flow_sccm(current_ma)
+        status = "OK"
+        if current_ma < 3.8:
+            status = "Bajo rango"
+        elif current_ma > 20.5:
+            status = "Alto rango"
+
+        sample = (ts, flow, current_ma, voltage, status)
+        self.ingest(sample)
+        self.stats.add(ts, flow)
+        self._co2_update(ts, flow)
+        event = self._detect(ts, flow)
+        # La fila lleva el periodo con que se llego a esta muestra.
+        period = self.period
+        if self.adaptive:
+            self._adapt_period(ts, flow)
+        self._csv_write_row(ts, flow, current_ma, voltage, status, event, period)
+        self.next_sample = ts + dt.timedelta(seconds=self.period)
+        return sample
+
+    def ingest(self, sample):
+        samples = self.samples
+        samples.append(sample)
+        cutoff = sample[0] - dt.timedelta(hours=MAX_FLOW_HISTORY_HOURS)
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+
+    def close(self):
+        self.save_co2_checkpoint()
+        try:
+            self.reader.close()
         except Exception:
-            messagebox.showerror("Calendario", "Valor inválido.")
+            pass
+
+
+# ===== Registro en RAM con diario =====
+_JOURNAL_BLOCK = struct.Struct("<II")  # largo y crc32 del bloque
+
+
+def _journal_blocks(path):
+    # Bloques validos del diario; corta en el primero truncado o corrupto
+    # (el que se estaba escribiendo cuando se corto la luz).
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + _JOURNAL_BLOCK.size <= len(data):
+        size, crc = _JOURNAL_BLOCK.unpack_from(data, pos)
+        start = pos + _JOURNAL_BLOCK.size
+        payload = data[start:start + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            break
+        yield payload
+        pos = start + size
+
+
+def _append_csv_rows(path, fields, rows):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        if f.tell() == 0:
+            w.writeheader()
+        w.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _truncate_to(path, size):
+    # Deshace un append a medias: el archivo vuelve al tamano previo.
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def replay_csv_journals(root: str = LOG_JOURNAL_DIR, only=None):
+    # Vuelca a los CSV principales las filas de diarios no descargados. Una
+    # marca {"tamanos": ...} indica una descarga empezada: los archivos
+    # vuelven a esos tamanos y las filas previas a la marca se escriben de
+    # nuevo (lo anterior a una marca previa ya estaba escrito).
+    paths = [only] if only else sorted(glob.glob(os.path.join(root, "*.journal")))
+    for jpath in paths:
+        if not os.path.exists(jpath):
+            continue
+        try:
+            sizes = {}
+            flushing = []
+            entries = []
+            for payload in _journal_blocks(jpath):
+                block = json.loads(payload)
+                if isinstance(block, dict):
+                    sizes = block.get("tamanos", {})
+                    flushing, entries = entries, []
+                else:
+                    entries.extend(block)
+            for path, size in sizes.items():
+                _truncate_to(path, size)
+            pending = {}
+            for path, fields, rows in flushing + entries:
+                pending.setdefault((path, tuple(fields)), []).extend(rows)
+            for (path, fields), rows in pending.items():
+                _append_csv_rows(path, list(fields), rows)
+            os.remove(jpath)
+        except Exception as e:
+            print(f"[DIARIO] No se pudo recuperar {jpath}: {e}")
+            continue
+        n = sum(len(rows) for rows in pending.values())
+        if n:
+            print(f"[DIARIO] Recuperadas {n} filas de {os.path.basename(jpath)}")
+
+
+class CsvJournal:
+    # Filas CSV en RAM: van al diario cada `journal_sec` y a los archivos
+    # cada `flush_sec`; escrito todo, el diario vuelve a cero. Un diario por
+    # proceso escritor (nombre fijo, se recupera al reabrirlo). Las
+    # escrituras corren en un hilo propio: quien agrega filas (el loop de
+    # control, el backup) solo toma el lock para cambiar de buffer.
+    def __init__(self, name: str, flush_sec: float = LOG_FLUSH_SEC, journal_sec: float = LOG_JOURNAL_SEC,
+                 root: str = LOG_JOURNAL_DIR, on_error=None):
+        self.path = os.path.join(root, f"{name}.journal")
+        self.flush_sec = flush_sec
+        self.journal_sec = journal_sec
+        self.on_error = on_error or _print_error
+        os.makedirs(root, exist_ok=True)
+        replay_csv_journals(root, only=self.path)
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()  # una escritura a la vez (hilo, flush, close)
+        self._buffer = {}
+        self._unjournaled = []
+        self._requests = []
+        self._file = open(self.path, "ab")
+        t = time.monotonic()
+        self._journal_at = t + journal_sec
+        self._flush_at = t + flush_sec
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="diario", daemon=True)
+        self._thread.start()
+
+    def append(self, path, fields, rows):
+        if not rows:
             return
-        key = ymd(self.selected_date)
-        self.data.setdefault(key, []).append({"time": t, "value": val})
-        self.refresh_day_list()
-        self.refresh_calendar()
+        fields = tuple(fields)
+        rows = list(rows)
+        with self._lock:
+            self._buffer.setdefault((path, fields), []).extend(rows)
+            self._unjournaled.append([path, list(fields), rows])
+
+    def discard(self, path):
+        # El archivo se borro (reiniciar CSV): sus filas pendientes sobran.
+        # Espera una descarga en curso para que no lo vuelva a crear.
+        with self._io_lock, self._lock:
+            for key in [k for k in self._buffer if k[0] == path]:
+                del self._buffer[key]
+            self._unjournaled = [e for e in self._unjournaled if e[0] != path]
+
+    def request_flush(self) -> threading.Event:
+        # Descarga en el hilo del diario; el evento se activa al terminar.
+        done = threading.Event()
+        with self._lock:
+            self._requests.append(done)
+        self._wake.set()
+        return done
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(max(0.0, min(self._flush_at, self._journal_at) - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                requests, self._requests = self._requests, []
+            t = time.monotonic()
+            if requests or t >= self._flush_at:
+                self.flush()
+            elif t >= self._journal_at:
+                self.sync_journal()
+            for done in requests:
+                done.set()
+
+    def _write_block(self, block):
+        payload = json.dumps(block, ensure_ascii=False).encode("utf-8")
+        self._file.write(_JOURNAL_BLOCK.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def sync_journal(self):
+        with self._io_lock:
+            with self._lock:
+                self._journal_at = time.monotonic() + self.journal_sec
+                entries, self._unjournaled = self._unjournaled, []
+            if not entries:
+                return
+            try:
+                self._write_block(entries)
+            except OSError as e:
+                self.on_error("Diario", f"No se pudo escribir {self.path}\n{e}")
+
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                t = time.monotonic()
+                self._flush_at = t + self.flush_sec
+                self._journal_at = t + self.journal_sec
+                buffer, self._buffer = self._buffer, {}
+                entries, self._unjournaled = self._unjournaled, []
+            if not buffer:
+                return
+            # Antes de tocar los archivos: todo lo pendiente y sus tamanos
+            # quedan en el diario, asi un corte a mitad de la descarga se
+            # recupera sin filas repetidas (ver replay_csv_journals).
+            sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path, _ in buffer}
+            try:
+                if entries:
+                    self._write_block(entries)
+                self._write_block({"tamanos": sizes})
+            except OSError as e:
+                self.on_error("Diario", f"No se pudo escribir {self.path}\n{e}")
+            failed = {}
+            for (path, fields), rows in buffer.items():
+                try:
+                    _append_csv_rows(path, list(fields), rows)
+                except OSError as e:
+                    failed[(path, fields)] = rows
+                    self.on_error("CSV", f"No se pudo escribir en {path}\n{e}")
+                    try:
+                        _truncate_to(path, sizes[path])
+                    except OSError:
+                        pass
+            # Lo escrito ya esta en los archivos: el diario vuelve a cero y
+            # lo que fallo se reintenta en la proxima descarga, antes de lo
+            # que llego mientras tanto (aun sin pasar por el diario).
+            try:
+                self._file.truncate(0)
+            except OSError as e:
+                self.on_error("Diario", f"No se pudo vaciar {self.path}\n{e}")
+            if failed:
+                with self._lock:
+                    for key, rows in failed.items():
+                        self._buffer[key] = rows + self._buffer.pop(key, [])
+                    self._unjournaled[:0] = [[path, list(fields), rows] for (path, fields), rows in failed.items()]
 
-    def edit_event(self):
-        idx = self._sel_index()
-        if idx is None:
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        with self._lock:
+            requests, self._requests = self._requests, []
+        for done in requests:
+            done.set()
+        self._file.close()
+        if not self._buffer:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# ===== Backup global (un solo escritor) =====
+BACKUP_FIELDS = (
+    "timestamp", "fermentador", "T", "SP", "banda", "cold", "hot", "nutricion_activa", "freq_nut",
+)
+
+
+class BackupSink:
+    # Unico escritor de backup_global.csv: los fermentadores entregan filas
+    # y un hilo las agrega con un solo append por periodo para todos, sin
+    # abrir el archivo ni consultar su tamaño por cada fila.
+    def __init__(self, path: str, period: float = 1.0, on_error=None, journal=None):
+        self.path = path
+        self.period = period
+        self.on_error = on_error or _print_error
+        self.journal = journal
+        self._rows = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+
+    def set_path(self, path: str):
+        self.path = path
+
+    def submit(self, rows):
+        if rows:
+            with self._lock:
+                self._rows.extend(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
             return
-        key = ymd(self.selected_date)
-        flist = sorted(self.data.get(key, []), key=lambda x: x["time"])
-        if not flist:
+        path = self.path
+        if self.journal is not None:
+            self.journal.append(path, BACKUP_FIELDS, rows)
             return
-        t = self.time_var.get().strip()
-        if not hhmm_ok(t):
-            messagebox.showerror("Calendario", "Hora inválida (HH:MM).")
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=BACKUP_FIELDS, extrasaction="ignore")
+                if f.tell() == 0:
+                    w.writeheader()
+                w.writerows(rows)
+        except Exception as e:
+            self.on_error("Backup global", f"No se pudo escribir en {path}\n{e}")
+
+    def request_sync(self) -> threading.Event:
+        # Lleva al archivo todo lo recibido (antes de exportar) sin esperar:
+        # el evento se activa cuando esta escrito.
+        if self.journal is None:
+            done = threading.Event()
+            done.set()
+            return done
+        self.flush()
+        return self.journal.request_flush()
+
+    def close(self, timeout: float = 3.0):
+        self._stop.set()
+        self._thread.join(timeout)
+        if self.journal is not None:
+            self.journal.close()
+
+
+# ===== Telemetria (store-and-forward) =====
+def _lp_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ").replace("=", "\\=")
+
+
+def telemetry_line(kind: str, row: dict):
+    # Line protocol: <tipo>,fermentador=F1 campo=valor,... <epoch ns>
+    ts = _parse_log_ts(row.get("timestamp"))
+    if ts is None:
+        return None
+    fields = []
+    for key, value in row.items():
+        if key in ("timestamp", "fermentador") or value in ("", None):
+            continue
+        try:
+            num = float(value)
+        except (TypeError, ValueError):
+            text = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+            fields.append(f'{_lp_escape(key)}="{text}"')
+            continue
+        if math.isfinite(num):
+            fields.append(f"{_lp_escape(key)}={num!r}")
+    if not fields:
+        return None
+    tag = _lp_escape(row.get("fermentador", ""))
+    return f"{kind},fermentador={tag} {','.join(fields)} {int(ts.timestamp()) * 1_000_000_000}"
+
+
+def telemetry_sender(url: str, timeout: float = TELEMETRY_TIMEOUT_SEC):
+    # Devuelve send(payload) para el esquema de la URL; lanza OSError si el
+    # receptor no acepta el lote.
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(url)
+    if parts.scheme == "tcp":
+        import socket
+
+        address = (parts.hostname, parts.port)
+
+        def send(payload: bytes):
+            # Una conexion por lote: un receptor caido se detecta al conectar.
+            with socket.create_connection(address, timeout=timeout) as sock:
+                sock.sendall(payload)
+                sock.shutdown(socket.SHUT_WR)
+
+        return send
+    if parts.scheme in ("http", "https"):
+        import urllib.request
+
+        def send(payload: bytes):
+            req = urllib.request.Request(
+                url, data=payload, method="POST", headers={"Content-Type": "text/plain; charset=utf-8"}
+            )
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                if not 200 <= resp.status < 300:
+                    raise OSError(f"HTTP {resp.status}")
+
+        return send
+    raise ValueError(f"Esquema de telemetria no soportado: {url}")
+
+
+class TelemetrySpool:
+    # Cola en disco: un archivo por lote, ordenados por nombre (llegada).
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._counter = 0
+        os.makedirs(root, exist_ok=True)
+        for tmp in glob.glob(os.path.join(root, "*.tmp")):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        self._files = collections.deque(sorted(glob.glob(os.path.join(root, "*.lp"))))
+        self._bytes = sum(os.path.getsize(p) for p in self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def push(self, payload: bytes):
+        self._counter += 1
+        path = os.path.join(self.root, f"{time.time_ns():020d}_{self._counter:06d}.lp")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        self._files.append(path)
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            self.dropped += 1
+            self._remove(self._files.popleft())
+
+    def peek(self):
+        with open(self._files[0], "rb") as f:
+            return f.read()
+
+    def pop(self):
+        self._remove(self._files.popleft())
+
+    def _remove(self, path):
+        try:
+            self._bytes -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TelemetrySink:
+    # Junta las filas de proceso y de CO2, las publica en lotes y, si el
+    # receptor no responde, las deja en el spool para reenviarlas despues
+    # sin superar drain_rate lineas/s. send es enchufable (ver telemetry_sender).
+    def __init__(self, send, spool: TelemetrySpool, batch: int = TELEMETRY_BATCH,
+                 period: float = TELEMETRY_PERIOD_SEC, drain_rate: int = TELEMETRY_DRAIN_LINES_SEC):
+        self.send = send
+        self.spool = spool
+        self.batch = batch
+        self.period = period
+        self.drain_rate = drain_rate
+        self.sent_lines = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        self._online = True
+        self._retry_at = 0.0
+        self._backoff = 1.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetria", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, rows):
+        if rows:
+            with self._lock:
+                self._rows.extend((kind, row) for row in rows)
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self._cycle()
+        self._cycle(drain=False)
+
+    def _try_send(self, payload: bytes) -> bool:
+        if time.monotonic() < self._retry_at:
+            return False
+        try:
+            self.send(payload)
+        except Exception as e:
+            if self._online:
+                print(f"[TELEMETRIA] Receptor no disponible ({e}); acumulando en {self.spool.root}")
+            self._online = False
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(60.0, self._backoff * 2)
+            return False
+        if not self._online:
+            print(f"[TELEMETRIA] Receptor disponible; {len(self.spool)} lotes pendientes en disco")
+        self._online = True
+        self._backoff = 1.0
+        self.sent_lines += payload.count(b"\n")
+        return True
+
+    def _spool(self, payload: bytes):
+        dropped = self.spool.dropped
+        try:
+            self.spool.push(payload)
+        except OSError as e:
+            print(f"[TELEMETRIA] No se pudo guardar el lote en disco: {e}")
+        if self.spool.dropped > dropped:
+            print(f"[TELEMETRIA] Spool lleno: se descartaron {self.spool.dropped - dropped} lotes antiguos")
+
+    def _cycle(self, drain: bool = True):
+        with self._lock:
+            items, self._rows = self._rows, []
+        lines = [line for line in (telemetry_line(kind, row) for kind, row in items) if line]
+        # Lo nuevo sale directo (lleva su timestamp); el atraso va por el spool.
+        for i in range(0, len(lines), self.batch):
+            payload = ("\n".join(lines[i:i + self.batch]) + "\n").encode("utf-8")
+            if not self._try_send(payload):
+                self._spool(payload)
+        if drain:
+            self._drain(self.drain_rate * self.period)
+
+    def _drain(self, budget: float):
+        while len(self.spool) and budget > 0:
+            try:
+                payload = self.spool.peek()
+            except OSError:
+                self.spool.pop()
+                continue
+            if not self._try_send(payload):
+                return
+            self.spool.pop()
+            budget -= payload.count(b"\n")
+
+    def close(self, timeout: float = 5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+# ===== Loop de control (hilo o proceso worker) =====
+_CTRL_STATE_FIELDS = (
+    "t", "sp", "band", "manual_mode", "cold_in", "hot_in", "nut_on", "manual_nut_on",
+    "freq_nut", "csv_dir", "csv_name", "csv_running", "csv_paused", "csv_last_export_ok",
+    "t_stats", "relay_switches",
+)
+_FLOW_STATE_FIELDS = (
+    "mode", "period", "next_sample", "csv_dir", "csv_name",
+    "csv_running", "csv_paused", "csv_last_export_ok", "co2_total_g", "co2_total_g_l",
+    "flow_stats", "ferm_state", "ferm_peak_g_l_h",
+)
+_NO_MSG = object()
+
+
+def _state_of(obj, fields):
+    return {k: getattr(obj, k) for k in fields}
+
+
+class ControlLoop:
+    # Corre control, muestreo de caudal y registro de uno o varios
+    # fermentadores a 1 Hz, fuera del hilo de Tk. Los comandos llegan por
+    # recv() y se aplican entre ticks; el estado sale por send().
+    def __init__(self, fermenters, hw, recv, send, io_lock=None, on_first_tick=None):
+        self.hw = hw
+        self._recv = recv
+        self._send = send
+        self.on_first_tick = on_first_tick
+        self.ticks = 0
+        self.units = {}
+        for cfg in fermenters:
+            name = cfg["name"]
+
+            def on_error(title, msg, name=name):
+                self._send(name, ("error", title, msg))
+
+            ctrl = FermenterControl(cfg, hw, on_error=on_error)
+            reader, period = make_flow_reader(cfg)
+            flow = FlowChannel(name, reader, period, io_lock=io_lock, on_error=on_error)
+            self.units[name] = (ctrl, flow)
+        self._acked = {name: 0 for name in self.units}
+        self._pending = {name: [] for name in self.units}
+        # Control a 1 s, cada caudalimetro a su periodo y el estado hacia la
+        # GUI despues de ambos (mayor numero de prioridad).
+        self.scheduler = Scheduler()
+        self.scheduler.add("control", 1.0, self._control, PRIO_CONTROL, delay=0.0)
+        for name, (ctrl, flow) in self.units.items():
+            self.scheduler.add(f"co2:{name}", flow.period, lambda name=name: self._sample(name),
+                               PRIO_CONTROL, delay=0.0)
+        self.scheduler.add("state", 1.0, self._publish_states, PRIO_IO, delay=0.0)
+        # Un diario por fermentador, con nombre fijo: no cambia con
+        # WORKER_PROCESSES ni con los demas fermentadores configurados.
+        # Cada diario escribe en su hilo; sus errores y descargas pedidas se
+        # entregan desde este hilo, con el estado.
+        self.journals = []
+        self._journal_errors = collections.deque()
+        self._flushing = {name: [] for name in self.units}
+        if LOG_FLUSH_SEC > 0:
+            for name, (ctrl, flow) in self.units.items():
+
+                def on_journal_error(title, msg, name=name):
+                    self._journal_errors.append((name, title, msg))
+
+                journal = CsvJournal(f"control_{safe_file_name(name)}", on_error=on_journal_error)
+                ctrl.journal = flow.journal = journal
+                self.journals.append(journal)
+
+    def _send_state(self, name):
+        ctrl, flow = self.units[name]
+        samples = self._pending[name]
+        self._pending[name] = []
+        rows, ctrl.backup_rows = ctrl.backup_rows, []
+        co2_rows, flow.telemetry_rows = flow.telemetry_rows, []
+        # Un comando que devolvio un evento (descarga del diario) se confirma
+        # recien cuando termina; los posteriores esperan con el.
+        acked = self._acked[name]
+        flushing = self._flushing[name]
+        while flushing and flushing[0][1].is_set():
+            flushing.pop(0)
+        if flushing:
+            acked = flushing[0][0] - 1
+        self._send(name, ("state", acked, _state_of(ctrl, _CTRL_STATE_FIELDS),
+                          _state_of(flow, _FLOW_STATE_FIELDS), samples, rows, co2_rows))
+
+    def _handle(self, msg):
+        seq, name, target, method, args = msg
+        ctrl, flow = self.units[name]
+        obj = ctrl if target == "ctrl" else flow
+        try:
+            result = getattr(obj, method)(*args)
+            if isinstance(result, threading.Event) and not result.is_set():
+                self._flushing[name].append((seq, result))
+        except Exception as e:
+            self._send(name, ("error", name, f"Comando {method} falló.\n{e}"))
+        self._acked[name] = seq
+        return name
+
+    def _control(self):
+        for ctrl, _ in self.units.values():
+            ctrl.update_process()
+
+    def _sample(self, name):
+        flow = self.units[name][1]
+        sample = flow.take_sample(now())
+        if sample is not None:
+            self._pending[name].append(sample)
+        return flow.period
+
+    def _publish_states(self):
+        while self._journal_errors:
+            name, title, msg = self._journal_errors.popleft()
+            self._send(name, ("error", title, msg))
+        for name in self.units:
+            self._send_state(name)
+        self.ticks += 1
+        if self.ticks == 1 and self.on_first_tick is not None:
+            self.on_first_tick()
+
+    def run(self):
+        for name in self.units:
+            self._send_state(name)
+        try:
+            while True:
+                self.scheduler.run_pending()
+                msg = self._recv(self.scheduler.next_delay())
+                dirty = set()
+                while msg is not _NO_MSG:
+                    if msg is None:
+                        return
+                    dirty.add(self._handle(msg))
+                    msg = self._recv(0)
+                for name in dirty:
+                    self._send_state(name)
+        except (EOFError, BrokenPipeError, KeyboardInterrupt):
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for ctrl, flow in self.units.values():
+            try:
+                ctrl.stop_all()
+            except Exception:
+                pass
+        # Ultimo estado con las filas producidas desde el envio anterior; si
+        # la GUI ya no escucha quedan igual en los CSV y el diario.
+        for name in self.units:
+            try:
+                self._send_state(name)
+            except (EOFError, OSError):
+                break
+        for ctrl, flow in self.units.values():
+            flow.close()
+        for journal in self.journals:
+            journal.close()
+
+
+def _fermenter_worker_main(cfg, conn, io_lock):
+    def recv(timeout):
+        if conn.poll(timeout):
+            return conn.recv()
+        return _NO_MSG
+
+    hw = Hardware()
+    loop = ControlLoop([cfg], hw, recv, lambda name, msg: conn.send(msg), io_lock=io_lock)
+    try:
+        loop.run()
+    finally:
+        hw.cleanup()
+
+
+class WorkerProxy:
+    # Espejo en la GUI de un objeto que vive en el proceso worker. Los
+    # metodos envian comandos; el estado llega con cada snapshot.
+    def __init__(self, worker, target):
+        self._worker = worker
+        self._target = target
+
+    def _call(self, method, *args):
+        return self._worker.send(self._target, method, args)
+
+    def _apply(self, state):
+        self.__dict__.update(state)
+
+
+class RemoteFermenterControl(WorkerProxy):
+    def __init__(self, worker, cfg):
+        super().__init__(worker, "ctrl")
+        self.cfg = cfg
+        self.name = cfg["name"]
+        self.cal_sp = {}
+        self.cal_nut = {}
+        # Valores hasta recibir el primer snapshot del worker.
+        self.t = float("nan")
+        self.sp = 20.0
+        self.band = 0.5
+        self.manual_mode = False
+        self.cold_in = False
+        self.hot_in = False
+        self.nut_on = False
+        self.manual_nut_on = False
+        self.freq_nut = 8000.0
+        self.csv_dir = os.path.abspath("./Proceso")
+        self.csv_name = f"{safe_file_name(self.name)}.csv"
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        self.t_stats = None
+        self.relay_switches = {"cold": 0, "hot": 0}
+
+    def set_sp(self, value):
+        self.sp = float(value)
+        self._call("set_sp", value)
+
+    def set_band(self, value):
+        self.band = float(value)
+        self._call("set_band", value)
+
+    def set_manual_mode(self, value):
+        self.manual_mode = bool(value)
+        self._call("set_manual_mode", value)
+
+    def set_freq_nut(self, value):
+        self.freq_nut = float(value)
+        self._call("set_freq_nut", value)
+
+    def set_cal_sp(self, data):
+        self.cal_sp = data or {}
+        self._call("set_cal_sp", self.cal_sp)
+
+    def set_cal_nut(self, data):
+        self.cal_nut = data or {}
+        self._call("set_cal_nut", self.cal_nut)
+
+    def set_csv_dir(self, path):
+        self.csv_dir = path
+        self._call("set_csv_dir", path)
+
+    def set_csv_name(self, name):
+        self.csv_name = name
+        self._call("set_csv_name", name)
+
+    def forzar_frio(self):
+        self._call("forzar_frio")
+
+    def forzar_caliente(self):
+        self._call("forzar_caliente")
+
+    def cerrar_todo(self):
+        self._call("cerrar_todo")
+
+    def stop_all(self):
+        self._call("stop_all")
+
+    def toggle_manual_nut(self):
+        self._call("toggle_manual_nut")
+
+    def csv_path(self):
+        return _csv_file_path(self.csv_dir, self.csv_name, f"{safe_file_name(self.name)}.csv")
+
+    def csv_start(self):
+        self._call("csv_start")
+
+    def csv_pause(self):
+        self._call("csv_pause")
+
+    def mark_exported(self):
+        self.csv_last_export_ok = True
+        self._call("mark_exported")
+
+    def csv_restart(self):
+        path = self.csv_path()
+        self._call("csv_restart")
+        return path
+
+    def flush_journal(self):
+        return self._call("flush_journal")
+
+
+class RemoteFlowChannel(WorkerProxy):
+    def __init__(self, worker, name):
+        super().__init__(worker, "flow")
+        self.name = name
+        self.samples = collections.deque()
+        self.mode = "HARDWARE"
+        self.period = 10
+        self.next_sample = None
+        self.csv_dir = os.path.abspath("./Proceso")
+        self.csv_name = f"{safe_file_name(name)}_co2.csv"
+        self.csv_running = False
+        self.csv_paused = False
+        self.csv_last_export_ok = False
+        self.co2_total_g = 0.0
+        self.co2_total_g_l = 0.0
+        self.flow_stats = None
+        self.ferm_state = FERM_IDLE
+        self.ferm_peak_g_l_h = 0.0
+
+    def set_csv_dir(self, path):
+        self.csv_dir = path
+        self._call("set_csv_dir", path)
+
+    def set_csv_name(self, name):
+        self.csv_name = name
+        self._call("set_csv_name", name)
+
+    def csv_path(self):
+        return _csv_file_path(self.csv_dir, self.csv_name, f"{safe_file_name(self.name)}_co2.csv")
+
+    def csv_start(self):
+        self._call("csv_start")
+
+    def csv_pause(self):
+        self._call("csv_pause")
+
+    def mark_exported(self):
+        self.csv_last_export_ok = True
+        self._call("mark_exported")
+
+    def csv_restart(self):
+        path = self.csv_path()
+        self._call("csv_restart")
+        return path
+
+    def reset_co2_total(self):
+        self.co2_total_g = 0.0
+        self.co2_total_g_l = 0.0
+        self.ferm_state = FERM_IDLE
+        self._call("reset_co2_total")
+
+    ingest = FlowChannel.ingest
+
+
+class FermenterHandle:
+    # Lado GUI de un fermentador controlado por un ControlLoop (hilo o
+    # proceso): envia comandos y aplica los snapshots que llegan.
+    def __init__(self, cfg):
+        self.name = cfg["name"]
+        self._seq = 0
+        self._dead_reported = False
+        self.ctrl = RemoteFermenterControl(self, cfg)
+        self.flow = RemoteFlowChannel(self, self.name)
+        self.errors = []
+        self.backup_rows = []
+        self.co2_rows = []
+        self.acked = 0
+        self.on_command = None
+
+    def send(self, target, method, args=()):
+        # Devuelve el numero del comando: aplicado cuando acked lo alcanza.
+        self._seq += 1
+        try:
+            self._put((self._seq, self.name, target, method, tuple(args)))
+        except (OSError, BrokenPipeError) as e:
+            self.errors.append((self.name, f"Control sin conexión: {e}"))
+        if self.on_command is not None:
+            self.on_command()
+        return self._seq
+
+    def _apply_message(self, msg):
+        if msg[0] == "error":
+            self.errors.append(msg[1:])
             return
+        _, acked, ctrl_state, flow_state, samples, rows, co2_rows = msg
+        for sample in samples:
+            self.flow.ingest(sample)
+        self.backup_rows.extend(rows)
+        self.co2_rows.extend(co2_rows)
+        self.acked = acked
+        # Snapshots anteriores al ultimo comando pisarian lo que el
+        # usuario acaba de cambiar: se ignoran hasta que el loop alcance.
+        if acked >= self._seq:
+            self.ctrl._apply(ctrl_state)
+            self.flow._apply(flow_state)
+
+    def take_backup_rows(self):
+        rows, self.backup_rows = self.backup_rows, []
+        return rows
+
+    def take_co2_rows(self):
+        rows, self.co2_rows = self.co2_rows, []
+        return rows
+
+    def wait_ready(self, timeout: float) -> bool:
+        msg = self._get(timeout)
+        if msg is _NO_MSG:
+            return False
+        self._apply_message(msg)
+        self.poll()
+        return True
+
+    def _collect_until_stopped(self, timeout: float):
+        # Al cerrar: aplica lo que el loop manda mientras termina.
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                msg = self._get(0.05)
+            except (EOFError, OSError):
+                return
+            if msg is not _NO_MSG:
+                self._apply_message(msg)
+            elif not self.is_alive() or time.monotonic() > deadline:
+                return
+
+    def poll(self):
         try:
-            val = self.value_type(self.val_var.get().strip())
+            while True:
+                msg = self._get(0)
+                if msg is _NO_MSG:
+                    break
+                self._apply_message(msg)
+        except (EOFError, OSError):
+            pass
+        if not self.is_alive() and not self._dead_reported:
+            self._dead_reported = True
+            self.errors.append((self.name, "El control del fermentador se detuvo."))
+
+
+class FermenterWorker(FermenterHandle):
+    def __init__(self, ctx, cfg, io_lock):
+        super().__init__(cfg)
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_fermenter_worker_main,
+            args=(cfg, child, io_lock),
+            name=f"fermentador-{self.name}",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def _put(self, msg):
+        self.conn.send(msg)
+
+    def _get(self, timeout):
+        if self.conn.poll(timeout):
+            return self.conn.recv()
+        return _NO_MSG
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout: float = 3.0):
+        try:
+            self.conn.send(None)
         except Exception:
-            messagebox.showerror("Calendario", "Valor inválido.")
-            return
-        old = flist[idx]
-        orig = self.data[key].index(old)
-        self.data[key][orig] = {"time": t, "value": val}
-        self.refresh_day_list()
-        self.refresh_calendar()
+            pass
+        self._collect_until_stopped(timeout)
+        self.process.join(0.5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
 
-    def del_event(self):
-        idx = self._sel_index()
-        if idx is None:
-            return
-        key = ymd(self.selected_date)
-        flist = sorted(self.data.get(key, []), key=lambda x: x["time"])
-        if not flist:
-            return
-        self.data[key].remove(flist[idx])
-        if not self.data[key]:
-            del self.data[key]
-        self.refresh_day_list()
-        self.refresh_calendar()
 
-    def clear_day(self):
-        key = ymd(self.selected_date)
-        if key in self.data and self.data[key]:
-            if messagebox.askyesno("Calendario", f"¿Borrar todos los eventos del {key}?"):
-                del self.data[key]
-                self.refresh_day_list()
-                self.refresh_calendar()
+class ThreadedFermenter(FermenterHandle):
+    def __init__(self, cfg, inbox, thread):
+        super().__init__(cfg)
+        self.inbox = inbox
+        self.outbox = queue.Queue()
+        self.thread = thread
 
-    def import_file(self):
-        if not self.import_callback:
-            return
-        data = self.import_callback()
-        if data:
-            self.data = data
-            self.refresh_day_list()
-            self.refresh_calendar()
+    def _put(self, msg):
+        self.inbox.put(msg)
 
-    def accept(self):
-        self.grab_release()
-        self.destroy()
+    def _get(self, timeout):
+        try:
+            return self.outbox.get(timeout=timeout) if timeout > 0 else self.outbox.get_nowait()
+        except queue.Empty:
+            return _NO_MSG
 
-    def cancel(self):
-        self.data = None
-        self.grab_release()
-        self.destroy()
+    def is_alive(self):
+        return self.thread.is_alive()
 
+    def stop(self, timeout: float = 3.0):
+        self.inbox.put(None)
+        self.thread.join(timeout)
+        self._collect_until_stopped(0)
 
-# ===== Funciones calendario =====
-def sp_from_date_calendar(events_dict: dict | None, t: dt.datetime, default=None):
-    if not events_dict:
-        return default
-    key = ymd(t.date())
-    flist = events_dict.get(key, [])
-    if not flist:
-        return default
-    hhmm_now = t.strftime("%H:%M")
-    todays = [e for e in flist if e.get("time") and e["time"] <= hhmm_now]
-    if not todays:
-        return default
-    todays = sorted(todays, key=lambda e: e["time"])
-    return todays[-1].get("value", default)
 
+def start_fermenter_workers(fermenters):
+    methods = multiprocessing.get_all_start_methods()
+    # fork evita reimportar la GUI en cada worker; en Windows solo hay spawn.
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    io_lock = ctx.Lock()
+    workers = [FermenterWorker(ctx, cfg, io_lock) for cfg in fermenters]
+    for w in workers:
+        if not w.wait_ready(15.0):
+            print(f"[WORKER] {w.name} no respondió al iniciar.")
+    startup_mark("workers listos")
+    return workers
 
-def nut_fire_for_minute(events_dict: dict | None, t: dt.datetime):
-    if not events_dict:
-        return []
-    key = ymd(t.date())
-    flist = events_dict.get(key, [])
-    if not flist:
-        return []
-    hhmm_now = t.strftime("%H:%M")
-    return [e.get("value") for e in flist if e.get("time") == hhmm_now]
 
+def start_control_thread(fermenters, hw):
+    inbox = queue.Queue()
+    handles = {}
 
-def _events_from_rows(rows, value_type=float):
-    events = {}
-    for row in rows:
-        date_raw = row.get("date") or row.get("fecha") or row.get("dia") or row.get("d")
-        time_raw = row.get("time") or row.get("hora") or row.get("t")
-        val_raw = row.get("value") or row.get("valor") or row.get("v")
-        if not date_raw or not time_raw or val_raw is None:
-            continue
-        date_obj = _normalize_date(str(date_raw))
-        if not date_obj:
-            continue
-        hhmm = str(time_raw).strip()
-        if not hhmm_ok(hhmm):
-            continue
+    def recv(timeout):
         try:
-            val = value_type(val_raw)
-        except Exception:
-            continue
-        key = ymd(date_obj)
-        events.setdefault(key, []).append({"time": hhmm, "value": val})
-    return events
-
+            return inbox.get(timeout=timeout) if timeout > 0 else inbox.get_nowait()
+        except queue.Empty:
+            return _NO_MSG
 
-def _load_calendar_file(path: str, value_type=float):
-    ext = os.path.splitext(path)[1].lower()
-    if ext in {".csv", ".txt"}:
-        with open(path, "r", encoding="utf-8") as f:
-            rows = list(csv.DictReader(f))
-        return _events_from_rows(rows, value_type=value_type)
-    if ext in {".xlsx", ".xls"}:
-        pd_spec = importlib_util.find_spec("pandas")
-        if not pd_spec:
-            raise RuntimeError("Necesitas instalar pandas para leer archivos de Excel (.xlsx/.xls)")
-        import pandas as pd  # type: ignore
+    def send(name, msg):
+        handles[name].outbox.put(msg)
 
-        df = pd.read_excel(path)
-        rows = df.to_dict(orient="records")
-        return _events_from_rows(rows, value_type=value_type)
-    raise RuntimeError("Formato no soportado. Usa CSV o Excel.")
+    loop = ControlLoop(fermenters, hw, recv, send, on_first_tick=lambda: startup_mark("primer tick de control"))
+    thread = threading.Thread(target=loop.run, name="control", daemon=True)
+    for cfg in fermenters:
+        handles[cfg["name"]] = ThreadedFermenter(cfg, inbox, thread)
+    thread.start()
+    for h in handles.values():
+        h.wait_ready(5.0)
+    return list(handles.values())
 
 
 # ===== Fermentador (panel industrial) =====
 class FermenterPanel(ctk.CTkFrame):
-    def __init__(self, app, name, hw: Hardware, backup_path_getter):
+    # Vista de un FermenterControl: las variables Tk solo reflejan y envían
+    # cambios; el control corre aunque el panel no se haya construido.
+    def __init__(self, master, app, ctrl: FermenterControl):
         super().__init__(
-            app,
+            master,
             corner_radius=25,
             border_width=2,
             border_color="#111827",
             fg_color="#020617",
         )
         self.app = app
-        self.name = name
-        self.hw = hw
-        self.get_backup_path = backup_path_getter
-
-        if self.hw.sim:
-            self.t = 21.5 + random.uniform(-0.3, 0.3)
-            self._sim_ambient = 21.0 + random.uniform(-0.4, 0.4)
-        else:
-            self.t = self.hw.read_temp_ds18b20(index=int(self.name[1:]) - 1)
-            self._sim_ambient = None
-        self._last_update = now()
-        self.t_str = tk.StringVar(value=f"{self.t:.1f}")
-        self.sp = tk.DoubleVar(value=20.0)
-        self.band = tk.DoubleVar(value=0.5)
-        self.manual_mode = tk.BooleanVar(value=False)
-
-        self.cold_in = False
-        self.hot_in = False
-
-        self.cal_sp = {}
-        self.cal_nut = {}
+        self.ctrl = ctrl
+        self.name = ctrl.name
+
+        self.t_str = tk.StringVar(value=f"{ctrl.t:.1f}")
+        self.t_trend = tk.StringVar(value="")
+        self.sp = tk.DoubleVar(value=ctrl.sp)
+        self.band = tk.DoubleVar(value=ctrl.band)
+        self.manual_mode = tk.BooleanVar(value=ctrl.manual_mode)
+        self.freq_nut = tk.DoubleVar(value=ctrl.freq_nut)
+        self.csv_dir = tk.StringVar(value=ctrl.csv_dir)
+        self.csv_name = tk.StringVar(value=ctrl.csv_name)
+
+        self._syncing = False
+        self._shown = {"sp": ctrl.sp, "manual": ctrl.manual_mode}
+        self._bind_var(self.sp, "sp", lambda v: self.ctrl.set_sp(v))
+        self._bind_var(self.band, "band", lambda v: self.ctrl.set_band(v))
+        self._bind_var(self.manual_mode, "manual", lambda v: self.ctrl.set_manual_mode(v))
+        self._bind_var(self.freq_nut, "freq", lambda v: self.ctrl.set_freq_nut(v))
+        self._bind_var(self.csv_dir, "csv_dir", lambda v: self.ctrl.set_csv_dir(v))
+        self._bind_var(self.csv_name, "csv_name", lambda v: self.ctrl.set_csv_name(v))
 
-        self.nut_running_until = None
-        self._nut_led_on = False
-        self._last_min = None
-        self.freq_nut = tk.DoubleVar(value=8000.0)
-        self.manual_nut_on = False
+        self._build_ui()
+        self.refresh()
 
-        self.csv_dir = tk.StringVar(value=os.path.abspath("./Proceso"))
-        self.csv_name = tk.StringVar(value=f"{self.name}.csv")
-        self._csv_running = False
-        self._csv_paused = False
-        self._csv_last_export_ok = False
-        os.makedirs(self.csv_dir.get(), exist_ok=True)
+    def _bind_var(self, var, key, setter):
+        def on_write(*_):
+            if self._syncing:
+                return
+            try:
+                value = var.get()
+            except (tk.TclError, ValueError):
+                return  # entrada a medio escribir
+            self._shown[key] = value
+            setter(value)
 
-        rel = RELAY_PINS[self.name]
-        self.relay_cold = rel["cold"]
-        self.relay_hot = rel["hot"]
-        self.stepper_name = self.name
-        step = STEPPER_PINS[self.name]
-        if not hw.sim:
-            hw.setup_relay(self.relay_cold)
-            hw.setup_relay(self.relay_hot)
-            hw.setup_stepper(self.stepper_name, step["pul"], step["dir"], 50)
+        var.trace_add("write", on_write)
 
-        self._build_ui()
+    def _sync_var(self, key, var, value):
+        if self._shown.get(key) == value:
+            return
+        self._syncing = True
+        try:
+            var.set(value)
+        finally:
+            self._syncing = False
+        self._shown[key] = value
 
     # ---------------- UI ----------------
     def _build_ui(self):
@@ -826,7 +5035,13 @@ class FermenterPanel(ctk.CTkFrame):
             textvariable=self.t_str,
             font=("Segoe UI", 28, "bold"),
             text_color="#f97316",
-        ).pack(padx=4, pady=4)
+        ).pack(padx=4, pady=(4, 0))
+        ctk.CTkLabel(
+            temp_box,
+            textvariable=self.t_trend,
+            font=("Segoe UI", 11),
+            text_color="#9ca3af",
+        ).pack(padx=4, pady=(0, 4))
 
         # SP (con caja similar a T)
         ctk.CTkLabel(top, text="SP (°C)", font=("Segoe UI", 13)).grid(row=0, column=1, pady=(0, 4))
@@ -1084,12 +5299,33 @@ class FermenterPanel(ctk.CTkFrame):
         ).grid(row=2, column=0, columnspan=3, pady=(6, 2), sticky="ew")
 
     # --------- Forzados y LEDs ----------
+    def refresh(self):
+        c = self.ctrl
+        self._sync_var("t", self.t_str, f"{c.t:.1f}")
+        self._sync_var("t_trend", self.t_trend, self._trend_text())
+        self._sync_var("sp", self.sp, c.sp)
+        self._sync_var("band", self.band, c.band)
+        self._sync_var("freq", self.freq_nut, c.freq_nut)
+        self._sync_var("manual", self.manual_mode, c.manual_mode)
+        self._sync_leds()
+        self.led_nut.set_on(c.nut_on)
+        if self._shown.get("manual_nut") != c.manual_nut_on:
+            self._update_manual_nut_button()
+        self._csv_state_led(self._csv_color())
+
+    def _trend_text(self):
+        w = stats_window(self.ctrl.t_stats, TREND_WINDOW_SEC)
+        if w is None or w["slope_h"] is None:
+            return ""
+        return f"{w['slope_h']:+.2f} °C/h ({window_label(TREND_WINDOW_SEC)})"
+
     def _sync_leds(self):
-        self.led_cold_in.set_on(self.cold_in)
-        self.led_hot_in.set_on(self.hot_in)
+        self.led_cold_in.set_on(self.ctrl.cold_in)
+        self.led_hot_in.set_on(self.ctrl.hot_in)
 
     def _update_manual_nut_button(self):
-        if self.manual_nut_on:
+        self._shown["manual_nut"] = self.ctrl.manual_nut_on
+        if self.ctrl.manual_nut_on:
             self.btn_manual_nut.configure(
                 text="Bomba manual ON",
                 fg_color="#16a34a",
@@ -1102,58 +5338,25 @@ class FermenterPanel(ctk.CTkFrame):
                 hover_color="#b91c1c",
             )
 
-    def _can_force(self):
-        return self.manual_mode.get()
-
     def forzar_frio(self):
-        if not self._can_force():
-            return
-        self.cold_in = True
-        self.hot_in = False
-        self._apply_relays()
-        self._sync_leds()
+        self.ctrl.forzar_frio()
+        self.refresh()
 
     def forzar_caliente(self):
-        if not self._can_force():
-            return
-        self.hot_in = True
-        self.cold_in = False
-        self._apply_relays()
-        self._sync_leds()
+        self.ctrl.forzar_caliente()
+        self.refresh()
 
     def cerrar_todo(self):
-        self.cold_in = False
-        self.hot_in = False
-        self._apply_relays()
-        self._sync_leds()
+        self.ctrl.cerrar_todo()
+        self.refresh()
 
     def stop_all(self):
-        self.manual_mode.set(True)
-        self.cold_in = False
-        self.hot_in = False
-        self.nut_running_until = None
-        self.manual_nut_on = False
-        self._apply_nutricion_state(False)
-        self._apply_relays()
-        self._sync_leds()
-        self._update_manual_nut_button()
-
-    def _apply_relays(self):
-        if self.cold_in:
-            self.hw.relay_on(self.relay_cold)
-        else:
-            self.hw.relay_off(self.relay_cold)
-        if self.hot_in:
-            self.hw.relay_on(self.relay_hot)
-        else:
-            self.hw.relay_off(self.relay_hot)
+        self.ctrl.stop_all()
+        self.refresh()
 
     def toggle_manual_nut(self):
-        self.manual_nut_on = not self.manual_nut_on
-        self._update_manual_nut_button()
-        tnow = now()
-        schedule_active = bool(self.nut_running_until and tnow < self.nut_running_until)
-        self._apply_nutricion_state(schedule_active or self.manual_nut_on)
+        self.ctrl.toggle_manual_nut()
+        self.refresh()
 
     # -------------- Calendarios --------------
     def edit_cal_sp(self):
@@ -1162,12 +5365,12 @@ class FermenterPanel(ctk.CTkFrame):
             title_label=f"Calendario de Setpoint – {self.name}",
             value_label="Setpoint (°C):",
             value_type=float,
-            initial=self.cal_sp,
+            initial=self.ctrl.cal_sp,
             import_callback=lambda: self._import_calendar(value_type=float),
         )
         self.app.wait_window(dlg)
         if dlg.data is not None:
-            self.cal_sp = dlg.data
+            self.ctrl.set_cal_sp(dlg.data)
 
     def edit_cal_nut(self):
         dlg = DateCalendarDialog(
@@ -1175,12 +5378,12 @@ class FermenterPanel(ctk.CTkFrame):
             title_label=f"Calendario de Nutrición – {self.name}",
             value_label="Duración (seg):",
             value_type=float,
-            initial=self.cal_nut,
+            initial=self.ctrl.cal_nut,
             import_callback=lambda: self._import_calendar(value_type=float),
         )
         self.app.wait_window(dlg)
         if dlg.data is not None:
-            self.cal_nut = dlg.data
+            self.ctrl.set_cal_nut(dlg.data)
 
     def _import_calendar(self, value_type=float):
         path = filedialog.askopenfilename(
@@ -1192,270 +5395,139 @@ class FermenterPanel(ctk.CTkFrame):
             ],
         )
         _restore_focus(self)
-        if not path:
-            return None
-        try:
-            data = _load_calendar_file(path, value_type=value_type)
-            if not data:
-                messagebox.showwarning("Importar calendario", "El archivo no tiene filas válidas (fecha, hora, valor).")
-                return None
-            return data
-        except Exception as e:
-            messagebox.showerror("Importar calendario", f"No se pudo importar el archivo.\n{e}")
-            return None
-
-    def _apply_nutricion_state(self, should_run: bool):
-        if should_run and not self._nut_led_on:
-            self.hw.start_stepper(self.stepper_name, self.freq_nut.get())
-        elif not should_run and self._nut_led_on:
-            self.hw.stop_stepper(self.stepper_name)
-        self._nut_led_on = should_run
-        self.led_nut.set_on(self._nut_led_on)
-
-    # ---------------- CSV --------------------
-    def pick_dir(self):
-        d = filedialog.askdirectory(title="Elegir carpeta de trabajo CSV")
-        _restore_focus(self)
-        if d:
-            self.csv_dir.set(d)
-            os.makedirs(d, exist_ok=True)
-
-    def _csv_path(self):
-        name = self.csv_name.get().strip() or f"{self.name}.csv"
-        if not name.lower().endswith(".csv"):
-            name += ".csv"
-        return os.path.join(self.csv_dir.get(), name)
-
-    def _csv_state_led(self, color):
-        self.led_csv.set_color(color)
-
-    def csv_start(self):
-        self._csv_running = True
-        self._csv_paused = False
-        self._csv_last_export_ok = False
-        self._csv_state_led("#22c55e")
-
-    def csv_pause(self):
-        self._csv_running = False
-        self._csv_paused = True
-        self._csv_state_led("#eab308")
-
-    def csv_export(self):
-        if self._csv_running:
-            messagebox.showerror("Exportar", "Detén o pausa el CSV antes de exportar.")
-            return
-        src = self._csv_path()
-        if not os.path.exists(src):
-            messagebox.showerror("Exportar", f"No existe {src}")
-            return
-        dst_dir = filedialog.askdirectory(title="Seleccionar carpeta de destino")
-        _restore_focus(self)
-        if not dst_dir:
-            return
-        try:
-            dst = os.path.join(dst_dir, os.path.basename(src))
-            with open(src, "r", encoding="utf-8") as fsrc, open(dst, "w", encoding="utf-8", newline="") as fdst:
-                fdst.write(fsrc.read())
-            self._csv_last_export_ok = True
-            self._csv_state_led("#3b82f6")
-            messagebox.showinfo("Exportar", f"Archivo exportado a:\n{dst}")
-        except Exception as e:
-            messagebox.showerror("Exportar", f"No se pudo exportar.\n{e}")
-
-    def csv_restart(self):
-        self._csv_running = False
-        self._csv_paused = False
-        path = self._csv_path()
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-            self._csv_state_led("#ef4444")
-            messagebox.showinfo("CSV", f"Archivo reiniciado:\n{path}")
-        except Exception as e:
-            messagebox.showerror("CSV", f"No se pudo reiniciar.\n{e}")
-
-    def _csv_write_row(self):
-        row = {
-            "timestamp": now_str(),
-            "fermentador": self.name,
-            "T": f"{self.t:.1f}",
-            "SP": f"{float(self.sp.get()):.2f}",
-            "banda": f"{float(self.band.get()):.2f}",
-            "cold": int(self.cold_in),
-            "hot": int(self.hot_in),
-            "nutricion_activa": int(self._nut_led_on),
-            "freq_nut": f"{float(self.freq_nut.get()):.1f}",
-        }
-
-        if self._csv_running:
-            ipath = self._csv_path()
-            cabe = not os.path.exists(ipath)
-            try:
-                os.makedirs(os.path.dirname(ipath), exist_ok=True)
-                with open(ipath, "a", newline="", encoding="utf-8") as f:
-                    w = csv.DictWriter(f, fieldnames=list(row.keys()))
-                    if cabe:
-                        w.writeheader()
-                    w.writerow(row)
-            except Exception as e:
-                messagebox.showerror("CSV", f"No se pudo escribir en {ipath}\n{e}")
-
-        bpath = self.get_backup_path()
-        bdir = os.path.dirname(bpath) or "."
-        os.makedirs(bdir, exist_ok=True)
-
-        backup_fields = [
-            "timestamp",
-            "fermentador",
-            "T",
-            "SP",
-            "banda",
-            "cold",
-            "hot",
-            "nutricion_activa",
-            "freq_nut",
-        ]
-        write_header = not os.path.exists(bpath) or os.path.getsize(bpath) == 0
-
+        if not path:
+            return None
         try:
-            with open(bpath, "a", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=backup_fields, extrasaction="ignore")
-                if write_header:
-                    w.writeheader()
-                w.writerow(row)
+            data = _load_calendar_file(path, value_type=value_type)
+            if not data:
+                messagebox.showwarning("Importar calendario", "El archivo no tiene filas válidas (fecha, hora, valor).")
+                return None
+            return data
         except Exception as e:
-            messagebox.showerror("Backup global", f"No se pudo escribir en {bpath}\n{e}")
-
-    # ----------------- Simulación de temperatura -----------------
-    def _simulate_temp(self, dt_seconds: float):
-        if dt_seconds <= 0:
-            return
-
-        sp_obj = float(self.sp.get())
-
-        ambient_pull = (self._sim_ambient - self.t) * 0.0008
-        ferment_target = max(sp_obj, self._sim_ambient + 4.0)
-        ferment_heat = (ferment_target - self.t) * 0.018
-
-        heating = 0.22 if self.hot_in else 0.0
-        cooling = -0.28 if self.cold_in else 0.0
-
-        ruido = random.uniform(-0.008, 0.008)
-        delta = (ambient_pull + ferment_heat + heating + cooling + ruido) * dt_seconds
-        self.t = max(-5.0, min(40.0, self.t + delta))
+            messagebox.showerror("Importar calendario", f"No se pudo importar el archivo.\n{e}")
+            return None
 
-    # ----------------- Loop del proceso -----------------
-    def update_process(self):
-        tnow = now()
-        dt_seconds = max(0.001, (tnow - self._last_update).total_seconds())
-        self._last_update = tnow
+    # ---------------- CSV --------------------
+    def pick_dir(self):
+        d = filedialog.askdirectory(title="Elegir carpeta de trabajo CSV")
+        _restore_focus(self)
+        if d:
+            self.csv_dir.set(d)
+            os.makedirs(d, exist_ok=True)
 
-        sp_cal = None
-        if not self.manual_mode.get():
-            sp_cal = sp_from_date_calendar(self.cal_sp, tnow, default=None)
-            if sp_cal is not None:
-                try:
-                    self.sp.set(float(sp_cal))
-                except Exception:
-                    pass
+    def _csv_color(self):
+        c = self.ctrl
+        if c.csv_running:
+            return "#22c55e"
+        if c.csv_last_export_ok:
+            return "#3b82f6"
+        if c.csv_paused:
+            return "#eab308"
+        return "#ef4444"
 
-        current_min = tnow.strftime("%Y-%m-%d %H:%M")
-        if self._last_min != current_min:
-            doses = nut_fire_for_minute(self.cal_nut, tnow)
-            if doses:
-                dur_total = sum(float(d) for d in doses if float(d) > 0)
-                if dur_total > 0:
-                    self.nut_running_until = tnow + dt.timedelta(seconds=dur_total)
-                    self.hw.start_stepper(self.stepper_name, self.freq_nut.get())
-            self._last_min = current_min
+    def _csv_state_led(self, color):
+        self.led_csv.set_color(color)
 
-        schedule_active = False
-        if self.nut_running_until and tnow < self.nut_running_until:
-            schedule_active = True
-        else:
-            self.nut_running_until = None
-        self._apply_nutricion_state(schedule_active or self.manual_nut_on)
+    def csv_start(self):
+        self.ctrl.csv_start()
+        self.refresh()
 
-        if self.hw.sim:
-            self._simulate_temp(dt_seconds)
-        else:
-            self.t = self.hw.read_temp_ds18b20(index=int(self.name[1:]) - 1)
-        self.t_str.set(f"{self.t:.1f}")
+    def csv_pause(self):
+        self.ctrl.csv_pause()
+        self.refresh()
 
-        if not self.manual_mode.get():
-            sp = float(self.sp.get())
-            band = max(0.05, float(self.band.get()))
-            # control frío
-            if self.cold_in:
-                if self.t <= sp - band:
-                    self.cold_in = False
-            else:
-                if self.t >= sp + band:
-                    self.cold_in = True
-            # control caliente
-            if self.hot_in:
-                if self.t >= sp + band:
-                    self.hot_in = False
-            else:
-                if self.t <= sp - band:
-                    self.hot_in = True
-            if not self.cold_in and not self.hot_in:
-                self.cerrar_todo()
-            self._apply_relays()
-            self._sync_leds()
+    def csv_export(self):
+        self.app.export_process_csv(self.ctrl)
+        self.refresh()
 
-        self._csv_write_row()
+    def csv_restart(self):
+        try:
+            path = self.ctrl.csv_restart()
+            self.refresh()
+            messagebox.showinfo("CSV", f"Archivo reiniciado:\n{path}")
+        except Exception as e:
+            messagebox.showerror("CSV", f"No se pudo reiniciar.\n{e}")
 
 
 # ===== App principal =====
 class App(ctk.CTk):
-    def __init__(self):
+    def __init__(self, workers=None, hw=None):
         super().__init__()
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("dark-blue")
 
-        self.title("Panel de control – 3 Fermentadores")
+        n_ferms = len(FERMENTERS)
+        cols = max(1, min(n_ferms, FERMENTERS_PER_PAGE))
+        self.title(f"Panel de control – {n_ferms} Fermentadores")
         self.geometry("1500x780")
         self.minsize(1400, 850)
 
-        self.grid_columnconfigure((0, 1, 2), weight=1, uniform="col")
+        self.grid_columnconfigure(tuple(range(cols)), weight=1, uniform="col")
         self.grid_rowconfigure(2, weight=1)
 
-        self.hw = Hardware()
-        self.flow_readers = {}
+        # El control ya corre (hilo o procesos) antes de construir la UI.
+        self.hw = hw or Hardware()
+        if workers is None:
+            workers = start_control_thread(FERMENTERS, self.hw)
+        self.workers = {w.name: w for w in workers}
+        for w in self.workers.values():
+            w.on_command = self._schedule_worker_drain
+        self._worker_drain_job = None
+        self._closing = False
+        self._sink_errors = []
+        journal = CsvJournal("backup", on_error=self._backup_error) if LOG_FLUSH_SEC > 0 else None
+        self.backup_sink = BackupSink(
+            os.path.abspath("./Backup/backup_global.csv"), on_error=self._backup_error, journal=journal
+        )
+        # Un solo planificador para el trabajo periodico del hilo de Tk:
+        # espejo del control primero; reloj, graficos y dashboard se
+        # descartan primero si la GUI se atrasa.
+        self.scheduler = Scheduler(budget=0.2)
+        self.series_cache = BackupSeriesCache(self, self.get_backup_path, self.scheduler)
+        self.rollups = RollupWriter(RollupStore(lambda: rollup_root_for(self.backup_sink.path)))
+        # Las consultas de los graficos corren en hilos: la ruta sale de
+        # BackupSink (la actualiza el hilo de Tk), no de la variable Tk.
+        self.series_query = SeriesQuery(lambda: self.backup_sink.path, lambda name: self.flow_channels[name].csv_path(),
+                                        lambda: rollup_root_for(self.backup_sink.path))
+        self.series_query.add_memory_source(self._flow_memory_source)
+        self.series_query.add_memory_source(self._cache_memory_source)
+        self.telemetry = None
+        if TELEMETRY_URL:
+            try:
+                spool = TelemetrySpool(TELEMETRY_SPOOL_DIR, int(TELEMETRY_SPOOL_MAX_MB * 1024 * 1024))
+                self.telemetry = TelemetrySink(telemetry_sender(TELEMETRY_URL), spool)
+                print(f"[TELEMETRIA] Publicando en {TELEMETRY_URL} ({len(spool)} lotes pendientes en disco)")
+            except (OSError, ValueError) as e:
+                print(f"[TELEMETRIA] Deshabilitada: {e}")
+        self.dashboard_hub = DashboardHub()
+        self.dashboard = None
+        if DASHBOARD_PORT:
+            try:
+                self.dashboard = DashboardServer(DASHBOARD_HOST, DASHBOARD_PORT, self.dashboard_hub).start()
+                print(f"[WEB] Dashboard en http://{DASHBOARD_HOST}:{self.dashboard.port}/")
+            except OSError as e:
+                print(f"[WEB] No se pudo iniciar el dashboard en el puerto {DASHBOARD_PORT}: {e}")
+        self.control_api = None
+        if self.dashboard is not None and API_TOKEN:
+            units = {name: (w.ctrl, w.flow) for name, w in self.workers.items()}
+            self.control_api = ControlApi(API_TOKEN, units, lambda: self._dashboard_snapshot()["fermenters"])
+            self.dashboard.httpd.api = self.control_api
+            self.scheduler.add("api", 0.1, self._drain_api, PRIO_CONTROL)
+            print("[WEB] API REST de control habilitada en /api/fermenters")
+        self.flow_channels = {}
         self.flow_samples = {}
-        self.flow_next_sample = {}
-        self.flow_sample_period = {}
         self.co2_csv_dir = {}
         self.co2_csv_name = {}
-        self.co2_csv_running = {}
-        self.co2_csv_paused = {}
-        self.co2_csv_last_export_ok = {}
         self._co2_csv_leds = {}
-        default_channels = {"F1": 1, "F2": 2, "F3": 3}
-        for name in ("F1", "F2", "F3"):
-            addr_env = os.environ.get(f"ADS1115_ADDR_{name}", "").strip()
-            ch_env = os.environ.get(f"ADS1115_CH_{name}", "").strip()
-            gain_env = os.environ.get(f"ADS1115_GAIN_{name}", "").strip()
-            addr = parse_int(addr_env, ADS1115_ADDR) if addr_env else ADS1115_ADDR
-            default_ch = default_channels.get(name, ADS1115_CH)
-            ch = parse_int(ch_env, default_ch) if ch_env else default_ch
-            gain = parse_int(gain_env, ADS1115_GAIN) if gain_env else ADS1115_GAIN
-            reader = ADS1115Reader(addr, ch, gain)
-            self.flow_readers[name] = reader
-            self.flow_samples[name] = []
-            self.flow_next_sample[name] = None
-            if SAMPLE_PERIOD_SEC is None:
-                period = 1 if reader.sim else 10
-            else:
-                period = SAMPLE_PERIOD_SEC
-            self.flow_sample_period[name] = period
-            self.co2_csv_dir[name] = tk.StringVar(value=os.path.abspath("./Proceso"))
-            self.co2_csv_name[name] = tk.StringVar(value=f"{name}_co2.csv")
-            self.co2_csv_running[name] = False
-            self.co2_csv_paused[name] = False
-            self.co2_csv_last_export_ok[name] = False
-            os.makedirs(self.co2_csv_dir[name].get(), exist_ok=True)
+        for cfg in FERMENTERS:
+            name = cfg["name"]
+            channel = self.workers[name].flow
+            self.flow_channels[name] = channel
+            self.flow_samples[name] = channel.samples
+            self.co2_csv_dir[name] = tk.StringVar(value=channel.csv_dir)
+            self.co2_csv_name[name] = tk.StringVar(value=channel.csv_name)
+            self.co2_csv_dir[name].trace_add("write", lambda *_, ch=channel, v=self.co2_csv_dir[name]: ch.set_csv_dir(v.get()))
+            self.co2_csv_name[name].trace_add("write", lambda *_, ch=channel, v=self.co2_csv_name[name]: ch.set_csv_name(v.get()))
         self._flow_plot_windows = {}
 
         # ---------- LOGO CII ----------
@@ -1463,6 +5535,8 @@ class App(ctk.CTk):
         logo_path = os.path.join(ASSETS_DIR, "logo_cii.png")
         if os.path.exists(logo_path):
             try:
+                from PIL import Image  # solo se usa para el logo
+
                 pil_img = Image.open(logo_path)
                 # tamaño objetivo (ajusta si quieres):
                 self.logo_ctk = ctk.CTkImage(dark_image=pil_img, size=(160, 80))
@@ -1473,14 +5547,14 @@ class App(ctk.CTk):
 
         # TOP BAR
         top_bar = ctk.CTkFrame(self, fg_color="transparent")
-        top_bar.grid(row=0, column=0, columnspan=3, sticky="ew", padx=12, pady=(10, 0))
+        top_bar.grid(row=0, column=0, columnspan=cols, sticky="ew", padx=12, pady=(10, 0))
         top_bar.grid_columnconfigure(0, weight=1)
 
         title_row = ctk.CTkFrame(top_bar, fg_color="transparent")
         title_row.grid(row=0, column=0, sticky="w")
         ctk.CTkLabel(
             title_row,
-            text="Panel 3 Fermentadores",
+            text=f"Panel {n_ferms} Fermentadores",
             font=("Segoe UI", 28, "bold"),
         ).pack(side="left")
         ctk.CTkLabel(
@@ -1489,7 +5563,12 @@ class App(ctk.CTk):
             font=("Segoe UI", 18, "italic"),
         ).pack(side="left")
 
-        mode_text = f"Modo: {'SIMULADOR' if self.hw.sim else 'HARDWARE'}"
+        if self.hw.sim:
+            mode_text = "Modo: SIMULADOR"
+        elif self.hw.replay is not None:
+            mode_text = f"Modo: REPLAY x{REPLAY_SPEED:g}"
+        else:
+            mode_text = "Modo: HARDWARE"
         ctk.CTkLabel(
             top_bar,
             text=mode_text,
@@ -1502,7 +5581,7 @@ class App(ctk.CTk):
 
         # Backup global
         backup_frame = ctk.CTkFrame(self, fg_color="transparent")
-        backup_frame.grid(row=1, column=0, columnspan=3, sticky="ew", padx=12, pady=(4, 8))
+        backup_frame.grid(row=1, column=0, columnspan=cols, sticky="ew", padx=12, pady=(4, 8))
         backup_frame.grid_columnconfigure(1, weight=1)
 
         self.backup_path = tk.StringVar(value=os.path.abspath("./Backup/backup_global.csv"))
@@ -1521,16 +5600,34 @@ class App(ctk.CTk):
             corner_radius=16,
         ).grid(row=0, column=2, padx=(4, 0))
 
-        # Fermentadores (menos espacio lateral)
-        self.ferms = []
-        for i in range(3):
-            panel = FermenterPanel(self, f"F{i+1}", self.hw, backup_path_getter=self.get_backup_path)
-            panel.grid(row=2, column=i, padx=8, pady=(4, 10), sticky="nsew")
-            self.ferms.append(panel)
+        # Fermentadores: el control existe para todos; los paneles se
+        # construyen solo cuando su pagina se muestra.
+        self.controls = [self.workers[cfg["name"]].ctrl for cfg in FERMENTERS]
+        self.panels = {}
+        self._pages = {}
+        self._ui_ready = False
+        self.tabview = None
+        for i in range(0, n_ferms, cols):
+            page = self.controls[i:i + cols]
+            label = page[0].name if len(page) == 1 else f"{page[0].name} – {page[-1].name}"
+            self._pages[label] = page
+        if len(self._pages) == 1:
+            self._page_parent = {label: self for label in self._pages}
+            self._build_page(next(iter(self._pages)), row=2)
+        else:
+            self.tabview = ctk.CTkTabview(self, command=self._on_page_change)
+            self.tabview.grid(row=2, column=0, columnspan=cols, padx=8, pady=(0, 10), sticky="nsew")
+            self._page_parent = {}
+            for label in self._pages:
+                tab = self.tabview.add(label)
+                tab.grid_columnconfigure(tuple(range(cols)), weight=1, uniform="col")
+                tab.grid_rowconfigure(0, weight=1)
+                self._page_parent[label] = tab
+            self._build_page(self.tabview.get(), row=0)
 
         # Footer
         footer = ctk.CTkFrame(self, fg_color="transparent")
-        footer.grid(row=3, column=0, columnspan=3, sticky="ew", padx=12, pady=(4, 10))
+        footer.grid(row=3, column=0, columnspan=cols, sticky="ew", padx=12, pady=(4, 10))
         footer.grid_columnconfigure(0, weight=1)
         footer.grid_columnconfigure(1, weight=1)
         footer.grid_columnconfigure(2, weight=1)
@@ -1564,12 +5661,118 @@ class App(ctk.CTk):
             sticky="e",
         )
 
-        self._tick_job = None        
+        self._tick_job = None
         self._plot_windows = []
-        self._closing = False
         self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._rehydrate_job = None
+        self._start_history_rehydration()
+        self.scheduler.add("control", 1.0, self._drain_tick, PRIO_CONTROL, delay=0.0)
+        self.scheduler.add("reloj", 1.0, self._update_clock, PRIO_UI, delay=0.0)
+        if self.dashboard is not None:
+            self.scheduler.add("dashboard", 1.0, self._publish_dashboard, PRIO_UI, delay=0.0)
         self._tick()
 
+    # ===== paginas de fermentadores =====
+    def _build_page(self, label, row):
+        # Un panel por vuelta del loop de Tk: la ventana aparece y responde
+        # mientras se construyen los demas.
+        parent = self._page_parent[label]
+        for col, ctrl in enumerate(self._pages[label]):
+            if ctrl.name in self.panels:
+                continue
+            panel = FermenterPanel(parent, self, ctrl)
+            panel.grid(row=row, column=col, padx=8, pady=(4, 10), sticky="nsew")
+            self.panels[ctrl.name] = panel
+            self.after(1, lambda: self._build_page(label, row))
+            return
+        if not self._ui_ready:
+            self._ui_ready = True
+            startup_mark("UI construida")
+            print(startup_report())
+            threading.Thread(target=_prewarm_matplotlib, name="prewarm-mpl", daemon=True).start()
+
+    def _on_page_change(self):
+        label = self.tabview.get()
+        self._build_page(label, row=0)
+        for panel in self._visible_panels():
+            panel.refresh()
+
+    def _visible_panels(self):
+        if self.tabview is None:
+            return list(self.panels.values())
+        page = self._pages.get(self.tabview.get(), [])
+        return [self.panels[c.name] for c in page if c.name in self.panels]
+
+    def _control_error(self, title, msg):
+        messagebox.showerror(title, msg)
+
+    # ===== loop de control (hilo o procesos worker) =====
+    def _schedule_worker_drain(self):
+        # Respuesta rapida a los clicks sin esperar al siguiente tick.
+        if self._worker_drain_job is None and not self._closing:
+            self._worker_drain_job = self.after(80, self._drain_workers)
+
+    def _drain_workers(self):
+        self._worker_drain_job = None
+        errors = []
+        for w in self.workers.values():
+            w.poll()
+            rows = w.take_backup_rows()
+            co2_rows = w.take_co2_rows()
+            self.backup_sink.submit(rows)
+            self.series_cache.ingest_rows(rows)
+            self.rollups.submit(rows)
+            self.rollups.submit(co2_rows)
+            if self.telemetry is not None:
+                self.telemetry.submit("proceso", rows)
+                self.telemetry.submit("co2", co2_rows)
+            errors.extend(w.errors)
+            w.errors.clear()
+        while self._sink_errors:
+            errors.append(self._sink_errors.pop(0))
+        for panel in self._visible_panels():
+            panel.refresh()
+        for title, msg in errors:
+            self._control_error(title, msg)
+
+    def _backup_error(self, title, msg):
+        # Llamado desde el hilo del backup: se muestra en el proximo drenado.
+        self._sink_errors.append((title, msg))
+
+    # ===== historial al reiniciar =====
+    def _start_history_rehydration(self):
+        boundary = now()
+        cutoff = boundary - dt.timedelta(hours=MAX_FLOW_HISTORY_HOURS)
+        jobs = [(name, channel.csv_path()) for name, channel in self.flow_channels.items()]
+        self._rehydrate_queue = queue.Queue()
+        self._rehydrate_t0 = time.perf_counter()
+        threading.Thread(
+            target=rehydrate_flow_history,
+            args=(jobs, boundary, cutoff, self._rehydrate_queue),
+            name="historial",
+            daemon=True,
+        ).start()
+        self._rehydrate_job = self.after(200, self._merge_rehydrated)
+
+    def _merge_rehydrated(self):
+        self._rehydrate_job = None
+        while True:
+            try:
+                item = self._rehydrate_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                total = sum(len(s) for s in self.flow_samples.values())
+                print(f"[HISTORIAL] {total} muestras de caudal recuperadas en "
+                      f"{time.perf_counter() - self._rehydrate_t0:.2f} s")
+                return
+            name, chunk = item
+            # Los trozos llegan del mas nuevo al mas antiguo y todos son
+            # anteriores a la primera muestra en vivo.
+            self.flow_samples[name].extendleft(chunk)
+        if not self._closing:
+            self._rehydrate_job = self.after(200, self._merge_rehydrated)
+
     # ===== util backup =====
     def get_backup_path(self):
         path = self.backup_path.get().strip()
@@ -1594,52 +5797,109 @@ class App(ctk.CTk):
             self.backup_path.set(fn)
             os.makedirs(os.path.dirname(fn), exist_ok=True)
 
-    def _read_recent_backup(self, days=10, fermenter=None):
-        path = self.get_backup_path()
-        if not os.path.exists(path):
-            return {}
-        cutoff = now() - dt.timedelta(days=days)
-        data = {}
-        with open(path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                ts_raw = (row.get("timestamp") or "").strip()
-                ts = None
-                for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
-                    try:
-                        ts = dt.datetime.strptime(ts_raw, fmt)
-                        break
-                    except Exception:
-                        continue
-                if not ts or ts < cutoff:
-                    continue
-                ferm = row.get("fermentador", "?").strip() or "?"
-                if fermenter and ferm != fermenter:
-                    continue
-                try:
-                    temp = float(row.get("T", "nan"))
-                    sp = float(row.get("SP", "nan"))
-                    nut = int(row.get("nutricion_activa", "0") or 0)
-                except Exception:
-                    continue
-                data.setdefault(ferm, {"ts": [], "t": [], "sp": [], "nut": []})
-                data[ferm]["ts"].append(ts)
-                data[ferm]["t"].append(temp)
-                data[ferm]["sp"].append(sp)
-                data[ferm]["nut"].append(nut)
-        return data
+    def _flush_logs(self, then):
+        # Con el registro en RAM, lo pendiente se escribe antes de exportar.
+        # Las descargas corren en los hilos de los diarios; aca solo se
+        # consultan las confirmaciones con after() y al final se llama then.
+        if LOG_FLUSH_SEC <= 0:
+            then()
+            return
+        seqs = {name: w.ctrl.flush_journal() for name, w in self.workers.items()}
+        deadline = time.monotonic() + LOG_SYNC_TIMEOUT_SEC
+        sink = []
+
+        def check():
+            if self._closing:
+                return
+            self._drain_workers()
+            if not sink:
+                waiting = [name for name, w in self.workers.items() if w.acked < seqs[name]]
+                if waiting and time.monotonic() < deadline:
+                    self.after(100, check)
+                    return
+                for name in waiting:
+                    print(f"[DIARIO] {name} no confirmó la descarga a tiempo.")
+                # Filas del ultimo drenado incluidas: recien ahora el backup.
+                sink.append(self.backup_sink.request_sync())
+            if not sink[0].is_set() and time.monotonic() < deadline + LOG_SYNC_TIMEOUT_SEC:
+                self.after(100, check)
+                return
+            then()
+
+        check()
+
+    def export_process_csv(self, ctrl):
+        dst_dir = filedialog.askdirectory(title="Seleccionar carpeta de destino")
+        _restore_focus(self)
+        if not dst_dir:
+            return
+
+        def start():
+            src = ctrl.csv_path()
+            if not os.path.exists(src):
+                messagebox.showerror("Exportar", f"No existe {src}")
+                return
+            self._start_export(src, os.path.join(dst_dir, os.path.basename(src)), ctrl.mark_exported)
+
+        self._flush_logs(start)
+
+    def _start_export(self, src, dst, on_done=None):
+        job = ExportJob(src, dst)
+        self._show_export_progress(job, f"{os.path.basename(src)} → {os.path.dirname(dst)}", on_done)
+        return job
+
+    def _show_export_progress(self, job, label, on_done=None):
+        # El trabajo corre en segundo plano; esta ventana solo muestra el avance.
+        dst = job.dst
+        top = tk.Toplevel(self)
+        top.title("Exportando")
+        top.resizable(False, False)
+        ttk.Label(top, text=label).pack(fill="x", padx=12, pady=(12, 4))
+        bar = ttk.Progressbar(top, length=360, maximum=100.0, mode="determinate")
+        bar.pack(fill="x", padx=12, pady=4)
+        detail = ttk.Label(top, text="")
+        detail.pack(fill="x", padx=12)
+        ttk.Button(top, text="Cancelar", command=job.cancel).pack(pady=(6, 12))
+        top.protocol("WM_DELETE_WINDOW", job.cancel)
+
+        def poll():
+            if not top.winfo_exists():
+                return
+            bar["value"] = job.fraction() * 100.0
+            detail.config(text=job.detail())
+            if not job.finished:
+                top.after(200, poll)
+                return
+            top.destroy()
+            if job.cancelled:
+                messagebox.showinfo("Exportar", "Exportación cancelada.")
+            elif job.error is not None:
+                messagebox.showerror("Exportar", f"No se pudo exportar.\n{job.error}")
+            else:
+                if on_done is not None:
+                    on_done()
+                messagebox.showinfo("Exportar", f"Archivo exportado a:\n{dst}")
+
+        poll()
 
     def _co2_csv_path(self, fermenter):
-        name = self.co2_csv_name[fermenter].get().strip() or f"{fermenter}_co2.csv"
-        if not name.lower().endswith(".csv"):
-            name += ".csv"
-        return os.path.join(self.co2_csv_dir[fermenter].get(), name)
+        return self.flow_channels[fermenter].csv_path()
 
     def _co2_csv_state_led(self, fermenter, color):
         led = self._co2_csv_leds.get(fermenter)
         if led is not None:
             led.set_color(color)
 
+    def _co2_csv_color(self, fermenter):
+        channel = self.flow_channels[fermenter]
+        if channel.csv_running:
+            return "#22c55e"
+        if channel.csv_last_export_ok:
+            return "#3b82f6"
+        if channel.csv_paused:
+            return "#eab308"
+        return "#ef4444"
+
     def co2_pick_dir(self, fermenter):
         d = filedialog.askdirectory(title="Elegir carpeta de trabajo CSV CO2")
         _restore_focus(self)
@@ -1648,106 +5908,45 @@ class App(ctk.CTk):
             os.makedirs(d, exist_ok=True)
 
     def co2_csv_start(self, fermenter):
-        self.co2_csv_running[fermenter] = True
-        self.co2_csv_paused[fermenter] = False
-        self.co2_csv_last_export_ok[fermenter] = False
+        self.flow_channels[fermenter].csv_start()
         self._co2_csv_state_led(fermenter, "#22c55e")
 
     def co2_csv_pause(self, fermenter):
-        self.co2_csv_running[fermenter] = False
-        self.co2_csv_paused[fermenter] = True
+        self.flow_channels[fermenter].csv_pause()
         self._co2_csv_state_led(fermenter, "#eab308")
 
     def co2_csv_export(self, fermenter):
-        if self.co2_csv_running[fermenter]:
-            messagebox.showerror("Exportar", "Detén o pausa el CSV antes de exportar.")
-            return
-        src = self._co2_csv_path(fermenter)
-        if not os.path.exists(src):
-            messagebox.showerror("Exportar", f"No existe {src}")
-            return
+        channel = self.flow_channels[fermenter]
         dst_dir = filedialog.askdirectory(title="Seleccionar carpeta de destino")
         _restore_focus(self)
         if not dst_dir:
             return
-        try:
-            dst = os.path.join(dst_dir, os.path.basename(src))
-            with open(src, "r", encoding="utf-8") as fsrc, open(dst, "w", encoding="utf-8", newline="") as fdst:
-                fdst.write(fsrc.read())
-            self.co2_csv_last_export_ok[fermenter] = True
-            self._co2_csv_state_led(fermenter, "#3b82f6")
-            messagebox.showinfo("Exportar", f"Archivo exportado a:\n{dst}")
-        except Exception as e:
-            messagebox.showerror("Exportar", f"No se pudo exportar.\n{e}")
+
+        def on_done():
+            channel.mark_exported()
+            self._co2_csv_state_led(fermenter, self._co2_csv_color(fermenter))
+
+        def start():
+            src = channel.csv_path()
+            if not os.path.exists(src):
+                messagebox.showerror("Exportar", f"No existe {src}")
+                return
+            self._start_export(src, os.path.join(dst_dir, os.path.basename(src)), on_done)
+
+        self._flush_logs(start)
 
     def co2_csv_restart(self, fermenter):
-        self.co2_csv_running[fermenter] = False
-        self.co2_csv_paused[fermenter] = False
-        path = self._co2_csv_path(fermenter)
         try:
-            if os.path.exists(path):
-                os.remove(path)
+            path = self.flow_channels[fermenter].csv_restart()
             self._co2_csv_state_led(fermenter, "#ef4444")
             messagebox.showinfo("CSV CO2", f"Archivo reiniciado:\n{path}")
         except Exception as e:
             messagebox.showerror("CSV CO2", f"No se pudo reiniciar.\n{e}")
 
-    def _co2_csv_write_row(self, fermenter, ts, flow, current_ma, voltage, status):
-        if not self.co2_csv_running.get(fermenter, False):
-            return
-        row = {
-            "timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"),
-            "fermentador": fermenter,
-            "flow_sccm": f"{flow:.4f}",
-            "status": status,
-        }
-        ipath = self._co2_csv_path(fermenter)
-        header = not os.path.exists(ipath)
-        try:
-            os.makedirs(os.path.dirname(ipath), exist_ok=True)
-            with open(ipath, "a", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=list(row.keys()))
-                if header:
-                    w.writeheader()
-                w.writerow(row)
-        except Exception as e:
-            messagebox.showerror("CSV CO2", f"No se pudo escribir en {ipath}\n{e}")
-
-    def _flow_take_sample(self, fermenter, ts=None):
-        reader = self.flow_readers.get(fermenter)
-        if reader is None:
-            return
-        if ts is None:
-            ts = now()
-        try:
-            voltage = reader.read_voltage()
-        except Exception as exc:
-            print(f"[FLOW] Error leyendo {fermenter}: {exc}")
-            next_ts = ts + dt.timedelta(seconds=self.flow_sample_period[fermenter])
-            self.flow_next_sample[fermenter] = next_ts
+    def co2_reset_total(self, fermenter):
+        if not messagebox.askyesno("CO2 acumulado", f"¿Reiniciar el CO2 acumulado y la fase de {fermenter}?"):
             return
-
-        current_ma = voltage_to_current_ma(voltage, SHUNT_OHMS)
-        flow = current_to_flow_sccm(current_ma)
-        status = "OK"
-        if current_ma < 3.8:
-            status = "Bajo rango"
-        elif current_ma > 20.5:
-            status = "Alto rango"
-
-        samples = self.flow_samples.get(fermenter, [])
-        samples.append((ts, flow, current_ma, voltage, status))
-        cutoff = ts - dt.timedelta(hours=MAX_FLOW_HISTORY_HOURS)
-        self.flow_samples[fermenter] = [row for row in samples if row[0] >= cutoff]
-        self._co2_csv_write_row(fermenter, ts, flow, current_ma, voltage, status)
-        self.flow_next_sample[fermenter] = ts + dt.timedelta(seconds=self.flow_sample_period[fermenter])
-
-    def _flow_tick(self):
-        ts = now()
-        for name in self.flow_readers:
-            next_ts = self.flow_next_sample.get(name)
-            if next_ts is None or ts >= next_ts:
-                self._flow_take_sample(name, ts=ts)
+        self.flow_channels[fermenter].reset_co2_total()
 
     # ===== gráfico tiempo real CO2 =====
     def open_flow_plot(self, fermenter):
@@ -1755,8 +5954,8 @@ class App(ctk.CTk):
         if not mpl_spec:
             messagebox.showerror("Gráfico", "Instala matplotlib para usar el gráfico en tiempo real.")
             return
-        reader = self.flow_readers.get(fermenter)
-        if reader is None:
+        channel = self.flow_channels.get(fermenter)
+        if channel is None:
             messagebox.showerror("Gráfico", f"No hay configuración de caudal para {fermenter}.")
             return
         existing = self._flow_plot_windows.get(fermenter)
@@ -1779,8 +5978,8 @@ class App(ctk.CTk):
         header = ttk.Frame(top)
         header.pack(fill="x", padx=8, pady=(8, 4))
         ttk.Label(header, text="Caudalímetro CO2 (4-20 mA)", font=("Segoe UI", 14, "bold")).pack(side="left")
-        mode_text = "SIMULADOR" if reader.sim else "HARDWARE"
-        mode_color = "#dc2626" if reader.sim else "#16a34a"
+        mode_text = channel.mode
+        mode_color = {"SIMULADOR": "#dc2626", "REPLAY": "#d97706"}.get(mode_text, "#16a34a")
         ttk.Label(header, text=mode_text, foreground=mode_color).pack(side="right")
 
         stats = ttk.Frame(top)
@@ -1792,9 +5991,14 @@ class App(ctk.CTk):
         voltage_var = tk.StringVar(value="0.000 V")
         status_var = tk.StringVar(value="Esperando...")
         next_var = tk.StringVar(value="--:--:--")
+        total_var = tk.StringVar(value="0.00 g (0.000 g/L)")
+        sugar_var = tk.StringVar(value="0.00 g/L")
+        phase_var = tk.StringVar(value=FERM_IDLE)
 
         ttk.Label(stats, text="Caudal:", font=("Segoe UI", 12, "bold")).grid(row=0, column=0, sticky="w")
         ttk.Label(stats, textvariable=flow_var, font=("Segoe UI", 12)).grid(row=0, column=1, sticky="w")
+        ttk.Label(stats, text="CO2 acumulado:", font=("Segoe UI", 12, "bold")).grid(row=1, column=0, sticky="w")
+        ttk.Label(stats, textvariable=total_var, font=("Segoe UI", 12)).grid(row=1, column=1, sticky="w")
         ttk.Label(stats, text="Corriente:", font=("Segoe UI", 12, "bold")).grid(row=2, column=0, sticky="w")
         ttk.Label(stats, textvariable=current_var, font=("Segoe UI", 12)).grid(row=2, column=1, sticky="w")
         ttk.Label(stats, text="Voltaje:", font=("Segoe UI", 12, "bold")).grid(row=3, column=0, sticky="w")
@@ -1803,8 +6007,35 @@ class App(ctk.CTk):
         ttk.Label(stats, textvariable=status_var, font=("Segoe UI", 12)).grid(row=4, column=1, sticky="w")
         ttk.Label(stats, text="Siguiente muestra:", font=("Segoe UI", 12, "bold")).grid(row=5, column=0, sticky="w")
         ttk.Label(stats, textvariable=next_var, font=("Segoe UI", 12)).grid(row=5, column=1, sticky="w")
+        ttk.Label(stats, text="Azúcar consumida (est.):", font=("Segoe UI", 12, "bold")).grid(
+            row=6, column=0, sticky="w"
+        )
+        ttk.Label(stats, textvariable=sugar_var, font=("Segoe UI", 12)).grid(row=6, column=1, sticky="w")
+        ttk.Label(stats, text="Fase:", font=("Segoe UI", 12, "bold")).grid(row=7, column=0, sticky="w")
+        ttk.Label(stats, textvariable=phase_var, font=("Segoe UI", 12)).grid(row=7, column=1, sticky="w")
         ttk.Label(stats, text="SCCM = cm3/min", font=("Segoe UI", 10, "italic")).grid(
-            row=6, column=0, columnspan=2, sticky="w", pady=(4, 0)
+            row=8, column=0, columnspan=2, sticky="w", pady=(4, 0)
+        )
+
+        rolling = ttk.Frame(top)
+        rolling.pack(fill="x", padx=8, pady=(0, 6))
+        for col, text in enumerate(("Ventana", "Media", "Mín", "Máx", "dQ/dt (SCCM/h)")):
+            ttk.Label(rolling, text=text, font=("Segoe UI", 10, "bold")).grid(
+                row=0, column=col, sticky="w", padx=(0, 12)
+            )
+        rolling_vars = {}
+        for i, seconds in enumerate(w for w in ROLLING_WINDOWS_SEC if w > 0):
+            ttk.Label(rolling, text=window_label(seconds), font=("Segoe UI", 10)).grid(row=i + 1, column=0, sticky="w")
+            row_vars = [tk.StringVar(value="--") for _ in range(4)]
+            for col, var in enumerate(row_vars):
+                ttk.Label(rolling, textvariable=var, font=("Segoe UI", 10)).grid(
+                    row=i + 1, column=col + 1, sticky="w", padx=(0, 12)
+                )
+            rolling_vars[seconds] = row_vars
+        ewma_var = tk.StringVar(value="--")
+        ttk.Label(rolling, text="EWMA", font=("Segoe UI", 10)).grid(row=len(rolling_vars) + 1, column=0, sticky="w")
+        ttk.Label(rolling, textvariable=ewma_var, font=("Segoe UI", 10)).grid(
+            row=len(rolling_vars) + 1, column=1, columnspan=4, sticky="w"
         )
 
         control = ttk.Frame(top)
@@ -1816,7 +6047,7 @@ class App(ctk.CTk):
         def set_window(h):
             nonlocal current_window_hours
             current_window_hours = h
-            refresh()
+            update_plot()
 
         for label, hours in [
             ("Tiempo real", None),
@@ -1875,14 +6106,10 @@ class App(ctk.CTk):
         led = Led(state_row)
         led.widget().pack(side="left", padx=6)
         self._co2_csv_leds[fermenter] = led
-        if self.co2_csv_running.get(fermenter):
-            led.set_color("#22c55e")
-        elif self.co2_csv_paused.get(fermenter):
-            led.set_color("#eab308")
-        elif self.co2_csv_last_export_ok.get(fermenter):
-            led.set_color("#3b82f6")
-        else:
-            led.set_color("#ef4444")
+        led.set_color(self._co2_csv_color(fermenter))
+        ttk.Button(state_row, text="Reiniciar acumulado", command=lambda: self.co2_reset_total(fermenter)).pack(
+            side="right"
+        )
 
         fig, ax_flow = plt.subplots(
             1,
@@ -1899,41 +6126,64 @@ class App(ctk.CTk):
         canvas = FigureCanvasTkAgg(fig, master=top)
         canvas.get_tk_widget().pack(fill="both", expand=True)
 
-        def windowed_samples(samples):
-            if not samples:
-                return []
-            if current_window_hours is None:
-                return samples
-            right = samples[-1][0]
-            left = right - dt.timedelta(hours=current_window_hours)
-            return [row for row in samples if row[0] >= left]
+        # Lo anterior a la memoria (rollups o CSV) se pide en un hilo y se
+        # junta cuando llega; el hilo de Tk solo recorta la memoria.
+        older = BackgroundSeries(
+            self,
+            lambda hours, t0, t1, resolution: self.series_query.query(
+                fermenter, ["flow_sccm"], t0, t1, resolution, memory=False
+            ),
+            lambda key, result: top.winfo_exists() and update_plot(),
+        )
 
         def update_plot():
             samples = self.flow_samples.get(fermenter, [])
-            windowed = windowed_samples(samples)
-            if not windowed:
+            if not samples:
                 return
-            times = [ts for ts, _, _, _, _ in windowed]
-            values = [flow for _, flow, _, _, _ in windowed]
-            line_flow.set_data(times, values)
-
-            right = times[-1]
+            right = samples[-1][0]
+            first = samples[0][0]
             if current_window_hours is None:
-                left = times[0]
-                if left == right:
-                    left = right - dt.timedelta(seconds=max(1, self.flow_sample_period[fermenter]))
+                left = first
             else:
                 left = right - dt.timedelta(hours=current_window_hours)
+            # Ventanas largas: un promedio por balde, ~2000 puntos en pantalla.
+            span = (right - left).total_seconds()
+            resolution = span / 2000 if span > 2000 * max(1, channel.period) else None
+            data = _series_arrays(*self._flow_memory_slice(fermenter, left, None), "memoria")
+            if resolution:
+                data = _downsample(data, ["flow_sccm"], resolution)
+            if first > left:
+                # Inicio redondeado a 5 min: el mismo pedido sirve un rato.
+                older.request((current_window_hours, _bucket_start(left, 300), first, resolution))
+                old = older.result if older.key and older.key[0] == current_window_hours else None
+                if old is not None and len(old["ts"]):
+                    np = _numpy()
+                    keep = (old["ts"] >= np.datetime64(left, "s")) & (old["ts"] < np.datetime64(first, "s"))
+                    data = {
+                        "ts": np.concatenate([old["ts"][keep], data["ts"]]),
+                        "flow_sccm": np.concatenate([old["flow_sccm"][keep], data["flow_sccm"]]),
+                    }
+            times, values = data["ts"], data["flow_sccm"]
+            values = values[values == values]
+            if not len(values):
+                return
+            line_flow.set_data(times, data["flow_sccm"])
+
+            if left == right:
+                left = right - dt.timedelta(seconds=max(1, channel.period))
             ax_flow.set_xlim(left, right)
 
-            vmin = min(values)
-            vmax = max(values)
+            vmin = float(values.min())
+            vmax = float(values.max())
             pad = (vmax - vmin) * 0.1 if vmax != vmin else 1.0
             ax_flow.set_ylim(vmin - pad, vmax + pad)
             fig.autofmt_xdate()
             canvas.draw_idle()
 
         def update_stats():
+            total_var.set(f"{channel.co2_total_g:0.2f} g ({channel.co2_total_g_l:0.3f} g/L)")
+            sugar_var.set(f"{channel.co2_total_g_l * SUGAR_PER_CO2:0.2f} g/L")
+            phase_var.set(f"{channel.ferm_state} (pico {channel.ferm_peak_g_l_h:0.3f} g/L·h)")
             samples = self.flow_samples.get(fermenter, [])
             if not samples:
                 flow_var.set("0.00 SCCM")
@@ -1947,8 +6197,18 @@ class App(ctk.CTk):
             voltage_var.set(f"{voltage:0.3f} V")
             status_var.set(status)
 
+        def update_rolling():
+            summary = channel.flow_stats
+            ewma = summary["ewma"] if summary else None
+            ewma_var.set("--" if ewma is None else f"{ewma:0.2f} SCCM (τ {window_label(EWMA_TAU_SEC)})")
+            for seconds, row_vars in rolling_vars.items():
+                w = stats_window(summary, seconds)
+                values = (w["mean"], w["min"], w["max"], w["slope_h"]) if w else (None,) * 4
+                for var, value in zip(row_vars, values):
+                    var.set("--" if value is None else f"{value:0.2f}")
+
         def update_countdown():
-            next_sample = self.flow_next_sample.get(fermenter)
+            next_sample = channel.next_sample
             if next_sample is None:
                 next_var.set("--:--:--")
                 return
@@ -1962,21 +6222,20 @@ class App(ctk.CTk):
                 ss = total % 60
                 next_var.set(f"{hh:02d}:{mm:02d}:{ss:02d}")
 
-        def refresh():
-            if not top.winfo_exists():
-                return
+        def update_values():
             update_stats()
-            update_plot()
             update_countdown()
-            top._refresh_job = top.after(1000, refresh)
+
+        # Valores cada 1 s, grafico cada 5 s y resumen movil cada minuto.
+        top._jobs = []
+        for period, fn in ((1.0, update_values), (5.0, update_plot), (60.0, update_rolling)):
+            name = f"co2_plot:{fermenter}:{fn.__name__}"
+            self.scheduler.add(name, period, lambda fn=fn: top.winfo_exists() and fn(), PRIO_UI, delay=0.0)
+            top._jobs.append(name)
 
         def on_close_plot():
-            if getattr(top, "_refresh_job", None) is not None:
-                try:
-                    top.after_cancel(top._refresh_job)
-                except Exception:
-                    pass
-                top._refresh_job = None
+            for name in top._jobs:
+                self.scheduler.remove(name)
             if top in self._plot_windows:
                 self._plot_windows.remove(top)
             if self._flow_plot_windows.get(fermenter) is top:
@@ -1986,7 +6245,6 @@ class App(ctk.CTk):
 
         top.protocol("WM_DELETE_WINDOW", on_close_plot)
         self._plot_windows.append(top)
-        refresh()
 
     # ===== gráfico tiempo real =====
     def open_realtime_plot(self, fermenter=None):
@@ -2017,11 +6275,61 @@ class App(ctk.CTk):
         ttk.Label(control, text="Rango eje X:").pack(side="left")
 
         current_window_hours = 10 * 24
+        token = None
+        # Tramo antiguo de las ventanas largas: promedios de los rollups,
+        # leidos en un hilo y renovados cada 5 min; el cache del backup solo
+        # trae PLOT_RAW_HOURS. Si los rollups no cubren la ventana, el cache
+        # carga la ventana completa como antes.
+        def fetch_prefix(hours, left, right, resolution):
+            names = [fermenter] if fermenter else [c["name"] for c in FERMENTERS]
+            data = {}
+            for ferm in names:
+                r = self.series_query.rollups(ferm, ["T", "SP", "nutricion_activa"], left, right, resolution,
+                                              memory=False)
+                if r is None:
+                    return None
+                if len(r["ts"]):
+                    data[ferm] = {
+                        "ts": r["ts"].astype(object).tolist(),
+                        "t": r["T"].tolist(),
+                        "sp": r["SP"].tolist(),
+                        "nut": r["nutricion_activa"].tolist(),
+                    }
+            return data
+
+        def on_prefix(key, data):
+            if top.winfo_exists() and key[0] == current_window_hours:
+                self.series_cache.set_hours(token, cache_hours())
+
+        prefix = BackgroundSeries(self, fetch_prefix, on_prefix)
+
+        def prefix_ready():
+            return prefix.key is not None and prefix.key[0] == current_window_hours
+
+        def rollup_prefix():
+            # Lo ya leido para esta ventana (o None); pide otro si cambio el
+            # tramo de 5 min. Nunca lee del disco en el hilo de Tk.
+            if current_window_hours <= PLOT_RAW_HOURS:
+                return None
+            t = now()
+            prefix.request((
+                current_window_hours,
+                _bucket_start(t - dt.timedelta(hours=current_window_hours), 300),
+                _bucket_start(t - dt.timedelta(hours=PLOT_RAW_HOURS), 300) + dt.timedelta(minutes=10),
+                current_window_hours * 3600 / 2000,
+            ), max_age=float("inf"))
+            return prefix.result if prefix_ready() else None
+
+        def cache_hours():
+            # Mientras llega la respuesta, solo lo reciente.
+            if current_window_hours > PLOT_RAW_HOURS and not (prefix_ready() and prefix.result is None):
+                return PLOT_RAW_HOURS
+            return current_window_hours
 
         def set_window(h):
             nonlocal current_window_hours
             current_window_hours = h
-            refresh()
+            self.series_cache.set_hours(token, cache_hours())
 
         for label, hours in [
             ("10 días", 10 * 24),
@@ -2036,54 +6344,92 @@ class App(ctk.CTk):
         status = ttk.Label(top, text="Cargando datos…")
         status.pack(anchor="w", padx=8, pady=4)
 
-        top._refresh_job = None
         self._plot_windows.append(top)
 
-        def refresh():
+        # Ejes, formateadores y lineas se crean una vez; cada refresco solo
+        # cambia los datos (set_data) y reescala cuando cambia el rango.
+        ax_temp.set_title("Temperatura vs. tiempo")
+        ax_temp.set_ylabel("°C")
+        ax_nut.set_ylabel("Nutrición ON=1")
+        ax_nut.set_ylim(-0.1, 1.1)
+        ax_nut.set_yticks([0, 1])
+        ax_nut.set_xlabel("Fecha y hora")
+        ax_nut.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
+        fig.autofmt_xdate()
+
+        artists = {}
+        shown = {"legend": None, "ylim": None}
+
+        def artists_for(ferm):
+            if ferm not in artists:
+                line_t, = ax_temp.plot([], [], label=f"{ferm} T")
+                line_sp, = ax_temp.plot([], [], linestyle="--", label=f"{ferm} SP")
+                line_nut, = ax_nut.plot([], [], drawstyle="steps-post", color="red", alpha=0.8,
+                                        label=f"{ferm} Nutrición")
+                artists[ferm] = (line_t, line_sp, line_nut)
+            return artists[ferm]
+
+        def update_legend():
+            handles = [a for ferm in sorted(artists) for a in artists[ferm] if a.get_visible()]
+            key = tuple(h.get_label() for h in handles)
+            if key == shown["legend"]:
+                return
+            shown["legend"] = key
+            legend = ax_temp.get_legend()
+            if legend is not None:
+                legend.remove()
+            if handles:
+                ax_temp.legend(handles, [h.get_label() for h in handles], loc="upper left")
+
+        def update_ylim(temps_min, temps_max):
+            if temps_min is None:
+                return
+            pad = (temps_max - temps_min) * 0.1 if temps_max != temps_min else 1.0
+            ylim = (temps_min - pad, temps_max + pad)
+            if ylim != shown["ylim"]:
+                shown["ylim"] = ylim
+                ax_temp.set_ylim(*ylim)
+
+        def refresh(data, loading):
+            # Llamado por BackupSeriesCache con el recorte de esta ventana.
             if not top.winfo_exists():
                 return
-            nonlocal current_window_hours
-            days_window = current_window_hours / 24.0
-            data = self._read_recent_backup(days=days_window, fermenter=fermenter)
-            ax_temp.clear()
-            ax_nut.clear()
-
-            if not data:
+            if loading and not data:
+                status.config(text="Cargando datos…")
+            elif not data:
                 status.config(text="Sin datos recientes en el backup.")
-            else:
-                temps_all = []
-                for ferm, series in sorted(data.items()):
-                    if not series["ts"]:
-                        continue
-                    ax_temp.plot(series["ts"], series["t"], label=f"{ferm} T")
-                    ax_temp.plot(series["ts"], series["sp"], linestyle="--", label=f"{ferm} SP")
-                    temps_all.extend(series["t"])
-                    nut = series.get("nut", [])
-                    if nut and any(nut):
-                        ax_nut.step(series["ts"], nut, where="post", color="red", alpha=0.8, label=f"{ferm} Nutrición")
-
-                ax_temp.set_title("Temperatura vs. tiempo")
-                ax_temp.set_ylabel("°C")
-
-                if temps_all:
-                    tmin = min(temps_all)
-                    tmax = max(temps_all)
-                    pad = (tmax - tmin) * 0.1 if tmax != tmin else 1.0
-                    ax_temp.set_ylim(tmin - pad, tmax + pad)
-
-                ax_nut.set_ylabel("Nutrición ON=1")
-                ax_nut.set_ylim(-0.1, 1.1)
-                ax_nut.set_yticks([0, 1])
-                ax_nut.set_xlabel("Fecha y hora")
-
-                ax_nut.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M"))
-                fig.autofmt_xdate()
-
-                lines1, labels1 = ax_temp.get_legend_handles_labels()
-                lines2, labels2 = ax_nut.get_legend_handles_labels()
-                if lines1 or lines2:
-                    ax_temp.legend(lines1 + lines2, labels1 + labels2, loc="upper left")
-
+            old = rollup_prefix()
+            if old:
+                merged = {}
+                for ferm in set(old) | set(data):
+                    head = old.get(ferm) or _empty_series()
+                    recent = data.get(ferm) or _empty_series()
+                    cut = now() - dt.timedelta(hours=PLOT_RAW_HOURS)
+                    if recent["ts"]:
+                        cut = min(cut, recent["ts"][0])
+                    i = bisect.bisect_left(head["ts"], cut)
+                    merged[ferm] = {k: head[k][:i] + recent[k] for k in ("ts", "t", "sp", "nut")}
+                data = merged
+            temps_min = temps_max = None
+            for ferm in sorted(set(data) | set(artists)):
+                series = data.get(ferm) or _empty_series()
+                line_t, line_sp, line_nut = artists_for(ferm)
+                line_t.set_data(series["ts"], series["t"])
+                line_sp.set_data(series["ts"], series["sp"])
+                line_t.set_visible(bool(series["ts"]))
+                line_sp.set_visible(bool(series["ts"]))
+                nut = series.get("nut", [])
+                line_nut.set_data(series["ts"], nut)
+                line_nut.set_visible(bool(nut) and any(nut))
+                temps = [v for v in series["t"] if v == v]
+                if temps:
+                    lo, hi = min(temps), max(temps)
+                    temps_min = lo if temps_min is None else min(temps_min, lo)
+                    temps_max = hi if temps_max is None else max(temps_max, hi)
+            update_legend()
+            update_ylim(temps_min, temps_max)
+
+            if data:
                 right = now()
                 left = right - dt.timedelta(hours=current_window_hours)
                 ax_temp.set_xlim(left, right)
@@ -2092,43 +6438,200 @@ class App(ctk.CTk):
                     rango = f"últimos {int(current_window_hours // 24)} días"
                 else:
                     rango = f"últimas {current_window_hours} horas"
-                status.config(text=f"Fuente: backup global ({rango})")
+                fuente = "rollups + backup global" if old is not None else "backup global"
+                status.config(text=f"Fuente: {fuente} ({rango})")
 
-            canvas.draw()
-            top._refresh_job = top.after(5000, refresh)
+            canvas.draw_idle()
 
         def on_close_plot():
-            if getattr(top, "_refresh_job", None) is not None:
-                try:
-                    top.after_cancel(top._refresh_job)
-                except Exception:
-                    pass
-                top._refresh_job = None
+            self.series_cache.unsubscribe(token)
             if top in self._plot_windows:
                 self._plot_windows.remove(top)
             top.destroy()
 
         top.protocol("WM_DELETE_WINDOW", on_close_plot)
-        refresh()
+        token = self.series_cache.subscribe(fermenter, cache_hours(), refresh)
 
     # ===== loop principal =====
     def _tick(self):
+        self._tick_job = None
         if self._closing:
             return
+        self.scheduler.run_pending()
+        # Los trabajos agregados entre vueltas (un grafico nuevo) esperan
+        # a lo sumo 100 ms.
+        delay = self.scheduler.next_delay()
+        delay = 0.1 if delay is None else min(0.1, delay)
+        self._tick_job = self.after(max(10, int(delay * 1000)), self._tick)
+
+    def _drain_tick(self):
+        self.backup_sink.set_path(self.get_backup_path())
+        self._drain_workers()
+
+    def _update_clock(self):
         self.clock_var.set(now().strftime("%Y-%m-%d %H:%M:%S"))
-        for f in self.ferms:
-            f.update_process()
-        self._flow_tick()
-        self._tick_job = self.after(1000, self._tick)
+
+    def _publish_dashboard(self):
+        self.dashboard_hub.publish(self._dashboard_snapshot())
+
+    # ===== fuentes en memoria de SeriesQuery =====
+    def _flow_memory_source(self, fermenter, fields, t0, t1):
+        samples = self.flow_samples.get(fermenter)
+        if fields != ["flow_sccm"] or not samples or t0 is None or samples[0][0] > t0:
+            return None
+        return self._flow_memory_slice(fermenter, t0, t1)
+
+    def _flow_memory_slice(self, fermenter, t0, t1):
+        # Lo que haya en memoria dentro de [t0, t1], cubra o no todo el rango.
+        times, values = [], []
+        for sample in reversed(self.flow_samples.get(fermenter) or ()):
+            if t0 is not None and sample[0] < t0:
+                break
+            if t1 is None or sample[0] <= t1:
+                times.append(sample[0])
+                values.append(sample[1])
+        times.reverse()
+        values.reverse()
+        return times, {"flow_sccm": values}
+
+    def _cache_memory_source(self, fermenter, fields, t0, t1):
+        keys = {"T": "t", "SP": "sp", "nutricion_activa": "nut"}
+        series = self.series_cache.data.get(fermenter)
+        if series is None or any(f not in keys for f in fields) or not self.series_cache.covers(t0):
+            return None
+        i = bisect.bisect_left(series["ts"], t0)
+        j = len(series["ts"]) if t1 is None else bisect.bisect_right(series["ts"], t1)
+        return series["ts"][i:j], {f: series[keys[f]][i:j] for f in fields}
+
+    def _drain_api(self):
+        self.control_api.drain()
+        for panel in self._visible_panels():
+            panel.refresh()
+
+    def _dashboard_snapshot(self):
+        t = now()
+        fermenters = {}
+        for ctrl in self.controls:
+            channel = self.flow_channels[ctrl.name]
+            samples = channel.samples
+            fermenters[ctrl.name] = {
+                "t": _json_num(ctrl.t),
+                "sp": _json_num(ctrl.sp),
+                "band": _json_num(ctrl.band),
+                "manual": bool(ctrl.manual_mode),
+                "cold": bool(ctrl.cold_in),
+                "hot": bool(ctrl.hot_in),
+                "nut": bool(ctrl.nut_on),
+                "switches": dict(ctrl.relay_switches),
+                "csv_running": bool(ctrl.csv_running),
+                "flow": _json_num(samples[-1][1]) if samples else None,
+                "flow_mode": channel.mode,
+                "co2_g_l": _json_num(channel.co2_total_g_l),
+                "phase": channel.ferm_state,
+            }
+        return {"ts": t.strftime("%Y-%m-%d %H:%M:%S"), "epoch_ms": int(t.timestamp() * 1000), "fermenters": fermenters}
 
     def cerrar_todo_global(self):
-        for f in self.ferms:
-            f.stop_all()
+        for ctrl in self.controls:
+            ctrl.stop_all()
+        for panel in self.panels.values():
+            panel.refresh()
         messagebox.showinfo("Seguridad", "Se cerraron todas las válvulas y se detuvo el control automático.")
 
+    def _bundle_sources(self):
+        sources = []
+        for ctrl in self.controls:
+            name = ctrl.name
+            channel = self.flow_channels[name]
+            for path in (ctrl.csv_path(), channel.csv_path()):
+                if os.path.exists(path):
+                    sources.append((f"{safe_file_name(name)}/{os.path.basename(path)}", path, None))
+            sources.append((f"{safe_file_name(name)}/calendario_sp.csv", None, _calendar_csv_bytes(ctrl.cal_sp)))
+            sources.append((f"{safe_file_name(name)}/calendario_nutricion.csv", None,
+                            _calendar_csv_bytes(ctrl.cal_nut)))
+        backup = self.get_backup_path()
+        if os.path.exists(backup):
+            sources.append((f"backup/{os.path.basename(backup)}", backup, None))
+        return sources
+
     def export_all(self):
-        for f in self.ferms:
-            f.csv_export()
+        # Un solo paquete .tar.gz con todos los CSV, el backup y los
+        # calendarios, filtrado por rango de fechas.
+        top = tk.Toplevel(self)
+        top.title("Exportar todo")
+        top.resizable(False, False)
+        top.transient(self)
+        desde = tk.StringVar()
+        hasta = tk.StringVar()
+        ttk.Label(top, text="Rango (AAAA-MM-DD [HH:MM]); vacío = sin límite").grid(
+            row=0, column=0, columnspan=2, sticky="w", padx=12, pady=(12, 6)
+        )
+        ttk.Label(top, text="Desde:").grid(row=1, column=0, sticky="e", padx=(12, 4), pady=2)
+        ttk.Entry(top, textvariable=desde, width=22).grid(row=1, column=1, sticky="w", padx=(0, 12), pady=2)
+        ttk.Label(top, text="Hasta:").grid(row=2, column=0, sticky="e", padx=(12, 4), pady=2)
+        ttk.Entry(top, textvariable=hasta, width=22).grid(row=2, column=1, sticky="w", padx=(0, 12), pady=2)
+
+        quick = ttk.Frame(top)
+        quick.grid(row=3, column=0, columnspan=2, pady=(4, 6))
+
+        def set_last(hours):
+            hasta.set("")
+            desde.set("" if hours is None else (now() - dt.timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M"))
+
+        for label, hours in [("Todo", None), ("24 h", 24), ("7 días", 24 * 7), ("30 días", 24 * 30)]:
+            ttk.Button(quick, text=label, command=lambda h=hours: set_last(h)).pack(side="left", padx=2)
+
+        def parse_bound(raw, end=False):
+            raw = raw.strip()
+            if not raw:
+                return None
+            for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+                try:
+                    return dt.datetime.strptime(raw, fmt)
+                except ValueError:
+                    continue
+            day = _normalize_date(raw)
+            if day is None:
+                raise ValueError(f"Fecha inválida: {raw}")
+            base = dt.datetime(day.year, day.month, day.day)
+            return base + dt.timedelta(days=1, seconds=-1) if end else base
+
+        def start():
+            try:
+                t0 = parse_bound(desde.get())
+                t1 = parse_bound(hasta.get(), end=True)
+            except ValueError as e:
+                messagebox.showerror("Exportar todo", str(e), parent=top)
+                return
+            fn = filedialog.asksaveasfilename(
+                title="Guardar paquete de exportación",
+                defaultextension=".tar.gz",
+                initialfile=f"fermentadores_{now().strftime('%Y%m%d_%H%M')}.tar.gz",
+                filetypes=[("tar.gz", "*.tar.gz"), ("Todos", "*.*")],
+                parent=top,
+            )
+            _restore_focus(self)
+            if not fn:
+                return
+            top.destroy()
+
+            def bundle():
+                job = BundleJob(self._bundle_sources(), fn, t0, t1)
+                self._show_export_progress(job, f"Paquete → {fn}", self._mark_all_exported)
+
+            self._flush_logs(bundle)
+
+        ttk.Button(top, text="Exportar...", command=start).grid(row=4, column=0, columnspan=2, pady=(4, 12))
+
+    def _mark_all_exported(self):
+        for ctrl in self.controls:
+            ctrl.mark_exported()
+        for channel in self.flow_channels.values():
+            channel.mark_exported()
+        for name in self.flow_channels:
+            self._co2_csv_state_led(name, self._co2_csv_color(name))
+        for panel in self.panels.values():
+            panel.refresh()
 
     def on_close(self):
         self._closing = True
@@ -2139,29 +6642,36 @@ class App(ctk.CTk):
                 pass
             self._tick_job = None
 
+        self.scheduler.clear()
         for top in list(self._plot_windows):
             if top.winfo_exists():
-                if getattr(top, "_refresh_job", None) is not None:
-                    try:
-                        top.after_cancel(top._refresh_job)
-                    except Exception:
-                        pass
-                    top._refresh_job = None
                 try:
                     top.destroy()
                 except Exception:
                     pass
         self._plot_windows.clear()
         self._flow_plot_windows.clear()
+        self.series_cache.close()
+        if self.dashboard is not None:
+            self.dashboard.stop()
 
         try:
-            for f in self.ferms:
-                f.stop_all()
-            for reader in self.flow_readers.values():
-                try:
-                    reader.close()
-                except Exception:
-                    pass
+            for ctrl in self.controls:
+                ctrl.stop_all()
+            for w in self.workers.values():
+                w.stop()
+                rows = w.take_backup_rows()
+                co2_rows = w.take_co2_rows()
+                self.backup_sink.submit(rows)
+                self.rollups.submit(rows)
+                self.rollups.submit(co2_rows)
+                if self.telemetry is not None:
+                    self.telemetry.submit("proceso", rows)
+                    self.telemetry.submit("co2", co2_rows)
+            self.backup_sink.close()
+            self.rollups.close()
+            if self.telemetry is not None:
+                self.telemetry.close()
             self.hw.cleanup()
         finally:
             try:
@@ -2180,5 +6690,17 @@ class App(ctk.CTk):
 
 
 if __name__ == "__main__":
-    app = App()
+    startup_mark("imports")
+    # Filas que quedaron en el diario si el equipo se apago sin descargar.
+    replay_csv_journals()
+    # El control parte antes de crear la ventana: los reles quedan bajo
+    # control mientras se construye la UI (y los workers no heredan Tk).
+    if WORKER_PROCESSES:
+        workers = start_fermenter_workers(FERMENTERS)
+        hw = Hardware()
+    else:
+        hw = Hardware()
+        workers = start_control_thread(FERMENTERS, hw)
+    startup_mark("control iniciado")
+    app = App(workers=workers, hw=hw)
     app.mainloop()